@@ -9,9 +9,24 @@ validation_page = st.Page(
 )
 grouping_page = st.Page(page="pages/grouping/grouping.py", title="Grouping", icon="📦")
 report_page = st.Page(page="pages/report/report.py", title="Report", icon="📊")
+export_page = st.Page(page="pages/export/export.py", title="Export", icon="📤")
+performance_page = st.Page(
+    page="pages/performance/performance.py", title="Performance", icon="⏱️"
+)
 
-pg = st.navigation(pages=[upload_page, validation_page, grouping_page, report_page])
+# the batch upload's worker processes load this script as __mp_main__, only the server runs pages
+if __name__ == "__main__":
+    pg = st.navigation(
+        pages=[
+            upload_page,
+            validation_page,
+            grouping_page,
+            report_page,
+            export_page,
+            performance_page,
+        ]
+    )
 
-logger.info("Starting application")
+    logger.info("Starting application")
 
-pg.run()
+    pg.run()
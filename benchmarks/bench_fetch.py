@@ -0,0 +1,98 @@
+"""Compares cursor.fetchall into a DataFrame against the COPY-to-arrow fetch.
+
+Pulls trial balance shaped rows straight from the journal. Every method runs
+in its own process, so the peak memory of one doesn't hide the next:
+
+    python -m benchmarks.bench_fetch --rows 1000000
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+
+import pandas as pd
+
+from utils.arrow_fetch import fetch_frame, iter_frames
+from utils.db_manager import configure_pool, connection
+
+QUERY = """
+    SELECT
+        account_no,
+        business_unit_id,
+        rad_data::TEXT AS rad_data_str,
+        accounting_date,
+        amount,
+        entry_id
+    FROM finance.manual_journal_entry_transaction
+    LIMIT %(rows)s
+"""
+
+
+def fetchall_frame(params: dict) -> int:
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(QUERY, params)
+        results = cursor.fetchall()
+        column_names = [desc[0] for desc in cursor.description]
+
+    df = pd.DataFrame(results, columns=column_names)
+    df["amount"] = df["amount"].astype(float)
+    return len(df)
+
+
+def arrow_frame(params: dict) -> int:
+    return len(fetch_frame(QUERY, params))
+
+
+def arrow_chunks(params: dict) -> int:
+    # aggregates chunk by chunk, as an export or a rollup over a large pull would
+    return sum(len(chunk) for chunk in iter_frames(QUERY, params))
+
+
+METHODS = {
+    "fetchall": fetchall_frame,
+    "fetch_frame": arrow_frame,
+    "iter_frames": arrow_chunks,
+}
+
+
+def run_method(name: str, dsn: str | None, params: dict, results):
+    if dsn:
+        configure_pool(dsn=dsn)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    rows = METHODS[name](params)
+    seconds = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on linux
+    peak_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+    results.put((rows, seconds, peak_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--dsn", help="database to benchmark against (defaults to the secrets file)"
+    )
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    params = {"rows": args.rows}
+
+    for name in METHODS:
+        results = context.Queue()
+        process = context.Process(
+            target=run_method, args=(name, args.dsn, params, results)
+        )
+        process.start()
+        rows, seconds, peak_mb = results.get()
+        process.join()
+        print(
+            f"{name:<12} {rows:>10} rows {seconds:8.2f} s "
+            f"{rows / seconds:12,.0f} rows/s {peak_mb:8.0f} MB peak"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Compares the row-at-a-time insert_data path against the COPY-based ingest_data.
+
+Run from the project root against a throwaway database, because both paths
+delete everything on or after the earliest generated accounting_date:
+
+    python -m benchmarks.bench_ingest --rows 20000
+"""
+
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from pages.upload.utils import (
+    CENTS,
+    compact_frame,
+    drop_data_from_minimum_date_created,
+    ingest_data,
+    insert_data,
+    to_records,
+)
+from utils.db_manager import configure_pool
+
+TABLE_NAME = "MANUAL_JOURNAL_ENTRY_TRANSACTION"
+
+
+def make_clean_journal_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Builds a frame shaped like the output of clean_data for journal entries."""
+    rng = np.random.default_rng(seed)
+    start = date(2024, 10, 1)
+    accounting_dates = pd.to_datetime(start) + pd.to_timedelta(rng.integers(0, 365, rows), "D")
+    account_no = rng.integers(1000, 1400, rows).astype(str)
+    business_unit_id = rng.integers(100, 140, rows).astype(str)
+
+    df = pd.DataFrame(
+        {
+            "company_id": "01",
+            "entry_id": np.arange(rows).astype(str),
+            "business_unit_id": business_unit_id,
+            "account_no": account_no,
+            "amount_cents": pd.array(
+                np.rint(rng.normal(0, 5000, rows) * CENTS).astype(np.int64), dtype="Int64"
+            ),
+            "accounting_date": accounting_dates,
+            "data_type": "Actual",
+            "remarks": None,
+            "comments": None,
+            "follow_up_status": None,
+            "entry_type": "Manual",
+            "source_system": "GL",
+            "reversed": "N",
+            "approval": "Approved",
+            "reversing_date": pd.NaT,
+            "date_created": accounting_dates,
+            "user_created": "bench",
+            "date_closed": pd.NaT,
+            "user_closed": None,
+            "date_posted": accounting_dates,
+            "user_posted": "bench",
+            "company": "Bench Co",
+            "business_unit": "BU " + pd.Series(business_unit_id),
+            "account": "Account " + pd.Series(account_no),
+            "account_type": "Expense",
+            "period_id": None,
+            "rad_data": np.where(
+                rng.random(rows) < 0.3, '[{"rad_type_id": "project", "rad_id": "P1"}]', None
+            ),
+        }
+    )
+    return compact_frame(df)
+
+
+def bench_row_at_a_time(df: pd.DataFrame) -> float:
+    st.session_state["table_name"] = TABLE_NAME
+    started = time.perf_counter()
+    drop_data_from_minimum_date_created(df)
+    insert_data(to_records(df))
+    return time.perf_counter() - started
+
+
+def bench_copy(df: pd.DataFrame) -> float:
+    started = time.perf_counter()
+    ingest_data(df, table_name=TABLE_NAME)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument(
+        "--dsn", help="database to benchmark against (defaults to the secrets file)"
+    )
+    parser.add_argument(
+        "--skip-row-at-a-time",
+        action="store_true",
+        help="only time the COPY path (the row path takes minutes on large files)",
+    )
+    args = parser.parse_args()
+
+    if args.dsn:
+        configure_pool(dsn=args.dsn)
+
+    df = make_clean_journal_frame(args.rows)
+
+    results = {}
+    if not args.skip_row_at_a_time:
+        results["insert_data (row-at-a-time)"] = bench_row_at_a_time(df)
+    results["ingest_data (COPY)"] = bench_copy(df)
+
+    for name, seconds in results.items():
+        print(f"{name:<32} {seconds:8.2f}s {args.rows / seconds:12,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
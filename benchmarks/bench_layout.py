@@ -0,0 +1,97 @@
+"""Times the hot access paths of the fact tables, to compare schema layouts.
+
+Run it before and after a schema migration against the same data. The deletes
+run inside a transaction that is rolled back, so the data is left untouched.
+
+    python -m benchmarks.bench_layout --anchor 2025-03-15
+"""
+
+import argparse
+import time
+from datetime import date
+
+from utils.db_manager import configure_pool, connection
+
+QUERIES = {
+    "re-ingest delete, last month": (
+        "DELETE FROM finance.manual_journal_entry_transaction WHERE accounting_date >= %(month_start)s",
+        True,
+    ),
+    "boundary month read": (
+        """
+            SELECT account_no, business_unit_id, rad_data, SUM(amount)
+            FROM finance.manual_journal_entry_transaction
+            WHERE accounting_date >= %(month_start)s AND accounting_date <= %(anchor)s
+            GROUP BY account_no, business_unit_id, rad_data
+        """,
+        False,
+    ),
+    "single account history": (
+        """
+            SELECT DATE_TRUNC('month', accounting_date), SUM(amount)
+            FROM finance.manual_journal_entry_transaction
+            WHERE account_no = %(account_no)s AND accounting_date <= %(anchor)s
+            GROUP BY 1
+        """,
+        False,
+    ),
+    "budget for the fiscal year": (
+        """
+            SELECT account_no, business_unit_id, rad_data, SUM(amount)
+            FROM finance.manual_budget
+            WHERE fiscal_year >= finance.get_fiscal_year(%(anchor)s)
+            GROUP BY account_no, business_unit_id, rad_data
+        """,
+        False,
+    ),
+    "re-ingest delete, budget": (
+        "DELETE FROM finance.manual_budget WHERE accounting_date >= %(month_start)s",
+        True,
+    ),
+    "trial_balance_summary": (
+        "SELECT * FROM finance.trial_balance_summary(%(anchor)s)",
+        False,
+    ),
+}
+
+
+def time_query(conn, query: str, params: dict, rollback: bool, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        with conn.cursor() as cursor:
+            started = time.perf_counter()
+            cursor.execute(query, params)
+            best = min(best, time.perf_counter() - started)
+        if rollback:
+            conn.rollback()
+    conn.rollback()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--anchor", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--account-no", default="1001")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--dsn", help="database to benchmark against (defaults to the secrets file)"
+    )
+    args = parser.parse_args()
+
+    if args.dsn:
+        configure_pool(dsn=args.dsn)
+
+    params = {
+        "anchor": args.anchor,
+        "month_start": args.anchor.replace(day=1),
+        "account_no": args.account_no,
+    }
+
+    with connection() as conn:
+        for name, (query, rollback) in QUERIES.items():
+            seconds = time_query(conn, query, params, rollback, args.repeat)
+            print(f"{name:<32} {seconds * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""Times the upload pipeline and the ledger SQL functions on a synthetic ledger.
+
+Generates a journal and a budget csv with benchmarks.synthetic, then runs each
+case in its own process and appends rows/sec, latency and peak memory per
+case to a JSON lines file, so runs can be compared over time. The ledger
+tables are written to, only run it against a throwaway database:
+
+    python -m benchmarks.bench_suite --rows 200000 --dsn postgresql://... --compare
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from benchmarks.synthetic import LedgerShape, make_ledger_csv
+
+JOURNAL = "MANUAL_JOURNAL_ENTRY_TRANSACTION"
+BUDGET = "MANUAL_BUDGET"
+DEFAULT_OUTPUT = "bench_results.jsonl"
+
+
+def read_upload(path: str) -> pd.DataFrame:
+    return pd.read_csv(path, dtype=str)
+
+
+def clean_upload(path: str, table_name: str) -> pd.DataFrame:
+    from pages.upload.utils import clean_data
+
+    return clean_data(read_upload(path), table_name)
+
+
+def setup_st(table_name: str):
+    import streamlit as st
+
+    # drop_data_from_minimum_date_created and insert_data read the page's table
+    st.session_state["table_name"] = table_name
+
+
+def case_clean_data(ctx: dict, table_name: str):
+    from pages.upload.utils import clean_data
+
+    raw = read_upload(ctx[table_name])
+    return len(raw), lambda: clean_data(raw, table_name)
+
+
+def case_coerce_columns(ctx: dict, table_name: str):
+    # the column plan that replaced convert_date_cols
+    from constants.constants import ManualJournalEntryTransaction
+    from pages.upload.utils import normalize_column_names
+    from pages.upload.validation import coerce_columns
+
+    raw = read_upload(ctx[table_name])
+    raw.columns = normalize_column_names(raw.columns)
+    return len(raw), lambda: coerce_columns(raw, ManualJournalEntryTransaction)
+
+
+def case_ingest_data(ctx: dict, table_name: str):
+    from pages.upload.utils import ingest_data
+
+    df = clean_upload(ctx[table_name], table_name)
+    return len(df), lambda: ingest_data(df, table_name=table_name)
+
+
+def case_drop_data(ctx: dict, table_name: str):
+    from pages.upload.utils import drop_data_from_minimum_date_created
+
+    setup_st(table_name)
+    df = clean_upload(ctx[table_name], table_name)
+    return len(df), lambda: drop_data_from_minimum_date_created(df)
+
+
+def case_insert_data(ctx: dict, table_name: str):
+    from pages.upload.utils import insert_data
+
+    setup_st(table_name)
+    from pages.upload.utils import to_records
+
+    records = to_records(clean_upload(ctx[table_name], table_name).head(ctx["insert_rows"]))
+    return len(records), lambda: insert_data(records)
+
+
+def case_sql(ctx: dict, query: str, params: tuple):
+    from utils.db_manager import connection
+
+    def run():
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params)
+            if cursor.description:
+                cursor.fetchall()
+            # the connection rolls back on release, the ledger is left as it was
+
+    return ctx["rows"], run
+
+
+def synthetic_grouping(ctx: dict) -> str:
+    """A two level account grouping over the synthetic accounts, in blocks of 100."""
+    accounts = [str(1000 + index) for index in range(ctx["accounts"])]
+    grouping = {
+        "ALL_ACCOUNTS": [
+            {f"BLOCK_{start // 100}": accounts[start : start + 100]}
+            for start in range(0, len(accounts), 100)
+        ]
+    }
+    return json.dumps(grouping)
+
+
+GROUPING_SQL = """
+    WITH g AS (
+        INSERT INTO finance.grouping (name, dimension, grouping, created_by)
+        VALUES ('bench_suite', 'account', %s, 'bench')
+        RETURNING id
+    )
+    SELECT id, finance.compile_grouping(id) FROM g
+"""
+
+
+def case_compile_grouping(ctx: dict):
+    return case_sql(ctx, GROUPING_SQL, (synthetic_grouping(ctx),))
+
+
+def case_grouping_rollup(ctx: dict):
+    from utils.db_manager import connection
+
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(GROUPING_SQL, (synthetic_grouping(ctx),))
+        grouping_id = cursor.fetchone()[0]
+        conn.commit()
+
+    def cleanup():
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM finance.grouping WHERE id = %s", (grouping_id,))
+            conn.commit()
+
+    rows, run = case_sql(
+        ctx,
+        "SELECT * FROM finance.grouping_rollup(%s, %s, %s)",
+        (grouping_id, ctx["start"], ctx["anchor"]),
+    )
+    return rows, run, cleanup
+
+
+def cases(ctx: dict) -> dict:
+    """Case name to its setup, which returns (rows, callable to time, *cleanups), in run order."""
+    start, anchor = ctx["start"], ctx["anchor"]
+    return {
+        "clean_data journal": lambda: case_clean_data(ctx, JOURNAL),
+        "clean_data budget": lambda: case_clean_data(ctx, BUDGET),
+        "coerce_columns journal": lambda: case_coerce_columns(ctx, JOURNAL),
+        "ingest_data journal": lambda: case_ingest_data(ctx, JOURNAL),
+        "ingest_data journal unchanged": lambda: case_ingest_data(ctx, JOURNAL),
+        "ingest_data budget": lambda: case_ingest_data(ctx, BUDGET),
+        "refresh_period_balance": lambda: case_sql(
+            ctx, "SELECT finance.refresh_period_balance(%s)", (start,)
+        ),
+        "trial_balance_by_rad_journal_entry": lambda: case_sql(
+            ctx,
+            "SELECT * FROM finance.trial_balance_by_rad_journal_entry(%s, %s)",
+            (start, anchor),
+        ),
+        "trial_balance_journal_entry": lambda: case_sql(
+            ctx,
+            "SELECT * FROM finance.trial_balance_journal_entry(%s, %s)",
+            (start, anchor),
+        ),
+        "trial_balance_summary": lambda: case_sql(
+            ctx, "SELECT * FROM finance.trial_balance_summary(%s)", (anchor,)
+        ),
+        "compile_grouping": lambda: case_compile_grouping(ctx),
+        "grouping_rollup": lambda: case_grouping_rollup(ctx),
+        "drop_data_from_minimum_date_created journal": lambda: case_drop_data(ctx, JOURNAL),
+        "insert_data journal": lambda: case_insert_data(ctx, JOURNAL),
+    }
+
+
+def memory_mb(field: str) -> float:
+    """VmRSS or VmHWM (the peak) of this process, from /proc on linux."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_memory():
+    """Resets VmHWM so the peak covers the timed call only, not the case setup."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def run_case(name: str, ctx: dict, results):
+    if ctx["dsn"]:
+        from utils.db_manager import configure_pool
+
+        configure_pool(dsn=ctx["dsn"])
+
+    try:
+        rows, run, *cleanup = cases(ctx)[name]()
+        gc.collect()
+        reset_peak_memory()
+        rss_before = memory_mb("VmRSS")
+        started = time.perf_counter()
+        try:
+            run()
+        finally:
+            seconds = time.perf_counter() - started
+            peak_mb = memory_mb("VmHWM") - rss_before
+            for step in cleanup:
+                step()
+        results.put({"rows": rows, "seconds": seconds, "peak_mb": peak_mb})
+    except Exception as e:
+        results.put({"error": str(e)})
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def previous_results(path: str) -> dict:
+    """The last recorded result of every (case, rows), to compare a run against."""
+    previous = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                previous[(record["case"], record["rows"])] = record
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=LedgerShape.rows)
+    parser.add_argument("--accounts", type=int, default=LedgerShape.accounts)
+    parser.add_argument("--business-units", type=int, default=LedgerShape.business_units)
+    parser.add_argument("--rad-types", type=int, default=LedgerShape.rad_types)
+    parser.add_argument("--rad-ids", type=int, default=LedgerShape.rad_ids)
+    parser.add_argument(
+        "--insert-rows",
+        type=int,
+        default=2_000,
+        help="rows given to the row-at-a-time insert_data, which takes minutes on large files",
+    )
+    parser.add_argument("--case", action="append", help="only run these cases")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--label", default="", help="recorded with every result")
+    parser.add_argument(
+        "--compare", action="store_true", help="show the change against the last run"
+    )
+    parser.add_argument(
+        "--dsn", help="database to benchmark against (defaults to the secrets file)"
+    )
+    args = parser.parse_args()
+
+    shape = LedgerShape(
+        rows=args.rows,
+        accounts=args.accounts,
+        business_units=args.business_units,
+        rad_types=args.rad_types,
+        rad_ids=args.rad_ids,
+    )
+    previous = previous_results(args.output)
+    run_id = datetime.now().isoformat(timespec="seconds")
+    commit = git_commit()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        ctx = {
+            "dsn": args.dsn,
+            "rows": args.rows,
+            "accounts": args.accounts,
+            "insert_rows": args.insert_rows,
+            "start": shape.start,
+            # half way through the generated dates
+            "anchor": shape.start + timedelta(days=shape.days // 2),
+        }
+        for table_name, kind in [(JOURNAL, "journal"), (BUDGET, "budget")]:
+            ctx[table_name] = os.path.join(data_dir, f"{kind}.csv")
+            make_ledger_csv(kind, shape).to_csv(ctx[table_name], index=False)
+
+        context = multiprocessing.get_context("spawn")
+        with open(args.output, "a") as output:
+            for name in cases(ctx):
+                if args.case and name not in args.case:
+                    continue
+
+                results = context.Queue()
+                process = context.Process(target=run_case, args=(name, ctx, results))
+                process.start()
+                result = results.get()
+                process.join()
+
+                if "error" in result:
+                    print(f"{name:<44} failed: {result['error']}")
+                    continue
+
+                record = {
+                    "run_id": run_id,
+                    "label": args.label,
+                    "commit": commit,
+                    "case": name,
+                    "rows": result["rows"],
+                    "seconds": round(result["seconds"], 4),
+                    "rows_per_sec": round(result["rows"] / result["seconds"], 1),
+                    "peak_mb": round(result["peak_mb"], 1),
+                    "shape": {**asdict(shape), "start": shape.start.isoformat()},
+                }
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+
+                line = (
+                    f"{name:<44} {record['rows']:>9} rows {record['seconds']:9.3f} s "
+                    f"{record['rows_per_sec']:12,.0f} rows/s {record['peak_mb']:8.1f} MB"
+                )
+                last = previous.get((name, record["rows"]))
+                if args.compare and last:
+                    change = record["seconds"] / last["seconds"] - 1
+                    line += f" {change:+7.1%} vs {last['commit'] or last['run_id']}"
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
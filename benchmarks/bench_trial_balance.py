@@ -0,0 +1,250 @@
+"""EXPLAIN ANALYZE comparison of the trial balance summary strategies.
+
+Loads a synthetic journal into finance.manual_journal_entry_transaction (the
+table is TRUNCATED first, so only run this against a throwaway database),
+rebuilds the period balance snapshot and then times, for one anchor date:
+
+* three per-window aggregates over the full history glued with UNION ALL
+  (what trial_balance_summary used to run),
+* the same three windows as FILTER aggregates of a single journal scan,
+* finance.trial_balance_by_rad_windows, which reads the snapshot once and
+  only the boundary months from the journal,
+* finance.trial_balance_summary end to end.
+
+    python -m benchmarks.bench_trial_balance --rows 3000000 --anchor 2025-03-15
+"""
+
+import argparse
+import json
+import time
+from datetime import date
+
+from utils.db_manager import configure_pool, connection
+
+LOAD_SQL = """
+    INSERT INTO finance.manual_journal_entry_transaction (
+        company_id, entry_id, business_unit_id, account_no, amount, accounting_date,
+        data_type, company, business_unit, account, account_type, rad_data
+    )
+    SELECT
+        '01',
+        g::TEXT,
+        bu::TEXT,
+        acct::TEXT,
+        ROUND((RANDOM() * 10000 - 5000)::NUMERIC, 2),
+        %(first_date)s::DATE + (RANDOM() * %(days)s)::INTEGER,
+        'Actual',
+        'Bench Co',
+        'BU ' || bu,
+        'Account ' || acct,
+        'Expense',
+        CASE WHEN RANDOM() < 0.3
+            THEN jsonb_build_array(jsonb_build_object('rad_type_id', 'project', 'rad_id', 'P' || (g %% %(rad_ids)s)))
+        END
+    FROM (
+        SELECT
+            g,
+            1000 + (RANDOM() * %(accounts)s)::INTEGER AS acct,
+            100 + (RANDOM() * %(business_units)s)::INTEGER AS bu
+        FROM generate_series(1, %(rows)s) g
+    ) s
+"""
+
+PER_WINDOW_SQL = """
+    SELECT
+        j.account_no,
+        j.business_unit_id,
+        j.rad_data,
+        SUM(CASE WHEN j.accounting_date < %(start_{i})s THEN j.amount ELSE 0 END) AS opening_balance,
+        SUM(CASE WHEN j.accounting_date BETWEEN %(start_{i})s AND %(end_{i})s THEN j.amount ELSE 0 END) AS activity_balance,
+        SUM(CASE WHEN j.accounting_date <= %(end_{i})s THEN j.amount ELSE 0 END) AS closing_balance,
+        COUNT(*) FILTER (WHERE j.accounting_date BETWEEN %(start_{i})s AND %(end_{i})s) AS transaction_count,
+        %(name_{i})s AS time_period
+    FROM finance.manual_journal_entry_transaction j
+    WHERE j.accounting_date <= %(end_{i})s
+    GROUP BY j.account_no, j.business_unit_id, j.rad_data
+"""
+
+SINGLE_SCAN_COLUMNS_SQL = """
+        SUM(j.amount) FILTER (WHERE j.accounting_date < %(start_{i})s) AS opening_{i},
+        SUM(j.amount) FILTER (WHERE j.accounting_date BETWEEN %(start_{i})s AND %(end_{i})s) AS activity_{i},
+        COUNT(*) FILTER (WHERE j.accounting_date BETWEEN %(start_{i})s AND %(end_{i})s) AS count_{i},
+        COUNT(*) FILTER (WHERE j.accounting_date <= %(end_{i})s) AS rows_{i}"""
+
+SINGLE_SCAN_WINDOW_SQL = """
+        (%(name_{i})s, t.opening_{i}, t.activity_{i}, t.count_{i}, t.rows_{i})"""
+
+SINGLE_SCAN_SQL = """
+    WITH totals AS (
+        SELECT
+            j.account_no,
+            j.business_unit_id,
+            j.rad_data,
+            {columns}
+        FROM finance.manual_journal_entry_transaction j
+        WHERE j.accounting_date <= %(max_end)s
+        GROUP BY j.account_no, j.business_unit_id, j.rad_data
+    )
+    SELECT
+        w.time_period,
+        t.account_no,
+        t.business_unit_id,
+        t.rad_data,
+        COALESCE(w.opening_balance, 0) AS opening_balance,
+        COALESCE(w.activity_balance, 0) AS activity_balance,
+        COALESCE(w.opening_balance, 0) + COALESCE(w.activity_balance, 0) AS closing_balance,
+        w.transaction_count
+    FROM totals t
+    CROSS JOIN LATERAL (VALUES {windows}
+    ) AS w(time_period, opening_balance, activity_balance, transaction_count, row_count)
+    WHERE w.row_count > 0
+"""
+
+SNAPSHOT_SQL = """
+    SELECT * FROM finance.trial_balance_by_rad_windows(
+        %(names)s::TEXT[], %(starts)s::DATE[], %(ends)s::DATE[]
+    )
+"""
+
+# the upload keeps these up to date, the bench loads around it
+DIMENSIONS_SQL = [
+    """
+        INSERT INTO finance.account (account_no, account, account_type)
+        SELECT DISTINCT account_no, account, account_type
+        FROM finance.manual_journal_entry_transaction
+        ON CONFLICT (account_no) DO NOTHING
+    """,
+    """
+        INSERT INTO finance.business_unit (business_unit_id, business_unit)
+        SELECT DISTINCT business_unit_id, business_unit
+        FROM finance.manual_journal_entry_transaction
+        ON CONFLICT (business_unit_id) DO NOTHING
+    """,
+]
+
+SUMMARY_SQL = "SELECT * FROM finance.trial_balance_summary(%(anchor)s)"
+
+
+def fiscal_windows(anchor: date) -> list[tuple[str, date, date]]:
+    """CurrentMonth, CurrentYTD and PriorYTD as computed by trial_balance_summary."""
+    fiscal_year = anchor.year + 1 if anchor.month >= 10 else anchor.year
+    fiscal_start = date(fiscal_year - 1, 10, 1)
+    try:
+        prior_anchor = anchor.replace(year=anchor.year - 1)
+    except ValueError:
+        # Feb 29th, postgres rolls back to Feb 28th
+        prior_anchor = anchor.replace(year=anchor.year - 1, day=28)
+    return [
+        ("CurrentMonth", anchor.replace(day=1), anchor),
+        ("CurrentYTD", fiscal_start, anchor),
+        ("PriorYTD", fiscal_start.replace(year=fiscal_start.year - 1), prior_anchor),
+    ]
+
+
+def load_journal(
+    cursor, rows: int, years: int, accounts: int, business_units: int, rad_ids: int
+):
+    first_date = date(date.today().year - years, 1, 1)
+    cursor.execute("TRUNCATE finance.manual_journal_entry_transaction")
+    cursor.execute(
+        "SELECT finance.create_fiscal_year_partitions(%s, %s)",
+        (first_date, date.today()),
+    )
+    cursor.execute(
+        LOAD_SQL,
+        {
+            "rows": rows,
+            "first_date": first_date,
+            "days": years * 365,
+            "accounts": accounts,
+            "business_units": business_units,
+            "rad_ids": rad_ids,
+        },
+    )
+    for query in DIMENSIONS_SQL:
+        cursor.execute(query)
+    cursor.execute("SELECT finance.refresh_period_balance('0001-01-01')")
+    cursor.execute("ANALYZE finance.manual_journal_entry_transaction")
+    cursor.execute("ANALYZE finance.period_balance")
+
+
+def explain(cursor, query: str, params: dict) -> dict:
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params)
+    plan = cursor.fetchone()[0][0]
+    top = plan["Plan"]
+    return {
+        "execution_ms": plan["Execution Time"],
+        "rows": top["Actual Rows"],
+        "shared_blocks": top.get("Shared Hit Blocks", 0)
+        + top.get("Shared Read Blocks", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--years", type=int, default=6)
+    parser.add_argument("--accounts", type=int, default=150)
+    parser.add_argument("--business-units", type=int, default=15)
+    parser.add_argument("--rad-ids", type=int, default=4)
+    parser.add_argument("--anchor", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument(
+        "--dsn", help="database to benchmark against (defaults to the secrets file)"
+    )
+    args = parser.parse_args()
+
+    if args.dsn:
+        configure_pool(dsn=args.dsn)
+
+    windows = fiscal_windows(args.anchor)
+    params = {
+        "anchor": args.anchor,
+        "names": [name for name, _, _ in windows],
+        "starts": [start for _, start, _ in windows],
+        "ends": [end for _, _, end in windows],
+        "max_end": max(end for _, _, end in windows),
+    }
+    for i, (name, start, end) in enumerate(windows):
+        params.update({f"name_{i}": name, f"start_{i}": start, f"end_{i}": end})
+
+    per_window_sql = "\nUNION ALL\n".join(
+        PER_WINDOW_SQL.format(i=i) for i in range(len(windows))
+    )
+    single_scan_sql = SINGLE_SCAN_SQL.format(
+        columns=",".join(SINGLE_SCAN_COLUMNS_SQL.format(i=i) for i in range(len(windows))),
+        windows=",".join(SINGLE_SCAN_WINDOW_SQL.format(i=i) for i in range(len(windows))),
+    )
+    queries = {
+        "three per-window scans + UNION ALL": per_window_sql,
+        "single FILTER scan of the journal": single_scan_sql,
+        "trial_balance_by_rad_windows": SNAPSHOT_SQL,
+        "trial_balance_summary": SUMMARY_SQL,
+    }
+
+    with connection() as conn, conn.cursor() as cursor:
+        if not args.skip_load:
+            started = time.perf_counter()
+            load_journal(
+                cursor,
+                args.rows,
+                args.years,
+                args.accounts,
+                args.business_units,
+                args.rad_ids,
+            )
+            conn.commit()
+            print(f"loaded {args.rows:,} rows in {time.perf_counter() - started:.1f}s")
+
+        results = {name: explain(cursor, query, params) for name, query in queries.items()}
+
+    print(f"anchor {args.anchor}, windows {json.dumps(windows, default=str)}")
+    for name, result in results.items():
+        print(
+            f"{name:<38} {result['execution_ms']:10.1f} ms"
+            f" {result['rows']:10,} rows {result['shared_blocks']:10,} blocks"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Synthetic general ledger csvs shaped like the files the upload page takes.
+
+Headers are title cased with spaces, dates are %m/%d/%Y and a share of the
+amounts carry thousands separators, so the generated files go through every
+step of clean_data. Columns follow ManualJournalEntryTransaction and
+ManualBudget, plus one ``<type> RAD`` column per RAD type.
+
+    python -m benchmarks.synthetic journal 1000000 journal.csv --accounts 2000
+"""
+
+import argparse
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from constants.constants import ManualBudget, ManualJournalEntryTransaction
+from pages.upload.validation import DATE_FORMAT, column_plan
+
+ACCOUNT_TYPES = np.array(["Asset", "Liability", "Equity", "Revenue", "Expense"])
+MODELS = {"journal": ManualJournalEntryTransaction, "budget": ManualBudget}
+
+
+@dataclass
+class LedgerShape:
+    """Row count and cardinalities of a synthetic ledger."""
+
+    rows: int = 100_000
+    accounts: int = 400
+    business_units: int = 40
+    rad_types: int = 2
+    # distinct values per RAD type, and the share of rows carrying each type
+    rad_ids: int = 50
+    rad_density: float = 0.3
+    start: date = date(2024, 10, 1)
+    days: int = 365
+    seed: int = 0
+
+
+def make_ledger_csv(kind: str, shape: LedgerShape) -> pd.DataFrame:
+    """A raw upload of ``kind`` ("journal" or "budget") as a frame of strings."""
+    rng = np.random.default_rng(shape.seed)
+    rows = shape.rows
+
+    account_index = rng.integers(0, shape.accounts, rows)
+    account_no = (1000 + account_index).astype(str)
+    business_unit_id = (100 + rng.integers(0, shape.business_units, rows)).astype(str)
+
+    day_offsets = rng.integers(0, shape.days, rows)
+    if kind == "budget":
+        # budgets land on the first of the month
+        months = pd.to_datetime(shape.start) + pd.to_timedelta(day_offsets, "D")
+        accounting_date = months.to_period("M").to_timestamp()
+    else:
+        accounting_date = pd.to_datetime(shape.start) + pd.to_timedelta(day_offsets, "D")
+    dates = pd.Series(accounting_date).dt.strftime(DATE_FORMAT).to_numpy()
+
+    amounts = rng.normal(0, 5000, rows).round(2)
+    amount = pd.Series(amounts).map("{:.2f}".format)
+    with_separators = rng.random(rows) < 0.1
+    amount[with_separators] = pd.Series(amounts[with_separators]).map("{:,.2f}".format).to_numpy()
+
+    generated = {
+        "account_no": account_no,
+        "account": np.char.add("Account ", account_no),
+        "account_type": ACCOUNT_TYPES[account_index % len(ACCOUNT_TYPES)],
+        "business_unit_id": business_unit_id,
+        "business_unit": np.char.add("BU ", business_unit_id),
+        "amount": amount.to_numpy(),
+        "accounting_date": dates,
+        "entry_id": np.arange(rows).astype(str),
+        "budget_id": np.arange(rows).astype(str),
+        "company_id": "01",
+        "company": "Synthetic Co",
+        "chart_id": "1",
+        "chart": "Operating",
+        "data_type": "Budget" if kind == "budget" else "Actual",
+        "period_id": pd.Series(accounting_date).dt.strftime("%Y%m").to_numpy(),
+    }
+
+    columns = {}
+    for field, data_type in column_plan(MODELS[kind]).items():
+        if field in generated:
+            values = generated[field]
+        elif data_type is date:
+            # audit dates follow the accounting date, the optional ones are mostly empty
+            values = np.where(rng.random(rows) < 0.2, dates, "")
+        else:
+            values = np.where(rng.random(rows) < 0.5, f"{field} text", "")
+        columns[field.replace("_", " ").title()] = values
+
+    for rad_type in range(shape.rad_types):
+        rad_ids = np.char.add(f"R{rad_type}-", rng.integers(0, shape.rad_ids, rows).astype(str))
+        columns[f"Type{rad_type} RAD"] = np.where(
+            rng.random(rows) < shape.rad_density, rad_ids, ""
+        )
+
+    return pd.DataFrame(columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("kind", choices=list(MODELS))
+    parser.add_argument("rows", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--accounts", type=int, default=LedgerShape.accounts)
+    parser.add_argument("--business-units", type=int, default=LedgerShape.business_units)
+    parser.add_argument("--rad-types", type=int, default=LedgerShape.rad_types)
+    parser.add_argument("--rad-ids", type=int, default=LedgerShape.rad_ids)
+    parser.add_argument("--seed", type=int, default=LedgerShape.seed)
+    args = parser.parse_args()
+
+    shape = LedgerShape(
+        rows=args.rows,
+        accounts=args.accounts,
+        business_units=args.business_units,
+        rad_types=args.rad_types,
+        rad_ids=args.rad_ids,
+        seed=args.seed,
+    )
+    make_ledger_csv(args.kind, shape).to_csv(args.path, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,31 @@
 # logger_config.py
+import atexit
+import json
 import logging
+import queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+# attributes every LogRecord has, anything else was passed through ``extra``
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the time, level, message and any ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES
+        )
+        return json.dumps(entry, default=str)
 
 
 def get_logger(name: str = "app", log_file: str = "app.log") -> logging.Logger:
@@ -8,9 +34,14 @@ def get_logger(name: str = "app", log_file: str = "app.log") -> logging.Logger:
 
     # Prevent adding multiple handlers if logger is imported more than once
     if not logger.handlers:
-        handler = logging.FileHandler(log_file, mode="a")
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        # callers only put the record on a queue, a listener thread writes the file
+        records = queue.SimpleQueue()
+        handler = logging.FileHandler(log_file, mode="a", delay=True)
+        handler.setFormatter(JsonFormatter())
+        listener = QueueListener(records, handler)
+        listener.start()
+        atexit.register(listener.stop)
+
+        logger.addHandler(QueueHandler(records))
 
     return logger
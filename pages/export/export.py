@@ -0,0 +1,103 @@
+import os
+from datetime import date
+import streamlit as st
+from utils.arrow_fetch import AMOUNT
+from utils.export import EXPORT_DOWNLOAD_BYTES, EXPORT_FORMATS, export_path, export_query
+from app import logger
+
+# the ledger's fact tables, exported row by row over a range of accounting dates
+TABLE_EXPORTS = {
+    "Journal Entries": "MANUAL_JOURNAL_ENTRY_TRANSACTION",
+    "Budget": "MANUAL_BUDGET",
+}
+TRIAL_BALANCE = "Trial Balance"
+# the trial balance function's balances declare no scale, they are exported to the cent
+TRIAL_BALANCE_DTYPES = dict.fromkeys(
+    ["opening_balance", "activity_balance", "closing_balance"], AMOUNT
+)
+
+st.title("📤 Export")
+st.write(
+    "Exports are written a chunk at a time straight from the database, so large "
+    "ranges don't have to fit in memory. A prepared file is reused until the ledger changes."
+)
+
+try:
+    dataset, file_format = st.columns(2)
+    dataset = dataset.selectbox("Data", options=[*TABLE_EXPORTS, TRIAL_BALANCE])
+    file_format = file_format.selectbox("Format", options=list(EXPORT_FORMATS))
+
+    if dataset == TRIAL_BALANCE:
+        anchor_date = st.date_input("Anchor date", value=date.today())
+        table_name = None
+        query = "SELECT * FROM finance.trial_balance_summary(%s)"
+        params = (anchor_date,)
+        dtypes = TRIAL_BALANCE_DTYPES
+        file_name = f"trial_balance_{anchor_date}"
+    else:
+        start, end = st.columns(2)
+        start_date = start.date_input("From", value=date(date.today().year, 1, 1))
+        end_date = end.date_input("To", value=date.today())
+        table_name = TABLE_EXPORTS[dataset]
+        query = f"""
+            SELECT *
+            FROM finance.{table_name.lower()}
+            WHERE accounting_date BETWEEN %s AND %s
+            ORDER BY accounting_date, id
+        """
+        params = (start_date, end_date)
+        dtypes = None
+        file_name = f"{table_name.lower()}_{start_date}_{end_date}"
+
+    extension, mime = EXPORT_FORMATS[file_format]
+    file_name = f"{file_name}.{extension}"
+
+    prepared = st.session_state.get("export_file")
+    if prepared and prepared["path"] != export_path(query, params, file_format, dtypes):
+        # another export was picked, or the ledger changed since it was prepared
+        del st.session_state["export_file"]
+        prepared = None
+
+    if st.button("Prepare Export 📦"):
+        with st.spinner("Writing the export..."):
+            path = export_query(
+                query, params, fmt=file_format, dtypes=dtypes, table_name=table_name
+            )
+        prepared = {"file_name": file_name, "path": path, "mime": mime}
+        st.session_state["export_file"] = prepared
+
+    if prepared:
+        try:
+            size = os.stat(prepared["path"]).st_size
+        except FileNotFoundError:
+            # evicted to make room for other exports, write it again
+            with st.spinner("Writing the export..."):
+                prepared["path"] = export_query(
+                    query, params, fmt=file_format, dtypes=dtypes, table_name=table_name
+                )
+            size = os.stat(prepared["path"]).st_size
+
+        # checked before the file is opened, a download button reads all of it into memory
+        if size > EXPORT_DOWNLOAD_BYTES:
+            st.info(
+                f"{prepared['file_name']} is {size / 2**20:,.0f} MB, more than the "
+                f"{EXPORT_DOWNLOAD_BYTES / 2**20:,.0f} MB the page can hand to the browser. "
+                f"It is on the server at `{prepared['path']}`."
+            )
+        else:
+            with open(prepared["path"], "rb") as export_file:
+                st.download_button(
+                    f"⬇️ Download {prepared['file_name']}",
+                    data=export_file,
+                    file_name=prepared["file_name"],
+                    mime=prepared["mime"],
+                    use_container_width=True,
+                )
+            st.caption(
+                f"{size / 2**20:,.1f} MB, held in the server's memory while it is offered here."
+            )
+
+except Exception as e:
+    st.subheader("Export Error")
+    st.error(f"{e}")
+    logger.error(e)
@@ -1,8 +1,8 @@
 import streamlit as st
-import pandas as pd
 import json
 from utils.ag_grid import *
-from utils.db_manager import get_connection
+from utils.db_manager import connection
+from utils.query_cache import GROUPING, bump_data_version
 from pages.grouping.utils import *
 
 # instructions container
@@ -39,27 +39,55 @@ with st.container():
 with st.container():
     st.markdown("<h1>📎 Data Management Console</h1>", unsafe_allow_html=True)
 
-    # main management console
+    # the checks of the last saved grouping, kept across the rerun that refreshes the grid
+    show_grouping_validation(st.session_state.pop("grouping_validation", None))
+
+    # main management console, the reads below check out their own connections and
+    # the writes hold one only while they run
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        query = """
-                    SELECT id, name, grouping::TEXT, dimension, created_by
-                    FROM finance.grouping
-                    WHERE is_active = TRUE
-                    ORDER BY created_at DESC;
-                """
-        cursor.execute(query)
-        data = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        raw_data = pd.DataFrame(data, columns=columns)
-        grid_response = get_ag_grid_instance(raw_data)
+        # filtering, sorting and paging happen in the database, the grid gets one page
+        search, dimension_filter, sort_by, direction = st.columns(4)
+        search = search.text_input("Search by name", key="grouping_search")
+        dimension_filter = dimension_filter.selectbox(
+            "Dimension",
+            options=["", "account", "business_unit", "report"],
+            format_func=lambda option: option or "All",
+            key="grouping_dimension_filter",
+        )
+        sort_by = sort_by.selectbox(
+            "Sort by", options=list(GROUPING_SORT_COLUMNS.keys()), key="grouping_sort"
+        )
+        descending = direction.selectbox(
+            "Order",
+            options=[True, False],
+            format_func=lambda option: "Descending" if option else "Ascending",
+            key="grouping_order",
+        )
+
+        page = st.session_state.get("grouping_page", 1)
+        raw_data, total = get_grouping_page(
+            page=page,
+            sort_by=sort_by,
+            descending=descending,
+            search=search,
+            dimension=dimension_filter,
+        )
+        page_count = max(1, -(-total // GROUPING_PAGE_SIZE))
+        if page > page_count:
+            st.session_state["grouping_page"] = page_count
+            st.rerun()
+
+        grid_response = get_ag_grid_instance(raw_data, paginate=False)
+        st.number_input(
+            "Page", min_value=1, max_value=page_count, key="grouping_page"
+        )
+        st.caption(f"Page {page} of {page_count}, {total} groupings")
 
         selected = grid_response["selected_rows"]
         if selected is not None:
             row = selected.to_dict("records")[0]
 
-            read_json = json.loads(row["grouping"])
+            read_json = json.loads(get_grouping_json(row["id"]))
             read_json_str = json.dumps(read_json, indent=4, sort_keys=False)
             name = row["name"]
             st.download_button(
@@ -94,13 +122,20 @@ with st.container():
                     ):
                         parsed_json = json.load(uploaded_json_file)
                         json_str = json.dumps(parsed_json)
-                        cursor.execute(
-                            """
-                                INSERT INTO finance.grouping (name, dimension, grouping, created_by) VALUES (%s, %s, %s, %s)
-                            """,
-                            (name, dimension, json_str, created_by),
+                        with connection() as conn, conn.cursor() as cursor:
+                            cursor.execute(
+                                """
+                                    INSERT INTO finance.grouping (name, dimension, grouping, created_by) VALUES (%s, %s, %s, %s)
+                                    RETURNING id
+                                """,
+                                (name, dimension, json_str, created_by),
+                            )
+                            compile_grouping(cursor, cursor.fetchone()[0])
+                            bump_data_version(cursor, GROUPING)
+                            conn.commit()
+                        st.session_state["grouping_validation"] = (
+                            validate_grouping(parsed_json, dimension)
                         )
-                        conn.commit()
 
                         st.success("Grouping successfully inserted into the database!")
                         st.rerun()
@@ -142,17 +177,23 @@ with st.container():
                             WHERE id = %s;
                         """
 
-                        cursor.execute(
-                            update_query,
-                            (
-                                name,
-                                dimension,
-                                json_str,
-                                created_by,
-                                row["id"],
-                            ),
+                        with connection() as conn, conn.cursor() as cursor:
+                            cursor.execute(
+                                update_query,
+                                (
+                                    name,
+                                    dimension,
+                                    json_str,
+                                    created_by,
+                                    row["id"],
+                                ),
+                            )
+                            compile_grouping(cursor, row["id"])
+                            bump_data_version(cursor, GROUPING)
+                            conn.commit()
+                        st.session_state["grouping_validation"] = (
+                            validate_grouping(parsed_json, dimension)
                         )
-                        conn.commit()
 
                         st.success("Grouping successfully updated into the database!")
                         st.rerun()
@@ -163,11 +204,13 @@ with st.container():
 
                     if confirm:
                         if st.button("🗑️ Delete Now"):
-                            cursor.execute(
-                                "UPDATE finance.grouping SET is_active = FALSE WHERE id = %s;",
-                                (row["id"],),
-                            )
-                            conn.commit()
+                            with connection() as conn, conn.cursor() as cursor:
+                                cursor.execute(
+                                    "UPDATE finance.grouping SET is_active = FALSE WHERE id = %s;",
+                                    (row["id"],),
+                                )
+                                bump_data_version(cursor, GROUPING)
+                                conn.commit()
                             st.success(f"Soft-deleted row with ID {row['id']}")
                             st.rerun()
 
@@ -1,24 +1,179 @@
+import json
+import pandas as pd
 import streamlit as st
-from utils.db_manager import get_connection
+from collections import Counter
+from dataclasses import dataclass, field
+from utils.arrow_fetch import fetch_frame
+from utils.db_manager import connection
+from utils.query_cache import GROUPING, LEDGER, cached_query
 
+GROUPING_PAGE_SIZE = 25
+# the columns the console grid can be sorted by, and what they sort on
+GROUPING_SORT_COLUMNS = {
+    "created_at": "g.created_at",
+    "name": "g.name",
+    "dimension": "g.dimension",
+    "created_by": "g.created_by",
+    "leaf_count": "g.leaf_count",
+    "size_bytes": "size_bytes",
+}
 
-def find_leaf_nodes(obj):
+# the members a grouping of each dimension has to cover, report groupings aren't checked
+DIMENSION_MEMBERS_SQL = {
+    "account": "SELECT account_no FROM finance.account WHERE account_no IS NOT NULL",
+    "business_unit": "SELECT business_unit_id FROM finance.business_unit WHERE business_unit_id IS NOT NULL",
+}
+
+
+def find_leaf_nodes(obj) -> list[str]:
+    """Returns the leaves of a grouping in document order, walking it with a stack."""
     leaves = []
-    if isinstance(obj, dict):
-        for value in obj.values():
-            leaves.extend(find_leaf_nodes(value))
-    elif isinstance(obj, list):
-        for item in obj:
-            leaves.extend(find_leaf_nodes(item))
-    else:
-        leaves.append(obj)
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+        elif node is not None:
+            # compile_grouping reads scalar leaves with #>> '{}', which gives the JSON text
+            # of numbers and booleans (true, 1.5), the same as json.dumps
+            leaves.append(node if isinstance(node, str) else json.dumps(node))
     return leaves
 
 
-def validate_form(group_name, created_by, dimension, uploaded_json_file):
-    conn = get_connection()
-    cursor = conn.cursor()
+@dataclass
+class GroupingValidation:
+    """How the leaves of a grouping compare to the members of its dimension."""
+
+    dimension: str
+    leaf_count: int = 0
+    missing: list[str] = field(default_factory=list)
+    duplicates: list[str] = field(default_factory=list)
+    unknown: list[str] = field(default_factory=list)
+
+    @property
+    def is_complete(self) -> bool:
+        return not (self.missing or self.duplicates or self.unknown)
+
+
+@cached_query(GROUPING)
+def get_grouping_page(
+    page: int = 1,
+    page_size: int = GROUPING_PAGE_SIZE,
+    sort_by: str = "created_at",
+    descending: bool = True,
+    search: str | None = None,
+    dimension: str | None = None,
+) -> tuple[pd.DataFrame, int]:
+    """One page of active grouping metadata and the number of matching groupings.
+
+    The JSON bodies stay in the database, get_grouping_json fetches one on demand.
+    """
+    filters = """
+        WHERE g.is_active = TRUE
+        AND (%(search)s::TEXT IS NULL OR g.name ILIKE '%%' || %(search)s || '%%')
+        AND (%(dimension)s::TEXT IS NULL OR g.dimension = %(dimension)s)
+    """
+    params = {
+        "search": search or None,
+        "dimension": dimension or None,
+        "limit": page_size,
+        "offset": (page - 1) * page_size,
+    }
+
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM finance.grouping g {filters}", params)
+        total = cursor.fetchone()[0]
+
+    data = fetch_frame(
+        f"""
+            SELECT
+                g.id,
+                g.name,
+                g.dimension,
+                g.created_by,
+                g.created_at,
+                g.leaf_count,
+                PG_COLUMN_SIZE(g.grouping) AS size_bytes
+            FROM finance.grouping g
+            {filters}
+            ORDER BY {GROUPING_SORT_COLUMNS[sort_by]} {"DESC" if descending else "ASC"}, g.id
+            LIMIT %(limit)s OFFSET %(offset)s
+        """,
+        params,
+    )
+    return data, total
+
+
+@cached_query(GROUPING)
+def get_grouping_json(grouping_id: int) -> str:
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT grouping::TEXT FROM finance.grouping WHERE id = %s", (grouping_id,)
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise Exception(f"Grouping {grouping_id} does not exist")
+    return row[0]
+
+
+@cached_query(LEDGER)
+def fetch_dimension_members(dimension: str) -> frozenset[str]:
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(DIMENSION_MEMBERS_SQL[dimension])
+        return frozenset(member for (member,) in cursor.fetchall())
+
 
+def validate_grouping(grouping, dimension: str) -> GroupingValidation | None:
+    """Checks that every member of the dimension sits in the grouping exactly once.
+
+    The grouping is flattened once and compared to the members with set
+    differences. Returns None for dimensions that aren't checked.
+    """
+    if dimension not in DIMENSION_MEMBERS_SQL:
+        return None
+
+    leaves = find_leaf_nodes(grouping)
+    leaf_counts = Counter(leaves)
+    members = fetch_dimension_members(dimension)
+
+    return GroupingValidation(
+        dimension=dimension,
+        leaf_count=len(leaves),
+        missing=sorted(members - leaf_counts.keys()),
+        duplicates=sorted(leaf for leaf, count in leaf_counts.items() if count > 1),
+        unknown=sorted(leaf_counts.keys() - members),
+    )
+
+
+def show_grouping_validation(validation: GroupingValidation | None):
+    if validation is None:
+        return
+    if validation.is_complete:
+        st.success(
+            f"All {validation.leaf_count} {validation.dimension} members are included exactly once."
+        )
+        return
+
+    for label, members in [
+        ("missing from the grouping", validation.missing),
+        ("included more than once", validation.duplicates),
+        (f"not a known {validation.dimension}", validation.unknown),
+    ]:
+        if members:
+            st.warning(f"{len(members)} {validation.dimension} members {label}")
+            with st.expander(f"Show the members {label}"):
+                st.write(", ".join(members))
+
+
+def compile_grouping(cursor, grouping_id: int) -> int:
+    """Rebuilds the leaf to ancestor rows of a grouping, returns the number of leaves."""
+    cursor.execute("SELECT finance.compile_grouping(%s)", (grouping_id,))
+    return cursor.fetchone()[0]
+
+
+def validate_form(group_name, created_by, dimension, uploaded_json_file):
     if not group_name:
         st.error("Please enter a name for the grouping.")
         return False
@@ -32,14 +187,10 @@ def validate_form(group_name, created_by, dimension, uploaded_json_file):
         st.error("Please enter who you are.")
         return False
 
-    cursor.execute("SELECT * FROM finance.grouping WHERE name = %s", (group_name,))
-    if cursor.fetchone():
-        st.error(f"Group name {group_name} already exists")
-        return False
-
-    cursor.execute("SELECT * FROM finance.grouping WHERE name = %s", (group_name,))
-    if cursor.fetchone():
-        st.error(f"Group name {group_name} already exists")
-        return False
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM finance.grouping WHERE name = %s", (group_name,))
+        if cursor.fetchone():
+            st.error(f"Group name {group_name} already exists")
+            return False
 
     return True
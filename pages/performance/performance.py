@@ -0,0 +1,75 @@
+import streamlit as st
+from utils.query_cache import query_cache
+from utils.timing import SPAN_HISTORY, clear_spans, recent_spans, span_percentiles
+
+st.title("⏱️ Performance")
+st.write(
+    f"Timings of the last {SPAN_HISTORY:,} stages run by this server since it started: "
+    "csv reads, cleaning, loads, deletes, inserts, queries and table rendering. "
+    "Stages nest, an ingest or a report also counts the queries it ran."
+)
+
+spans = recent_spans()
+
+refresh, clear = st.columns(2)
+refresh.button("🔄 Refresh", use_container_width=True)
+if clear.button("🧹 Clear timings", use_container_width=True):
+    clear_spans()
+    st.rerun()
+
+if spans.empty:
+    st.info("Nothing has been timed yet, upload a file or run a report first.")
+    st.stop()
+
+stages, tables = st.columns(2)
+stage_filter = stages.multiselect("Stages", options=sorted(spans["stage"].unique()))
+table_filter = tables.multiselect(
+    "Tables", options=sorted(spans["table_name"].dropna().unique())
+)
+if stage_filter:
+    spans = spans[spans["stage"].isin(stage_filter)]
+if table_filter:
+    spans = spans[spans["table_name"].isin(table_filter)]
+
+seconds_format = st.column_config.NumberColumn(format="%.3f")
+seconds_columns = {
+    column: seconds_format
+    for column in ["p50_seconds", "p90_seconds", "p99_seconds", "max_seconds", "total_seconds"]
+}
+
+st.subheader("Stages")
+st.dataframe(
+    span_percentiles(spans),
+    hide_index=True,
+    use_container_width=True,
+    column_config={
+        **seconds_columns,
+        "rows_per_sec": st.column_config.NumberColumn(format="%.0f"),
+    },
+)
+
+queries = spans[spans["stage"] == "sql"]
+if not queries.empty:
+    st.subheader("Queries")
+    st.dataframe(
+        span_percentiles(queries, by="query"),
+        hide_index=True,
+        use_container_width=True,
+        column_config={**seconds_columns, "rows_per_sec": None},
+    )
+
+st.subheader("Query Cache")
+stats = query_cache.stats()
+entries, hits, misses, hit_rate = st.columns(4)
+entries.metric("Entries", stats["entries"])
+hits.metric("Hits", stats["hits"])
+misses.metric("Misses", stats["misses"])
+hit_rate.metric("Hit Rate", f"{stats['hit_rate']:.0%}")
+
+st.subheader("Recent Stages")
+st.dataframe(
+    spans.head(500),
+    hide_index=True,
+    use_container_width=True,
+    column_config={"seconds": seconds_format},
+)
@@ -1,3 +1,87 @@
+from datetime import date
 import streamlit as st
+from pages.report.utils import SERIES_PERIODS, balance_series, get_groupings, trend_lines
+from pages.report.report.profit_loss import ProfitLoss
+from pages.report.report.balance_sheet import BalanceSheet
+from pages.report.report.base import NODE_COLUMNS, ReportBase
+from utils.timing import span
+from app import logger
+
+REPORTS = {"Profit & Loss": ProfitLoss, "Balance Sheet": BalanceSheet}
+TREND_VALUES = {"Closing Balance": "closing_balance", "Activity": "activity_balance"}
 
 st.title("Report Page")
+
+try:
+    groupings = get_groupings()
+
+    if groupings.empty:
+        st.info("Create a grouping on the Grouping page to lay out a report.")
+        st.stop()
+
+    report_name, anchor, grouping = st.columns(3)
+    report_name = report_name.selectbox("Report", options=list(REPORTS.keys()))
+    anchor_date = anchor.date_input("Anchor date", value=date.today())
+    grouping_id = grouping.selectbox(
+        "Grouping",
+        options=groupings["id"].to_list(),
+        format_func=lambda selected: groupings.set_index("id").at[selected, "name"],
+    )
+
+    if st.button("Run Report 📊"):
+        with span("report", report=report_name, anchor_date=anchor_date) as record:
+            report = REPORTS[report_name](anchor_date)
+            frame = report.build(grouping_id)
+            frame.insert(0, "line", report.indent(frame))
+            record["rows"] = len(frame)
+
+        with span("render", rows=len(frame), widget="report"):
+            st.dataframe(
+                frame.drop(columns=["node_id", "parent_node_id", "node", "depth", "is_leaf"]),
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    period: st.column_config.NumberColumn(format="%.2f")
+                    for period in report.time_periods
+                },
+            )
+
+        if not report.unmapped.empty:
+            with st.expander(f"⚠️ {len(report.unmapped)} members are not in the grouping"):
+                st.dataframe(report.unmapped)
+
+    st.subheader("Trends")
+    _, closure = ReportBase.fetch_grouping(grouping_id)
+    nodes = closure[NODE_COLUMNS].drop_duplicates("node_id").sort_values("node_id")
+
+    trend_start, trend_end, trend_period, trend_value = st.columns(4)
+    start_date = trend_start.date_input(
+        "From", value=date(anchor_date.year - 3, anchor_date.month, 1)
+    )
+    end_date = trend_end.date_input("To", value=anchor_date)
+    period = trend_period.selectbox("Period", options=list(SERIES_PERIODS))
+    value = trend_value.selectbox("Balance", options=list(TREND_VALUES))
+    node_ids = st.multiselect(
+        "Nodes",
+        options=nodes["node_id"].to_list(),
+        default=nodes.loc[nodes["depth"] == 0, "node_id"].to_list(),
+        format_func=lambda selected: nodes.set_index("node_id").at[selected, "node"],
+    )
+
+    if st.button("Chart Trends 📈") and node_ids:
+        with span("report", report="Trends", anchor_date=end_date) as record:
+            series = balance_series(
+                start_date, end_date, grouping_id=grouping_id, period=SERIES_PERIODS[period]
+            )
+            series = series[series["node_id"].isin(node_ids)]
+            record["rows"] = len(series)
+
+        with span("render", rows=len(series), widget="trends"):
+            st.line_chart(
+                trend_lines(series, nodes, SERIES_PERIODS[period], TREND_VALUES[value])
+            )
+
+except Exception as e:
+    st.subheader("Report Error")
+    st.error(f"{e}")
+    logger.error(e)
@@ -0,0 +1,11 @@
+from pages.report.report.base import ReportBase
+from datetime import date
+
+
+class BalanceSheet(ReportBase):
+    # balances as of the anchor date and a year before, budgets carry no balances
+    value_column = "closing_balance"
+    time_periods = ["CurrentMonth", "PriorYTD"]
+
+    def __init__(self, anchor_date: date):
+        super().__init__(anchor_date)
@@ -1,8 +1,133 @@
 from datetime import date
+from typing import Optional
+import pandas as pd
+import psycopg2
+from pages.upload.utils import CENTS
+from utils.arrow_fetch import CATEGORY, fetch_frame
+from utils.db_manager import connection
+from utils.query_cache import GROUPING, LEDGER, cached_query
+
+TIME_PERIODS = ["CurrentMonth", "CurrentYTD", "CurrentFYBudget", "PriorYTD"]
+BALANCE_COLUMNS = ["opening_balance", "activity_balance", "closing_balance"]
+NODE_COLUMNS = ["node_id", "parent_node_id", "node", "depth", "is_leaf"]
+# repeated on every row of the trial balance, fetched as categories
+KEY_COLUMNS = [
+    "account_no",
+    "account",
+    "account_type",
+    "business_unit_id",
+    "business_unit",
+    "rad_data",
+    "rad_data_str",
+]
 
 
 class ReportBase:
+    """A grouping rolled up over ``finance.trial_balance_summary(anchor_date)``.
+
+    Subclasses pick the balance column and the time periods to show. The
+    trial balance is fetched once per report and every grouping applied to it
+    is a single pivot, merge and groupby, summed in exact cents.
+    """
+
     anchor_date: date
+    value_column: str = "closing_balance"
+    time_periods: list[str] = TIME_PERIODS
 
     def __init__(self, anchor_date: date):
         self.anchor_date = anchor_date
+        self._trial_balance: Optional[pd.DataFrame] = None
+        self.unmapped: Optional[pd.DataFrame] = None
+
+    @property
+    def trial_balance(self) -> pd.DataFrame:
+        if self._trial_balance is None:
+            self._trial_balance = self.fetch_trial_balance(self.anchor_date)
+        return self._trial_balance
+
+    @staticmethod
+    @cached_query(LEDGER)
+    def fetch_trial_balance(anchor_date: date) -> pd.DataFrame:
+        """The trial balance with its balances as Int64 cents, in ``<balance>_cents`` columns."""
+        try:
+            trial_balance = fetch_frame(
+                "SELECT * FROM finance.trial_balance_summary(%s)",
+                (anchor_date,),
+                dtypes={column: CATEGORY for column in KEY_COLUMNS},
+                cents=BALANCE_COLUMNS,
+            )
+            return trial_balance.rename(
+                columns={column: f"{column}_cents" for column in BALANCE_COLUMNS}
+            )
+        except Exception as e:
+            raise Exception(f"Error fetching the trial balance for {anchor_date}: {e}")
+
+    @staticmethod
+    @cached_query(GROUPING)
+    def fetch_grouping(grouping_id: int) -> tuple[str, pd.DataFrame]:
+        """Returns the dimension of a grouping and its compiled leaf to ancestor rows."""
+        with connection() as conn, conn.cursor() as cursor:
+            try:
+                cursor.execute(
+                    "SELECT dimension FROM finance.grouping WHERE id = %s", (grouping_id,)
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    raise Exception(f"Grouping {grouping_id} does not exist")
+
+                cursor.execute(
+                    f"""
+                        SELECT leaf, {", ".join(NODE_COLUMNS)}
+                        FROM finance.grouping_closure
+                        WHERE grouping_id = %s
+                    """,
+                    (grouping_id,),
+                )
+                results = cursor.fetchall()
+                column_names = [desc[0] for desc in cursor.description]
+            except psycopg2.Error as e:
+                raise Exception(f"Error fetching grouping {grouping_id}: {e}")
+
+        closure = pd.DataFrame(results, columns=column_names)
+        closure["parent_node_id"] = closure["parent_node_id"].astype("Int64")
+        return row[0], closure
+
+    def leaf_values(self, dimension: str) -> pd.DataFrame:
+        """The report's balance in cents per grouping leaf (rows) and time period (columns)."""
+        leaf_column = "business_unit_id" if dimension == "business_unit" else "account_no"
+        values = self.trial_balance.pivot_table(
+            index=leaf_column,
+            columns="time_period",
+            values=f"{self.value_column}_cents",
+            aggfunc="sum",
+            fill_value=0,
+            observed=True,
+        )
+        # the leaves are categories in the order they were read, list them sorted
+        values.index = values.index.astype(str)
+        return values.sort_index().reindex(columns=self.time_periods, fill_value=0)
+
+    def build(self, grouping_id: int) -> pd.DataFrame:
+        """One row per grouping node in document order, with its total per time period.
+
+        Leaves of the trial balance that the grouping doesn't cover are kept in
+        ``self.unmapped``.
+        """
+        dimension, closure = self.fetch_grouping(grouping_id)
+        values = self.leaf_values(dimension)
+
+        totals = (
+            closure[["leaf", "node_id"]]
+            .merge(values, how="left", left_on="leaf", right_index=True)
+            .groupby("node_id")[self.time_periods]
+            .sum()
+        )
+        nodes = closure[NODE_COLUMNS].drop_duplicates("node_id").set_index("node_id")
+
+        self.unmapped = values[~values.index.isin(closure["leaf"])].astype("int64") / CENTS
+        return nodes.join(totals.astype("int64") / CENTS).sort_index().reset_index()
+
+    @staticmethod
+    def indent(report: pd.DataFrame, padding: str = " ") -> pd.Series:
+        """The node labels indented by their depth, for display."""
+        return pd.Series(padding, index=report.index).str.repeat(report["depth"]) + report["node"]
@@ -1,7 +1,11 @@
-from pages.report.report.base import Base
+from pages.report.report.base import ReportBase, TIME_PERIODS
 from datetime import date
 
 
-class ProfitLoss(Base):
+class ProfitLoss(ReportBase):
+    # activity over each period, the budget is only activity
+    value_column = "activity_balance"
+    time_periods = TIME_PERIODS
+
     def __init__(self, anchor_date: date):
-        self.anchor_date = anch
+        super().__init__(anchor_date)
@@ -0,0 +1,162 @@
+from datetime import date
+from typing import Iterable, Optional
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+from pages.report.report.base import BALANCE_COLUMNS, ReportBase
+from pages.upload.utils import CENTS
+from utils.arrow_fetch import CATEGORY, fetch_frame
+from utils.db_manager import connection
+from utils.query_cache import GROUPING, LEDGER, cached_query
+
+# what a balance series can be summed over, and the column that labels each period
+SERIES_PERIODS = {"Month": "period_start", "Fiscal Year": "fiscal_year"}
+SERIES_COLUMNS = [*BALANCE_COLUMNS, "transaction_count"]
+# the balances are fetched and summed in exact cents, see fetch_balance_series
+CENTS_COLUMNS = [f"{column}_cents" for column in BALANCE_COLUMNS]
+
+
+@cached_query(GROUPING)
+def get_groupings() -> pd.DataFrame:
+    """The active groupings a report can be laid out with."""
+    with connection() as conn, conn.cursor() as cursor:
+        try:
+            cursor.execute(
+                """
+                    SELECT id, name, dimension
+                    FROM finance.grouping
+                    WHERE is_active = TRUE
+                    ORDER BY name
+                """
+            )
+            results = cursor.fetchall()
+            column_names = [desc[0] for desc in cursor.description]
+        except psycopg2.Error as e:
+            raise Exception(f"Error fetching groupings: {e}")
+
+    return pd.DataFrame(results, columns=column_names)
+
+
+@cached_query(LEDGER)
+def fetch_balance_series(
+    start_date: date,
+    end_date: date,
+    account_nos: Optional[tuple[str, ...]] = None,
+    business_unit_ids: Optional[tuple[str, ...]] = None,
+) -> pd.DataFrame:
+    """Monthly balances per account and business unit from ``finance.balance_series``.
+
+    Every key has a row for every month from the start to the end month, the
+    filters keep all keys when left empty. Balances are Int64 cents, in
+    ``<balance>_cents`` columns.
+    """
+    try:
+        series = fetch_frame(
+            "SELECT * FROM finance.balance_series(%s, %s, %s, %s)",
+            (
+                start_date,
+                end_date,
+                list(account_nos) if account_nos else None,
+                list(business_unit_ids) if business_unit_ids else None,
+            ),
+            dtypes={
+                "period_start": pa.timestamp("s"),
+                "account_no": CATEGORY,
+                "business_unit_id": CATEGORY,
+            },
+            cents=BALANCE_COLUMNS,
+        )
+        return series.rename(columns=dict(zip(BALANCE_COLUMNS, CENTS_COLUMNS)))
+    except Exception as e:
+        raise Exception(f"Error fetching balances from {start_date} to {end_date}: {e}")
+
+
+def fiscal_years(series: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    """Sums a monthly series to fiscal years, opening on the first month and closing on the last."""
+    grouped = series.sort_values("period_start").groupby([*keys, "fiscal_year"], observed=True, sort=True)
+    return grouped.agg(
+        period_start=("period_start", "first"),
+        opening_balance_cents=("opening_balance_cents", "first"),
+        activity_balance_cents=("activity_balance_cents", "sum"),
+        closing_balance_cents=("closing_balance_cents", "last"),
+        transaction_count=("transaction_count", "sum"),
+    ).reset_index()
+
+
+def balance_series(
+    start_date: date,
+    end_date: date,
+    account_nos: Iterable[str] = (),
+    business_unit_ids: Iterable[str] = (),
+    grouping_id: Optional[int] = None,
+    period: str = "period_start",
+) -> pd.DataFrame:
+    """Activity and balances per ``period`` over whole months, ready to chart.
+
+    Without a grouping there is a row per account, business unit and period.
+    With one, a row per grouping node and period, each node summing the leaves
+    under it, and only the grouping's leaves are fetched. ``period`` is one of
+    SERIES_PERIODS. Balances are summed in cents and returned as amounts.
+    """
+    keys = ["account_no", "business_unit_id"]
+    months = ["period_start", "fiscal_year", "fiscal_period"]
+    filters = {"account_no": tuple(account_nos), "business_unit_id": tuple(business_unit_ids)}
+
+    if grouping_id is not None:
+        dimension, closure = ReportBase.fetch_grouping(grouping_id)
+        leaf_column = "business_unit_id" if dimension == "business_unit" else "account_no"
+        members = set(closure["leaf"])
+        if filters[leaf_column]:
+            members &= set(filters[leaf_column])
+        # sorted so the same grouping always makes the same cache key
+        filters[leaf_column] = tuple(sorted(members))
+        if not members:
+            return pd.DataFrame(columns=["node_id", "node", "depth", *months, *SERIES_COLUMNS])
+
+    series = fetch_balance_series(
+        start_date, end_date, filters["account_no"], filters["business_unit_id"]
+    )
+
+    if grouping_id is not None:
+        # balances add up, sum each leaf's months once before fanning out to its ancestors
+        summed = [*CENTS_COLUMNS, "transaction_count"]
+        leaves = series.groupby([leaf_column, *months], observed=True)[summed].sum()
+        leaves = leaves.reset_index().astype({leaf_column: str})
+        keys = ["node_id", "node", "depth"]
+        series = (
+            closure[["leaf", *keys]]
+            .merge(leaves, left_on="leaf", right_on=leaf_column)
+            .groupby([*keys, *months], sort=True)[summed]
+            .sum()
+            .reset_index()
+        )
+
+    if period == "fiscal_year":
+        series = fiscal_years(series, keys)
+    for column, cents in zip(BALANCE_COLUMNS, CENTS_COLUMNS):
+        series[column] = (series.pop(cents) / CENTS).astype(float)
+    return series
+
+
+def trend_lines(
+    series: pd.DataFrame, nodes: pd.DataFrame, period: str, value_column: str
+) -> pd.DataFrame:
+    """A column per grouping node and a row per ``period`` of a balance series, to chart.
+
+    Pivoted on node_id, so nodes with the same label under different parents
+    stay apart; their columns are told apart by the parent's label.
+    """
+    lines = series.pivot_table(
+        index=period, columns="node_id", values=value_column, aggfunc="sum"
+    )
+    nodes = nodes.drop_duplicates("node_id").set_index("node_id")
+    labels = nodes["node"]
+    parent_labels = labels.reindex(nodes["parent_node_id"]).fillna("top").to_numpy()
+    labels = labels.where(~labels.duplicated(keep=False), labels + " (" + parent_labels + ")")
+    # still shared when the parents have the same label too
+    labels = labels.where(
+        ~labels.duplicated(keep=False), labels + " #" + labels.index.astype(str)
+    )
+
+    lines.columns = labels.reindex(lines.columns).to_list()
+    return lines
@@ -0,0 +1,140 @@
+import io
+import multiprocessing
+import os
+import threading
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+import pandas as pd
+
+from pages.upload.utils import UploadSummary, coerce_data, read_csv_chunks
+from pages.upload.validation import ERROR_COLUMNS, raise_for_errors
+from utils.timing import keep_spans, span, take_spans
+
+# processes cleaning the files of a batch at once, per server process
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """The process wide pool that cleans batches, started on first use and kept.
+
+    Workers are spawned rather than forked, so they don't inherit the server's
+    threads or its database connections.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=BATCH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def clean_file(
+    file_name: str, file_bytes: bytes, table_name: str, summarize: bool = False
+) -> tuple[object, pd.DataFrame, list[dict]]:
+    """Reads and cleans one file of a batch, in a worker process.
+
+    Returns the cleaned chunks, or only their UploadSummary when ``summarize``,
+    the file's bad values and the spans it took. Bad values are returned rather
+    than raised so every file's can be reported together.
+    """
+    summary = UploadSummary()
+    chunks, errors = deque(), []
+    for raw_chunk in read_csv_chunks(io.BytesIO(file_bytes), table_name=table_name):
+        with span("clean", table_name=table_name, rows=len(raw_chunk), file_name=file_name):
+            clean_chunk, chunk_errors = coerce_data(raw=raw_chunk, table_name=table_name)
+        summary.update(clean_chunk)
+        if not summarize:
+            chunks.append(clean_chunk)
+        errors.append(chunk_errors)
+
+    errors = (
+        pd.concat(errors, ignore_index=True) if errors else pd.DataFrame(columns=ERROR_COLUMNS)
+    )
+    errors.insert(0, "file_name", file_name)
+    return summary if summarize else chunks, errors, take_spans()
+
+
+def iter_results(
+    files: list[tuple[str, bytes]], table_name: str, summarize: bool
+) -> Iterator[tuple[object, pd.DataFrame, list[dict]]]:
+    """Yields what clean_file returns for every file, in order.
+
+    At most BATCH_WORKERS files are in flight, the next one is submitted as the
+    oldest is taken, so a batch holds about BATCH_WORKERS cleaned files
+    whatever its size.
+    """
+    pool = get_process_pool()
+    pending = iter(files)
+    futures = deque()
+
+    def submit_next():
+        file = next(pending, None)
+        if file is not None:
+            futures.append(pool.submit(clean_file, *file, table_name, summarize))
+
+    try:
+        for _ in range(BATCH_WORKERS):
+            submit_next()
+        while futures:
+            result = futures.popleft().result()
+            submit_next()
+            yield result
+    finally:
+        # the load failed or was cancelled, don't clean files nobody will read
+        for future in futures:
+            future.cancel()
+
+
+def summarize_files(files: list[tuple[str, bytes]], table_name: str) -> pd.DataFrame:
+    """Cleans every (name, bytes) file of a batch without keeping any of it.
+
+    Returns a row per file with its row count, total and date range. Raises one
+    DataValidationError with the bad values of every file at the end.
+    """
+    rows, errors = [], []
+    with span("clean_batch", table_name=table_name, files=len(files)) as record:
+        results = iter_results(files, table_name, summarize=True)
+        for (file_name, _), (summary, file_errors, spans) in zip(files, results):
+            keep_spans(spans)
+            errors.append(file_errors)
+            rows.append(
+                {
+                    "file_name": file_name,
+                    "rows": summary.rows,
+                    "total_amount": summary.total_amount,
+                    "min_accounting_date": summary.min_accounting_date,
+                    "max_accounting_date": summary.max_accounting_date,
+                }
+            )
+        record["rows"] = sum(row["rows"] for row in rows)
+
+    raise_for_errors(errors)
+    return pd.DataFrame(rows)
+
+
+def iter_clean_files(files: list[tuple[str, bytes]], table_name: str) -> Iterator[pd.DataFrame]:
+    """Yields the cleaned chunks of every file in order while the next files are cleaned.
+
+    The first file is loaded while the following ones are still being cleaned.
+    After a file with bad values nothing more is yielded, and one
+    DataValidationError with the bad values of every file is raised once all
+    are cleaned.
+    """
+    errors = []
+    with closing(iter_results(files, table_name, summarize=False)) as results:
+        for chunks, file_errors, spans in results:
+            keep_spans(spans)
+            errors.append(file_errors)
+            if all(found.empty for found in errors):
+                while chunks:
+                    # popped so each loaded chunk can be freed before the next
+                    yield chunks.popleft()
+    raise_for_errors(errors)
@@ -0,0 +1,389 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import pandas as pd
+import psycopg2
+
+from pages.upload.batch import iter_clean_files
+from pages.upload.utils import (
+    UPLOAD_CHUNK_SIZE,
+    batch_fingerprint,
+    file_fingerprint,
+    iter_clean_chunks,
+    stream_ingest_data,
+)
+from config.logger import get_logger
+from utils.db_manager import connection
+from utils.timing import span
+
+logger = get_logger()
+
+# uploads cleaned and loaded at once per server process, the rest wait in the queue
+MAX_WORKERS = int(os.environ.get("INGEST_WORKERS", 2))
+# job states, a job ends in one of the last three
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = (
+    "queued",
+    "running",
+    "succeeded",
+    "failed",
+    "cancelled",
+)
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+# seconds a queued or running job may go without an update before it is taken for lost,
+# a running job updates after every chunk and between the steps after the COPY,
+# a queued one waits behind MAX_WORKERS others
+STALE_JOB_SECONDS = int(os.environ.get("INGEST_JOB_TIMEOUT", 30 * 60))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+class IngestLost(Exception):
+    """The job was failed as lost while its worker was still running it."""
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """The process wide worker pool, shared by every session and kept across reruns."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix="ingest"
+            )
+        return _executor
+
+
+def _execute(query: str, params=None, fetch: bool = False):
+    with connection() as conn, conn.cursor() as cursor:
+        try:
+            cursor.execute(query, params)
+            row = cursor.fetchone() if fetch else None
+            conn.commit()
+        except psycopg2.Error as e:
+            raise Exception(f"Error updating ingest jobs: {e}")
+    return row
+
+
+def _create_job(table_name: str, file_name: str, rows_total: int) -> int:
+    (job_id,) = _execute(
+        """
+            INSERT INTO finance.ingest_job (table_name, file_name, status, rows_total)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+        """,
+        (table_name, file_name, QUEUED, rows_total),
+        fetch=True,
+    )
+    return job_id
+
+
+def count_rows(file_bytes: bytes) -> int:
+    return max(file_bytes.count(b"\n") - 1, 0)
+
+
+def submit_ingest_job(
+    file_bytes: bytes,
+    file_name: str,
+    table_name: str,
+    rows_total: Optional[int] = None,
+    file_hash: Optional[str] = None,
+) -> int:
+    """Queues the upload for the worker pool and returns its job id at once.
+
+    ``rows_total`` is only used for progress; without it the csv lines are counted.
+    A ``file_hash`` the page already has saves hashing the file again.
+    """
+    if rows_total is None:
+        rows_total = count_rows(file_bytes)
+
+    job_id = _create_job(table_name, file_name, rows_total)
+    get_executor().submit(
+        run_ingest_job, job_id, file_bytes, file_name, table_name, file_hash
+    )
+    return job_id
+
+
+def submit_frame_ingest_job(
+    clean_df: pd.DataFrame, file_name: str, file_hash: str, table_name: str
+) -> int:
+    """Queues an upload the page has already cleaned, see run_frame_ingest_job."""
+    job_id = _create_job(table_name, file_name, len(clean_df))
+    get_executor().submit(
+        run_frame_ingest_job, job_id, clean_df, file_name, file_hash, table_name
+    )
+    return job_id
+
+
+def batch_name(file_names: list[str]) -> str:
+    return f"{len(file_names)} files: {', '.join(file_names)}"
+
+
+def submit_batch_ingest_job(
+    files: list[tuple[str, bytes]],
+    table_name: str,
+    rows_total: Optional[int] = None,
+    file_hash: Optional[str] = None,
+) -> int:
+    """Queues a batch of (name, bytes) files to be loaded as one upload, see run_batch_ingest_job."""
+    if rows_total is None:
+        rows_total = sum(count_rows(file_bytes) for _, file_bytes in files)
+
+    file_name = batch_name([name for name, _ in files])
+    job_id = _create_job(table_name, file_name, rows_total)
+    get_executor().submit(run_batch_ingest_job, job_id, files, table_name, file_hash)
+    return job_id
+
+
+def run_ingest_job(
+    job_id: int,
+    file_bytes: bytes,
+    file_name: str,
+    table_name: str,
+    file_hash: Optional[str] = None,
+):
+    """Runs clean, delete and load for one job on a worker thread, see run_job."""
+    uploaded_file = io.BytesIO(file_bytes)
+    run_job(
+        job_id,
+        table_name,
+        file_name,
+        iter_clean_chunks(uploaded_file, table_name),
+        file_hash or file_fingerprint(uploaded_file),
+    )
+
+
+def run_frame_ingest_job(
+    job_id: int, clean_df: pd.DataFrame, file_name: str, file_hash: str, table_name: str
+):
+    """Loads a cleaned frame for one job on a worker thread, see run_job.
+
+    The frame is only read, it can be the page's memoized one. It is loaded in
+    UPLOAD_CHUNK_SIZE slices so progress and cancelling work as for a stream.
+    """
+    run_job(
+        job_id,
+        table_name,
+        file_name,
+        (
+            clean_df.iloc[start : start + UPLOAD_CHUNK_SIZE]
+            for start in range(0, len(clean_df), UPLOAD_CHUNK_SIZE)
+        ),
+        file_hash,
+    )
+
+
+def run_batch_ingest_job(
+    job_id: int,
+    files: list[tuple[str, bytes]],
+    table_name: str,
+    file_hash: Optional[str] = None,
+):
+    """Loads a batch of files as one upload on a worker thread, see run_job.
+
+    The files are cleaned at once in the process pool and their union replaces
+    the table from the earliest accounting_date of any of them, in a single
+    transaction.
+    """
+    if file_hash is None:
+        file_hash = batch_fingerprint(
+            file_fingerprint(io.BytesIO(file_bytes)) for _, file_bytes in files
+        )
+    run_job(
+        job_id,
+        table_name,
+        batch_name([name for name, _ in files]),
+        iter_clean_files(files, table_name),
+        file_hash,
+    )
+
+
+def run_job(
+    job_id: int,
+    table_name: str,
+    file_name: str,
+    clean_chunks: Iterable[pd.DataFrame],
+    file_hash: str,
+):
+    """Loads the cleaned chunks for one job and records how it ended.
+
+    Progress is written after every COPY chunk in its own short transaction,
+    and a heartbeat while waiting for the table and between the later steps.
+    A cancel request read back from the same update aborts the ingest, whose
+    transaction then rolls back, and so does finding the job failed as lost.
+    """
+    rows_loaded = 0
+
+    def report_progress(row_count: int):
+        nonlocal rows_loaded
+        rows_loaded += row_count
+        updated = _execute(
+            """
+                UPDATE finance.ingest_job
+                SET rows_loaded = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = %s
+                RETURNING cancel_requested
+            """,
+            (rows_loaded, job_id, RUNNING),
+            fetch=True,
+        )
+        if updated is None:
+            raise IngestLost()
+        if updated[0]:
+            raise IngestCancelled()
+
+    def heartbeat():
+        report_progress(0)
+
+    try:
+        started = _execute(
+            """
+                UPDATE finance.ingest_job
+                SET status = %s, started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = %s
+                RETURNING cancel_requested
+            """,
+            (RUNNING, job_id, QUEUED),
+            fetch=True,
+        )
+        if started is None:
+            # queued for so long it was already failed as lost, see fail_stale_jobs
+            return
+        if started[0]:
+            raise IngestCancelled()
+
+        with span("ingest", table_name=table_name, file_name=file_name) as record:
+            drop_message, insert_message, summary = stream_ingest_data(
+                clean_chunks,
+                table_name,
+                progress_callback=report_progress,
+                file_hash=file_hash,
+                file_name=file_name,
+                heartbeat=heartbeat,
+            )
+            record["rows"] = summary.rows
+        status, message = SUCCEEDED, f"{drop_message}\n{insert_message}"
+    except IngestLost:
+        logger.warning(
+            f"Ingest job {job_id} was failed as lost while running, it was rolled back"
+        )
+        return
+    except IngestCancelled:
+        status, message = CANCELLED, "Cancelled, nothing was changed."
+    except Exception as e:
+        status, message = FAILED, str(e) or type(e).__name__
+
+    try:
+        recorded = _execute(
+            """
+                UPDATE finance.ingest_job
+                SET status = %s, message = %s, finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = %s
+                RETURNING id
+            """,
+            (status, message, job_id, RUNNING),
+            fetch=True,
+        )
+        if recorded is None:
+            # failed as lost since its last heartbeat, the user was told so already
+            logger.warning(
+                f"Ingest job {job_id} {status} after it was failed as lost, "
+                "its status was left as is"
+            )
+    except Exception:
+        # nobody waits on the future, the job is failed as lost once it goes stale
+        logger.exception(f"Could not record that ingest job {job_id} {status}")
+
+
+# whether a job row is queued or running and went without an update for STALE_JOB_SECONDS
+IS_STALE = """
+    status IN (%(queued)s, %(running)s)
+    AND updated_at < CURRENT_TIMESTAMP - make_interval(secs => %(stale_seconds)s)
+"""
+STALE_PARAMS = {"queued": QUEUED, "running": RUNNING, "stale_seconds": STALE_JOB_SECONDS}
+
+
+def fail_stale_jobs(cursor):
+    """Fails the queued and running jobs not updated for STALE_JOB_SECONDS.
+
+    Their worker is gone, the server restarted or the job couldn't record its
+    end, and without this they would be polled as live forever. The caller commits.
+    """
+    cursor.execute(
+        f"""
+            UPDATE finance.ingest_job
+            SET status = %(failed)s,
+                message = 'Lost, the job stopped updating. Check the table before uploading again.',
+                finished_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE {IS_STALE}
+        """,
+        {"failed": FAILED, **STALE_PARAMS},
+    )
+
+
+def cancel_ingest_job(job_id: int):
+    """Asks the job to stop at its next chunk, a finished job is left alone."""
+    _execute(
+        "UPDATE finance.ingest_job SET cancel_requested = TRUE WHERE id = %s",
+        (job_id,),
+    )
+
+
+def _read_jobs(query: str, params: dict) -> tuple[list[str], list[tuple]]:
+    """Runs a job query whose last column is IS_STALE and returns the other columns.
+
+    Polls stay plain reads; only when one of the jobs read looks lost are the
+    stale jobs failed, and the query read again.
+    """
+    params = {**params, **STALE_PARAMS}
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        if any(row[-1] for row in rows):
+            fail_stale_jobs(cursor)
+            conn.commit()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        column_names = [desc[0] for desc in cursor.description[:-1]]
+
+    return column_names, [row[:-1] for row in rows]
+
+
+def get_ingest_job(job_id: int) -> Optional[dict]:
+    """One primary key read, cheap enough to poll every second.
+
+    A job that went stale is failed first, so a lost job stops being polled.
+    """
+    column_names, rows = _read_jobs(
+        f"""
+            SELECT id, table_name, file_name, status, rows_total, rows_loaded,
+                cancel_requested, message, created_at, started_at, finished_at,
+                {IS_STALE} AS stale
+            FROM finance.ingest_job WHERE id = %(job_id)s
+        """,
+        {"job_id": job_id},
+    )
+    if not rows:
+        return None
+    return dict(zip(column_names, rows[0]))
+
+
+def get_recent_ingest_jobs(limit: int = 10) -> pd.DataFrame:
+    column_names, rows = _read_jobs(
+        f"""
+            SELECT id, table_name, file_name, status, rows_loaded, rows_total,
+                created_at, finished_at, {IS_STALE} AS stale
+            FROM finance.ingest_job
+            ORDER BY id DESC
+            LIMIT %(limit)s
+        """,
+        {"limit": limit},
+    )
+    return pd.DataFrame(rows, columns=column_names)
@@ -1,6 +1,10 @@
+from typing import Optional
 import pandas as pd
 import streamlit as st
 from pages.upload.utils import *
+from pages.upload.jobs import *
+from pages.upload.batch import summarize_files
+from utils.timing import span
 from app import logger
 
 
@@ -9,6 +13,91 @@ def hard_del_session():
         del st.session_state[key]
 
 
+def show_finished_job(job: dict):
+    if job["status"] == SUCCEEDED:
+        for line in job["message"].splitlines():
+            st.success(line)
+
+        st.markdown(
+            "<h2 style='color: IndianRed;'>Database Data Head</h2>",
+            unsafe_allow_html=True,
+        )
+        st.dataframe(show_head_from_db())
+    elif job["status"] == CANCELLED:
+        st.info(job["message"])
+    else:
+        st.subheader("Data Ingestion Error")
+        st.error(job["message"])
+
+
+@st.fragment(run_every=1)
+def poll_ingest_job(job_id: int):
+    """Redraws only the progress of a running job, the rest of the page stays put."""
+    job = get_ingest_job(job_id)
+    if job["status"] in FINISHED:
+        st.rerun()
+
+    rows_total = job["rows_total"] or 0
+    st.progress(
+        min(job["rows_loaded"] / rows_total, 1.0) if rows_total else 0.0,
+        text=f"{job['status'].capitalize()}: loaded {job['rows_loaded']:,} of {rows_total:,} rows",
+    )
+    if not job["cancel_requested"] and st.button(
+        "🛑 Cancel ingestion", key=f"cancel_job_{job_id}"
+    ):
+        cancel_ingest_job(job_id)
+        job["cancel_requested"] = True
+    if job["cancel_requested"]:
+        st.caption("Cancelling, the changes are being rolled back...")
+
+
+@st.fragment
+def confirm_ingest(uploaded_file, rows_total: int, clean_df: Optional[pd.DataFrame] = None):
+    """The ingest button and its confirmation rerun only this fragment, not the cleaning above.
+
+    With ``clean_df`` the job loads that frame, otherwise it reads and cleans
+    the uploaded bytes again a chunk at a time: the streamed and batch summaries
+    only serve the page's reruns, keeping their cleaned chunks for the load
+    would hold the whole file. Either way the memoized fingerprint is reused.
+    """
+    if st.button("Ingest Data 🚀"):
+        st.session_state["show_ingestion_confirm"] = True
+
+    if st.session_state.get("show_ingestion_confirm", False):
+        st.warning("Are you sure you want to ingest the data?")
+
+        if st.button("✅ Yes, proceed", use_container_width=True):
+            file_hash = upload_fingerprint(uploaded_file)
+            if clean_df is not None:
+                job_id = submit_frame_ingest_job(
+                    clean_df,
+                    uploaded_file.name,
+                    file_hash,
+                    table_name=st.session_state["table_name"],
+                )
+            elif isinstance(uploaded_file, list):
+                job_id = submit_batch_ingest_job(
+                    [(file.name, file.getvalue()) for file in uploaded_file],
+                    table_name=st.session_state["table_name"],
+                    rows_total=rows_total,
+                    file_hash=file_hash,
+                )
+            else:
+                job_id = submit_ingest_job(
+                    uploaded_file.getvalue(),
+                    uploaded_file.name,
+                    table_name=st.session_state["table_name"],
+                    rows_total=rows_total,
+                    file_hash=file_hash,
+                )
+            st.session_state["ingest_job_id"] = job_id
+            st.session_state["show_ingestion_confirm"] = False
+            st.rerun()
+
+        if st.button("❌ Cancel", use_container_width=True):
+            st.session_state["show_ingestion_confirm"] = False
+
+
 st.title("Upload")
 
 option = st.selectbox(
@@ -20,14 +109,42 @@ option = st.selectbox(
 )
 st.session_state["table_name"] = option
 
-uploaded_file = st.file_uploader(
-    label=f"Upload a csv",
-    type="csv",
-    accept_multiple_files=False,
-    key="file_uploader",
+batch_mode = st.toggle(
+    label="Batch of files",
+    key="batch_mode_toggle",
+    help="Cleans every file at once, one per CPU core, and loads them together in one transaction.",
 )
 
-if uploaded_file is not None:
+if batch_mode:
+    uploaded_files = st.file_uploader(
+        label="Upload csv files",
+        type="csv",
+        accept_multiple_files=True,
+        key="batch_file_uploader",
+    )
+    # the files load in name order, so labels from a later extract win
+    uploaded_file = sorted(uploaded_files, key=lambda file: file.name) or None
+    stream_mode = False
+else:
+    uploaded_file = st.file_uploader(
+        label=f"Upload a csv",
+        type="csv",
+        accept_multiple_files=False,
+        key="file_uploader",
+    )
+
+    stream_mode = st.toggle(
+        label="Stream in chunks (large files)",
+        key="stream_mode_toggle",
+        help=(
+            f"Cleans and loads {UPLOAD_CHUNK_SIZE:,} rows at a time and only keeps a preview in memory. "
+            "Off, the whole file is cleaned here once and the cleaned data is loaded as it is."
+        ),
+    )
+
+if uploaded_file is None:
+    clear_upload_cache()
+else:
     if st.button("Clean Data", key="clean_data_btn"):
         st.session_state["show_clean_confirm"] = True
 
@@ -47,71 +164,149 @@ if uploaded_file is not None:
                     st.session_state["show_clean_confirm"] = False
                     st.rerun()
 
-if st.session_state.get("is_clean", False):
+if st.session_state.get("is_clean", False) and batch_mode:
     try:
-        raw = pd.read_csv(uploaded_file, dtype=str, delimiter=",")
+        files_summary = memoize_upload(
+            uploaded_file,
+            st.session_state["table_name"],
+            "batch_summary",
+            lambda: summarize_files(
+                [(file.name, file.getvalue()) for file in uploaded_file],
+                table_name=st.session_state["table_name"],
+            ),
+        )
 
         st.markdown(
-            "<h2 style='color: Bisque;'>Raw Uploaded Data</h2>", unsafe_allow_html=True
+            "<h2 style='color: DarkSalmon;'>Cleaned Files</h2>",
+            unsafe_allow_html=True,
         )
-        st.dataframe(raw.head())
+        rows, total, first, last = st.columns(4)
+        rows.metric("Rows", f"{files_summary['rows'].sum():,}")
+        total.metric("Total Amount", f"{files_summary['total_amount'].sum():,.2f}")
+        first.metric(
+            "First Accounting Date", str(files_summary["min_accounting_date"].min())
+        )
+        last.metric("Last Accounting Date", str(files_summary["max_accounting_date"].max()))
+        st.dataframe(files_summary, hide_index=True)
+
+        confirm_ingest(uploaded_file, rows_total=int(files_summary["rows"].sum()))
+
+    except DataValidationError as e:
+        show_validation_errors(e)
+        logger.error(e)
+
+    except Exception as e:
+        st.subheader("Data Cleaning Error")
+        st.error(f"{e}")
+        logger.error(e)
+
+elif st.session_state.get("is_clean", False) and stream_mode:
+    try:
+        raw_preview = memoize_upload(
+            uploaded_file,
+            st.session_state["table_name"],
+            "raw_preview",
+            lambda: pd.read_csv(uploaded_file, dtype=str, delimiter=",", nrows=PREVIEW_ROWS),
+        )
+        uploaded_file.seek(0)
 
         st.markdown(
-            "<h2 style='color: Bisque;'>Raw Data Types</h2>", unsafe_allow_html=True
+            "<h2 style='color: Bisque;'>Raw Uploaded Data</h2>", unsafe_allow_html=True
         )
-        st.dataframe(pd.DataFrame(raw.dtypes, columns=["Data Type"]), height=200)
+        st.dataframe(raw_preview)
 
-        # Try cleaning the data
         try:
+            summary = memoize_upload(
+                uploaded_file,
+                st.session_state["table_name"],
+                "summary",
+                lambda: summarize_upload(
+                    uploaded_file, table_name=st.session_state["table_name"]
+                ),
+            )
+
             st.markdown(
                 "<h2 style='color: DarkSalmon;'>Cleaned Data</h2>",
                 unsafe_allow_html=True,
             )
-            clean_data_df = clean_data(raw=raw)
-            st.dataframe(clean_data_df)
+            rows, total, first, last = st.columns(4)
+            rows.metric("Rows", f"{summary.rows:,}")
+            total.metric("Total Amount", f"{summary.total_amount:,.2f}")
+            first.metric("First Accounting Date", str(summary.min_accounting_date))
+            last.metric("Last Accounting Date", str(summary.max_accounting_date))
+            st.dataframe(to_database_frame(summary.preview))
 
             st.markdown(
                 "<h2 style='color: DarkSalmon;'>Cleaned Data Types</h2>",
                 unsafe_allow_html=True,
             )
             st.dataframe(
-                pd.DataFrame(clean_data_df.dtypes, columns=["Data Type"]), height=200
+                pd.DataFrame(summary.preview.dtypes, columns=["Data Type"]), height=200
             )
 
-            # Ingest button
-            if st.button("Ingest Data 🚀"):
-                st.session_state["show_ingestion_confirm"] = True
+            confirm_ingest(uploaded_file, rows_total=summary.rows)
 
-            # Confirmation UI
-            if st.session_state.get("show_ingestion_confirm", False):
-                st.warning("Are you sure you want to ingest the data?")
+        except DataValidationError as e:
+            show_validation_errors(e)
+            logger.error(e)
 
-                if st.button("✅ Yes, proceed", use_container_width=True):
-                    st.info("🏃 Data ingestion started!")
+        except Exception as e:
+            st.subheader("Data Cleaning Error")
+            st.error(f"{e}")
+            logger.error(e)
+
+    except Exception as e:
+        st.subheader("File Read Error")
+        st.error(f"{e}")
+        logger.error(e)
 
-                    try:
-                        message = drop_data_from_minimum_date_created(clean_data_df)
-                        st.success(message)
+elif st.session_state.get("is_clean", False):
+    try:
+        raw = memoize_upload(
+            uploaded_file,
+            st.session_state["table_name"],
+            "raw",
+            lambda: read_upload(uploaded_file, st.session_state["table_name"]),
+        )
 
-                        message = insert_data(clean_data_df.to_dict(orient="records"))
-                        st.success(message)
+        st.markdown(
+            "<h2 style='color: Bisque;'>Raw Uploaded Data</h2>", unsafe_allow_html=True
+        )
+        st.dataframe(raw.head())
+
+        st.markdown(
+            "<h2 style='color: Bisque;'>Raw Data Types</h2>", unsafe_allow_html=True
+        )
+        st.dataframe(pd.DataFrame(raw.dtypes, columns=["Data Type"]), height=200)
 
-                        st.markdown(
-                            "<h2 style='color: IndianRed;'>Database Data Head</h2>",
-                            unsafe_allow_html=True,
-                        )
-                        st.dataframe(show_head_from_db())
+        # Try cleaning the data
+        try:
+            st.markdown(
+                "<h2 style='color: DarkSalmon;'>Cleaned Data</h2>",
+                unsafe_allow_html=True,
+            )
+            clean_data_df = memoize_upload(
+                uploaded_file,
+                st.session_state["table_name"],
+                "clean",
+                lambda: clean_data(raw=raw),
+            )
+            with span("render", rows=len(clean_data_df), widget="cleaned_data"):
+                st.dataframe(to_database_frame(clean_data_df))
 
-                        # Clear flag after success
-                        st.session_state["show_ingestion_confirm"] = False
+            st.markdown(
+                "<h2 style='color: DarkSalmon;'>Cleaned Data Types</h2>",
+                unsafe_allow_html=True,
+            )
+            st.dataframe(
+                pd.DataFrame(clean_data_df.dtypes, columns=["Data Type"]), height=200
+            )
 
-                    except Exception as e:
-                        st.subheader("Data Ingestion Error")
-                        st.error(f"{e}")
-                        logger.error(e)
+            confirm_ingest(uploaded_file, rows_total=len(clean_data_df), clean_df=clean_data_df)
 
-                if st.button("❌ Cancel", use_container_width=True):
-                    st.session_state["show_ingestion_confirm"] = False
+        except DataValidationError as e:
+            show_validation_errors(e)
+            logger.error(e)
 
         except Exception as e:
             st.subheader("Data Cleaning Error")
@@ -122,3 +317,18 @@ if st.session_state.get("is_clean", False):
         st.subheader("File Read Error")
         st.error(f"{e}")
         logger.error(e)
+
+if "ingest_job_id" in st.session_state:
+    job = get_ingest_job(st.session_state["ingest_job_id"])
+    if job is not None:
+        st.markdown(
+            f"<h2 style='color: IndianRed;'>Ingestion of {job['file_name']}</h2>",
+            unsafe_allow_html=True,
+        )
+        if job["status"] in FINISHED:
+            show_finished_job(job)
+        else:
+            poll_ingest_job(job["id"])
+
+with st.expander("Recent uploads"):
+    st.dataframe(get_recent_ingest_jobs(), hide_index=True)
@@ -1,7 +1,16 @@
-from pydantic import BaseModel
-from utils.db_manager import get_connection
+from utils.arrow_fetch import fetch_frame
+from utils.db_manager import connection
+from utils.query_cache import LEDGER, bump_data_version
+from utils.timing import span, timed_chunks
+from typing import Callable, Iterable, Iterator, Optional
+from dataclasses import dataclass
+import hashlib
+import io
 import json
+import time
 import psycopg2
+from psycopg2.extras import execute_values
+import numpy as np
 import pandas as pd
 import streamlit as st
 from datetime import date
@@ -9,35 +18,157 @@ from constants.constants import (
     ManualJournalEntryTransaction,
     ManualBudget,
 )
+from pages.upload.validation import (
+    DataValidationError,
+    coerce_columns,
+    column_plan,
+    raise_for_errors,
+)
 
-
-def convert_date_cols(model: BaseModel, df: pd.DataFrame) -> pd.DataFrame:
-    for col, data_type in model.__annotations__.items():
-        if data_type is date:
-            try:
-                df[col] = pd.to_datetime(df[col], format="%m/%d/%Y").dt.date
-            except Exception as e:
-                print(f"Error converting column '{col}' to datetime: {e}")
-                raise Exception()
-    return df
+CENTS = 100
+# text columns with at most this many distinct values per row are stored as categories
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
 
 
-def validate_column_names(column_names: list[str], schema: dict) -> dict:
+def validate_column_names(
+    column_names: list[str], schema: dict, table_name: Optional[str] = None
+) -> dict:
     schema_column_names = list(schema.keys())
     missing_from_df = [col for col in schema_column_names if col not in column_names]
 
     if missing_from_df:
-        error_message = (
-            f"Column validation failed for table: {st.session_state["table_name"]}.\n"
-        )
+        table_name = table_name or st.session_state["table_name"]
+        error_message = f"Column validation failed for table: {table_name}.\n"
         if missing_from_df:
             error_message += f"Missing columns: {"\n".join(missing_from_df)}\n"
         raise Exception(error_message)
 
 
-def clean_data(raw: pd.DataFrame):
-    df = raw.copy()
-    table_name = st.session_state["table_name"]
+def normalize_column_names(columns: pd.Index) -> pd.Index:
+    return (
+        columns.str.strip()
+        .str.replace(" ", "_")
+        .str.replace("-", "_")
+        .str.replace(".", "")
+        .str.lower()
+    )
+
+
+def normalize_amount(amount: pd.Series) -> pd.Series:
+    """Strips thousands separators and rounds the whole column to cents."""
+    return round_to_cents(
+        pd.to_numeric(amount.str.replace(",", "", regex=False)).astype(float)
+    )
+
+
+def round_to_cents(values: pd.Series) -> pd.Series:
+    """Rounds a float column to cents exactly like ``"{:.2f}".format``.
+
+    np.round is used for the column and only values whose cents sit on a
+    rounding tie are re-rounded one by one.
+    """
+    rounded = values.round(2)
+
+    cents = values.to_numpy() * 100
+    distance_from_tie = np.abs(np.abs(cents - np.trunc(cents)) - 0.5)
+    near_tie = distance_from_tie <= np.maximum(np.spacing(cents) * 4, 1e-6)
+    if near_tie.any():
+        rounded[near_tie] = values[near_tie].map(lambda value: float(f"{value:.2f}"))
+
+    return rounded
+
+
+def to_cents(amount: pd.Series) -> pd.Series:
+    """Amounts as exact integer cents, rounded like round_to_cents."""
+    cents = np.rint(round_to_cents(amount).to_numpy() * CENTS)
+    return pd.Series(cents, index=amount.index).astype("Int64")
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Stores every text column whose values repeat as a category, in place.
+
+    Keys, labels and RAD data repeat across a ledger and shrink to one small
+    code per row; mostly unique columns like entry_id are left as they are.
+    """
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        codes, uniques = pd.factorize(df[col])
+        if len(uniques) <= len(df) * CATEGORY_MAX_UNIQUE_RATIO:
+            df[col] = pd.Categorical.from_codes(codes, categories=uniques)
+    return df
+
+
+def iso_dates(dates: pd.Series) -> pd.Series:
+    """datetime64 dates as yyyy-mm-dd categories, formatting each distinct date once."""
+    codes, uniques = pd.factorize(dates)
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=uniques.strftime("%Y-%m-%d")),
+        index=dates.index,
+    )
+
+
+def to_database_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """A cleaned frame with the table's columns and values, for COPY and display.
+
+    Dates become ISO text and ``amount_cents`` goes back to ``amount``. Categories
+    and missing values are kept, so the result hashes the same as the frame of
+    python objects row fingerprints were first computed on. A frame already in
+    this layout is returned as it is.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if pd.api.types.is_datetime64_dtype(df[col]):
+            df[col] = iso_dates(df[col])
+
+    if "amount_cents" in df.columns:
+        position = df.columns.get_loc("amount_cents")
+        amount = df.pop("amount_cents").astype("Float64").astype(float) / CENTS
+        df.insert(position, "amount", amount)
+    return df
+
+
+def fold_rad_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Folds the ``<rad_type_id>_rad`` columns into a single ``rad_data`` json column.
+
+    Each row gets a json array of ``{"rad_type_id", "rad_id"}`` objects for its
+    non-empty RAD values, or None when it has none. Every RAD value is encoded
+    once per distinct value and the arrays are assembled a column at a time.
+    """
+    rad_columns = [col_name for col_name in df.columns if col_name.endswith("_rad")]
+    rad_data = pd.Series("", index=df.index, dtype=object)
+
+    for col_name in rad_columns:
+        values = df[col_name]
+        has_value = values.notna() & (values != "")
+        if not has_value.any():
+            continue
+
+        rad_type_id = col_name.removesuffix("_rad")
+        present = values[has_value]
+        encoded = {
+            rad_id: json.dumps({"rad_type_id": rad_type_id, "rad_id": rad_id})
+            for rad_id in present.unique()
+        }
+        fragments = present.map(encoded)
+        so_far = rad_data[has_value]
+        rad_data[has_value] = np.where(
+            so_far == "", fragments, so_far + ", " + fragments
+        )
+
+    df = df.drop(columns=rad_columns)
+    df["rad_data"] = ("[" + rad_data + "]").where(rad_data != "", None)
+    return df
+
+
+def coerce_data(
+    raw: pd.DataFrame, table_name: Optional[str] = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Cleans ``raw`` and returns it with the report of values that failed coercion.
+
+    Bad values are left as None in the cleaned frame, see coerce_columns.
+    """
+    table_name = table_name or st.session_state["table_name"]
 
     # check if all columns are provided
     if table_name == "MANUAL_JOURNAL_ENTRY_TRANSACTION":
@@ -48,166 +179,700 @@ def clean_data(raw: pd.DataFrame):
         st.error(f"Unknown table name: {table_name}.  Cannot validate columns.")
         st.stop()
 
+    df = raw.copy(deep=False)
+
     # make column names spaces to _ and uppercase
-    df.columns = (
-        df.columns.str.strip()
-        .str.replace(" ", "_")
-        .str.replace("-", "_")
-        .str.replace(".", "")
-        .str.lower()
-    )
+    df.columns = normalize_column_names(df.columns)
 
     # validate columns
-    validate_column_names(column_names=df.columns.to_list(), schema=schema)
+    validate_column_names(
+        column_names=df.columns.to_list(),
+        schema=column_plan(schema),
+        table_name=table_name,
+    )
 
-    # convert date columns to pd.date
-    df = convert_date_cols(df=df, schema=schema)
+    # convert dates and numbers a column at a time, collecting the bad values
+    df, errors = coerce_columns(df, schema)
 
-    # convert nans to none
-    df = df.map(lambda value: None if pd.isna(value) else value)
+    # map amount values to exact integer cents
+    df.insert(df.columns.get_loc("amount"), "amount_cents", to_cents(df.pop("amount")))
 
-    # map amount values to a decimal numeric
-    df["amount"] = (
-        df["amount"]
-        .astype(str)
-        .map(lambda value: pd.to_numeric(str(value).replace(",", "")))
-        .map("{:.2f}".format)
-        .astype(float)
+    # create a single RAD_DATA column to encapuslate an optional array of rad data
+    clean = compact_frame(fold_rad_columns(df))
+
+    return clean, errors
+
+
+def show_validation_errors(error: DataValidationError):
+    st.subheader("Data Validation Errors")
+    st.error(f"{len(error.errors)} values could not be read, nothing was cleaned.")
+    st.dataframe(error.errors, hide_index=True)
+    st.download_button(
+        label="📥 Download the error report",
+        data=error.errors.to_csv(index=False),
+        file_name="validation_errors.csv",
+        mime="text/csv",
     )
 
-    # create a single RAD_DATA column to encapuslate an optional array of rad data
-    cols_to_scope = []
 
-    for col_name in df.columns:
-        if "RAD" in col_name:
-            cols_to_scope.append(col_name)
+def clean_data(raw: pd.DataFrame, table_name: Optional[str] = None):
+    table_name = table_name or st.session_state["table_name"]
+    with span("clean", table_name=table_name, rows=len(raw)):
+        clean, errors = coerce_data(raw, table_name)
+    raise_for_errors([errors])
+    return clean
 
-    list_of_dicts = df.to_dict(orient="records")
 
-    for row in list_of_dicts:
-        keys_to_remove = []
-        rad_data = []
+COPY_CHUNK_SIZE = 50_000
+UPLOAD_CHUNK_SIZE = 100_000
+PREVIEW_ROWS = 5
+
+
+def delete_from_minimum_date(cursor, table_name: str, min_date: date) -> int:
+    """Deletes the rows on or after ``min_date``, keeping their keys for prune_dimensions."""
+    create_removed_members_table(cursor)
+    with span("delete", table_name=table_name) as record:
+        cursor.execute(
+            f"""
+            WITH removed AS (
+                DELETE FROM finance.{table_name} WHERE accounting_date >= %s
+                RETURNING account_no, business_unit_id
+            ), members AS (
+                INSERT INTO {REMOVED_MEMBERS_TABLE}
+                SELECT DISTINCT account_no, business_unit_id FROM removed
+            )
+            SELECT COUNT(*) FROM removed
+            """,
+            (min_date,),
+        )
+        (record["rows"],) = cursor.fetchone()
+    return record["rows"]
 
-        for col_name in row.keys():
-            if "rad" in col_name:
-                keys_to_remove.append(col_name)
-                is_rad_id_value = row[col_name]
 
-                # check if RAD value exists
-                if is_rad_id_value:
-                    rad_type_id = col_name.replace("_rad", "")
-                    rad_id = row[col_name]
-                    rad_slice = {"rad_type_id": rad_type_id, "rad_id": rad_id}
-                    rad_data.append(rad_slice)
+def refresh_period_balance(cursor, table_name: str, min_date: date):
+    """Rebuilds the monthly balance snapshot from the month of ``min_date`` onward."""
+    if table_name == "MANUAL_JOURNAL_ENTRY_TRANSACTION":
+        with span("refresh_period_balance", table_name=table_name):
+            cursor.execute("SELECT finance.refresh_period_balance(%s)", (min_date,))
 
-        # encode to json object or none if arr is empty
-        if len(rad_data) != 0:
-            row["rad_data"] = json.dumps(rad_data, allow_nan=False)
-        else:
-            row["rad_data"] = None
 
-        # finally remove the RAD columns before insertion
-        for key_to_remove in keys_to_remove:
-            if key_to_remove in row:
-                del row[key_to_remove]
+def create_partitions(cursor, table_name: str, min_date: date, max_date: date):
+    """Adds the fiscal year partitions the upload needs before any row is inserted."""
+    if table_name == "MANUAL_JOURNAL_ENTRY_TRANSACTION":
+        cursor.execute(
+            "SELECT finance.create_fiscal_year_partitions(%s, %s)", (min_date, max_date)
+        )
 
-    clean = pd.DataFrame(list_of_dicts)
 
-    return clean
+UPSERT_ACCOUNT_SQL = """
+    INSERT INTO finance.account AS a (account_no, account, account_type) VALUES %s
+    ON CONFLICT (account_no) DO UPDATE SET
+        account = COALESCE(EXCLUDED.account, a.account),
+        account_type = COALESCE(NULLIF(EXCLUDED.account_type, ''), a.account_type)
+    WHERE (a.account, a.account_type) IS DISTINCT FROM
+        (COALESCE(EXCLUDED.account, a.account), COALESCE(NULLIF(EXCLUDED.account_type, ''), a.account_type))
+"""
+
+UPSERT_BUSINESS_UNIT_SQL = """
+    INSERT INTO finance.business_unit AS b (business_unit_id, business_unit) VALUES %s
+    ON CONFLICT (business_unit_id) DO UPDATE SET
+        business_unit = COALESCE(EXCLUDED.business_unit, b.business_unit)
+    WHERE b.business_unit IS DISTINCT FROM COALESCE(EXCLUDED.business_unit, b.business_unit)
+"""
+
+
+def update_dimensions(cursor, df: pd.DataFrame):
+    """Upserts the distinct accounts and business units of a batch into the dimension tables.
+
+    The latest label uploaded for a key wins; budget rows carry no account type,
+    a new account gets NULL and an existing one keeps its own. Keys whose last row an ingest deletes are
+    removed again by prune_dimensions.
+    """
+    accounts = (
+        df.reindex(columns=["account_no", "account", "account_type"])
+        .dropna(subset=["account_no"])
+        .drop_duplicates(subset="account_no", keep="last")
+        .astype(object)
+        .where(lambda frame: frame.notna(), None)
+    )
+    if not accounts.empty:
+        execute_values(
+            cursor, UPSERT_ACCOUNT_SQL, accounts.itertuples(index=False, name=None)
+        )
+
+    business_units = (
+        df.reindex(columns=["business_unit_id", "business_unit"])
+        .dropna(subset=["business_unit_id"])
+        .drop_duplicates(subset="business_unit_id", keep="last")
+        .astype(object)
+        .where(lambda frame: frame.notna(), None)
+    )
+    if not business_units.empty:
+        execute_values(
+            cursor,
+            UPSERT_BUSINESS_UNIT_SQL,
+            business_units.itertuples(index=False, name=None),
+        )
+
+
+# keys of the rows an ingest deleted, for this transaction only, see prune_dimensions
+REMOVED_MEMBERS_TABLE = "removed_members"
+
+
+def create_removed_members_table(cursor):
+    cursor.execute(f"DROP TABLE IF EXISTS {REMOVED_MEMBERS_TABLE}")
+    cursor.execute(
+        f"""
+            CREATE TEMP TABLE {REMOVED_MEMBERS_TABLE} (account_no TEXT, business_unit_id TEXT)
+            ON COMMIT DROP
+        """
+    )
+
+
+def prune_dimensions(cursor) -> tuple[int, int]:
+    """Deletes the accounts and business units an ingest left without any fact row.
+
+    Only the keys of the rows the ingest deleted can have lost their last row,
+    so only those are checked. Returns the accounts and business units deleted.
+    """
+    pruned = []
+    for dimension, key in [("account", "account_no"), ("business_unit", "business_unit_id")]:
+        cursor.execute(
+            f"""
+                DELETE FROM finance.{dimension} d
+                WHERE d.{key} IN (SELECT {key} FROM {REMOVED_MEMBERS_TABLE})
+                AND NOT EXISTS (
+                    SELECT 1 FROM finance.manual_journal_entry_transaction t WHERE t.{key} = d.{key}
+                )
+                AND NOT EXISTS (SELECT 1 FROM finance.manual_budget b WHERE b.{key} = d.{key})
+            """
+        )
+        pruned.append(cursor.rowcount)
+    return pruned[0], pruned[1]
+
+
+def iter_csv_chunks(df: pd.DataFrame, chunk_size: int = COPY_CHUNK_SIZE):
+    """Yields (row_count, buffer) pairs of ``df`` serialized as COPY-ready csv."""
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start : start + chunk_size]
+        buffer = io.StringIO()
+        chunk.to_csv(
+            buffer, index=False, header=False, na_rep="\\N", float_format="%.2f"
+        )
+        buffer.seek(0)
+        yield len(chunk), buffer
+
+
+def create_staging_table(cursor, table_name: str, columns: list[str]) -> str:
+    """Creates a temp table shaped like the given columns of ``finance.<table_name>``."""
+    staging_table = f"staging_{table_name.lower()}"
+    column_list = ", ".join([f'"{col}"' for col in columns])
+    cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    cursor.execute(
+        f"""
+            CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+            SELECT {column_list} FROM finance.{table_name} WITH NO DATA
+        """
+    )
+    return staging_table
+
+
+def copy_into_staging(
+    cursor,
+    staging_table: str,
+    df: pd.DataFrame,
+    progress_callback: Optional[Callable[[int], None]] = None,
+    chunk_size: int = COPY_CHUNK_SIZE,
+) -> int:
+    """Streams ``df`` into the staging table with COPY FROM STDIN, chunk by chunk."""
+    column_list = ", ".join([f'"{col}"' for col in df.columns])
+    copy_sql = (
+        f"COPY {staging_table} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    )
+    rows_copied = 0
+
+    for row_count, buffer in iter_csv_chunks(df, chunk_size):
+        cursor.copy_expert(copy_sql, buffer)
+        rows_copied += row_count
+        if progress_callback:
+            progress_callback(row_count)
+
+    return rows_copied
+
+
+# second seed of row_fingerprints, hash_pandas_object takes a 16 byte key
+FINGERPRINT_HASH_KEY = "journal-entry-v1"
+
+
+def row_fingerprints(df: pd.DataFrame) -> pd.Series:
+    """128 bits of hash per row of a cleaned chunk, as hex, from two seeded 64 bit hashes."""
+    hashes = [
+        pd.util.hash_pandas_object(df, index=False),
+        pd.util.hash_pandas_object(df, index=False, hash_key=FINGERPRINT_HASH_KEY),
+    ]
+    return hashes[0].map("{:016x}".format) + hashes[1].map("{:016x}".format)
+
+
+def apply_staging_delta(
+    cursor, table_name: str, staging_table: str, columns: list[str], min_date: date
+) -> pd.DataFrame:
+    """Makes the table match the staged upload on or after ``min_date`` by fingerprint.
+
+    The staged row_hash is the row's content hash; the occurrence among identical
+    rows is appended so a file with the same line twice keeps both. Rows the
+    upload no longer has are deleted and rows the table doesn't have yet are
+    inserted, a changed row is one of each, and rows on both sides are left
+    alone. Returns the inserted and deleted rows per month, and keeps the keys
+    of the deleted rows in REMOVED_MEMBERS_TABLE for prune_dimensions.
+    """
+    column_list = ", ".join([f'"{col}"' for col in columns])
+    # room for the fingerprint sort and hashes of a whole upload, for this transaction only
+    cursor.execute("SET LOCAL work_mem = '256MB'")
+    incoming = f"""
+        incoming AS (
+            SELECT {column_list}, row_hash || ':' || ROW_NUMBER() OVER (PARTITION BY row_hash) AS row_hash
+            FROM {staging_table}
+        )
+    """
+    create_removed_members_table(cursor)
+    with span("delete", table_name=table_name) as record:
+        cursor.execute(
+            f"""
+            WITH {incoming}, removed AS (
+                DELETE FROM finance.{table_name} t
+                WHERE t.accounting_date >= %(min_date)s
+                AND NOT EXISTS (SELECT 1 FROM incoming i WHERE i.row_hash = t.row_hash)
+                RETURNING t.accounting_date, t.account_no, t.business_unit_id
+            ), members AS (
+                INSERT INTO {REMOVED_MEMBERS_TABLE}
+                SELECT DISTINCT account_no, business_unit_id FROM removed
+            )
+            SELECT DATE_TRUNC('month', accounting_date)::DATE, COUNT(*) FROM removed GROUP BY 1
+            """,
+            {"min_date": min_date},
+        )
+        deleted = dict(cursor.fetchall())
+        record["rows"] = sum(deleted.values())
+
+    with span("insert", table_name=table_name) as record:
+        cursor.execute(
+            f"""
+            WITH {incoming}, added AS (
+                INSERT INTO finance.{table_name} ({column_list}, row_hash)
+                SELECT {column_list}, i.row_hash FROM incoming i
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM finance.{table_name} t
+                    WHERE t.accounting_date >= %(min_date)s AND t.row_hash = i.row_hash
+                )
+                RETURNING accounting_date
+            )
+            SELECT DATE_TRUNC('month', accounting_date)::DATE, COUNT(*) FROM added GROUP BY 1
+            """,
+            {"min_date": min_date},
+        )
+        inserted = dict(cursor.fetchall())
+        record["rows"] = sum(inserted.values())
+
+    delta = pd.DataFrame(
+        {"inserted": pd.Series(inserted, dtype=int), "deleted": pd.Series(deleted, dtype=int)}
+    )
+    return delta.fillna(0).astype(int).rename_axis("period").sort_index().reset_index()
+
+
+def file_fingerprint(uploaded_file, block_size: int = 1 << 20) -> str:
+    """The sha256 of the uploaded file's bytes."""
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    while block := uploaded_file.read(block_size):
+        digest.update(block)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def batch_fingerprint(file_hashes: Iterable[str]) -> str:
+    """One sha256 for a batch of files, from their file fingerprints in order."""
+    return hashlib.sha256("\n".join(file_hashes).encode()).hexdigest()
+
+
+# session state key of the cleaned upload, see memoize_upload
+UPLOAD_CACHE_KEY = "upload_cache"
+
+
+def upload_fingerprint(uploaded_file) -> str:
+    """file_fingerprint, computed once per uploaded file for the session.
+
+    A list of uploaded files gets their batch_fingerprint.
+    """
+    if isinstance(uploaded_file, list):
+        return batch_fingerprint(map(upload_fingerprint, uploaded_file))
+
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id is None:
+        return file_fingerprint(uploaded_file)
+
+    fingerprints = st.session_state.setdefault("upload_fingerprints", {})
+    if file_id not in fingerprints:
+        fingerprints[file_id] = file_fingerprint(uploaded_file)
+    return fingerprints[file_id]
+
+
+def memoize_upload(uploaded_file, table_name: str, step: str, compute: Callable):
+    """Runs ``compute`` once per file content, table and step for the session.
+
+    Reruns of the upload page get the stored result back, or the stored
+    exception raised again. Results of any other file or table are dropped.
+    ``uploaded_file`` can also be the list of files of a batch.
+    """
+    key = (upload_fingerprint(uploaded_file), table_name)
+    cache = st.session_state.setdefault(UPLOAD_CACHE_KEY, {})
+    if cache.get("key") != key:
+        cache.clear()
+        cache["key"] = key
+
+    if step not in cache:
+        try:
+            cache[step] = (compute(), None)
+        except Exception as e:
+            cache[step] = (None, e)
+
+    result, error = cache[step]
+    if error is not None:
+        raise error
+    return result
+
+
+def clear_upload_cache():
+    st.session_state.pop(UPLOAD_CACHE_KEY, None)
+    st.session_state.pop("upload_fingerprints", None)
+
+
+def is_current_upload(cursor, table_name: str, file_hash: str) -> bool:
+    """Whether the file was the last one ingested into the table and the ledger hasn't changed since."""
+    cursor.execute(
+        """
+            SELECT i.file_hash = %s AND i.data_version = v.version
+            FROM finance.ingest_file i, finance.data_version v
+            WHERE i.table_name = %s AND v.scope = %s
+            ORDER BY i.id DESC
+            LIMIT 1
+        """,
+        (file_hash, table_name, LEDGER),
+    )
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def record_ingest(
+    cursor,
+    table_name: str,
+    file_hash: str,
+    file_name: Optional[str],
+    summary: "UploadSummary",
+):
+    """Adds the upload to the file ledger, after the ledger version was bumped."""
+    cursor.execute(
+        """
+            INSERT INTO finance.ingest_file (
+                table_name, file_hash, file_name, row_count, rows_inserted,
+                rows_deleted, min_accounting_date, data_version
+            )
+            SELECT %s, %s, %s, %s, %s, %s, %s, version
+            FROM finance.data_version WHERE scope = %s
+        """,
+        (
+            table_name,
+            file_hash,
+            file_name,
+            summary.rows,
+            int(summary.delta["inserted"].sum()),
+            int(summary.delta["deleted"].sum()),
+            summary.min_accounting_date,
+            LEDGER,
+        ),
+    )
+
+
+@dataclass
+class UploadSummary:
+    """Running totals of a cleaned upload, plus the first few rows for display."""
+
+    rows: int = 0
+    total_cents: int = 0
+    min_accounting_date: Optional[date] = None
+    max_accounting_date: Optional[date] = None
+    preview: Optional[pd.DataFrame] = None
+    # rows inserted and deleted per month, set once the upload is applied
+    delta: Optional[pd.DataFrame] = None
+
+    @property
+    def total_amount(self) -> float:
+        return self.total_cents / CENTS
+
+    def update(self, chunk: pd.DataFrame):
+        if chunk.empty:
+            return
+
+        self.rows += len(chunk)
+        self.total_cents += int(chunk["amount_cents"].sum())
+
+        chunk_dates = chunk["accounting_date"].dropna()
+        if not chunk_dates.empty:
+            chunk_min, chunk_max = chunk_dates.min().date(), chunk_dates.max().date()
+            if self.min_accounting_date is None or chunk_min < self.min_accounting_date:
+                self.min_accounting_date = chunk_min
+            if self.max_accounting_date is None or chunk_max > self.max_accounting_date:
+                self.max_accounting_date = chunk_max
+
+        if self.preview is None or len(self.preview) < PREVIEW_ROWS:
+            self.preview = pd.concat(
+                [self.preview, chunk.head(PREVIEW_ROWS)]
+            ).head(PREVIEW_ROWS)
+
+
+def read_upload(uploaded_file, table_name: Optional[str] = None) -> pd.DataFrame:
+    uploaded_file.seek(0)
+    with span("read_csv", table_name=table_name) as record:
+        raw = pd.read_csv(uploaded_file, dtype=str, delimiter=",")
+        record["rows"] = len(raw)
+    return raw
+
+
+def read_csv_chunks(
+    uploaded_file, chunk_size: int = UPLOAD_CHUNK_SIZE, table_name: Optional[str] = None
+) -> Iterator[pd.DataFrame]:
+    uploaded_file.seek(0)
+    reader = pd.read_csv(uploaded_file, dtype=str, delimiter=",", chunksize=chunk_size)
+    return timed_chunks(reader, "read_csv", table_name)
+
+
+def iter_clean_chunks(
+    uploaded_file, table_name: str, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """Reads and cleans the upload ``chunk_size`` rows at a time."""
+    for raw_chunk in read_csv_chunks(uploaded_file, chunk_size, table_name):
+        yield clean_data(raw=raw_chunk, table_name=table_name)
+
+
+def summarize_upload(
+    uploaded_file, table_name: str, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> UploadSummary:
+    """Cleans the whole upload chunk by chunk without keeping any of it.
+
+    Raises a DataValidationError with the bad values of every chunk at the end.
+    """
+    summary = UploadSummary()
+    errors = []
+    for raw_chunk in read_csv_chunks(uploaded_file, chunk_size, table_name):
+        with span("clean", table_name=table_name, rows=len(raw_chunk)):
+            clean_chunk, chunk_errors = coerce_data(raw=raw_chunk, table_name=table_name)
+        summary.update(clean_chunk)
+        errors.append(chunk_errors)
+
+    raise_for_errors(errors)
+    return summary
+
+
+# seconds between tries for a table another ingest holds, when the caller sends heartbeats
+LOCK_RETRY_SECONDS = 5
+
+
+def lock_for_ingest(
+    cursor, table_name: str, heartbeat: Optional[Callable[[], None]] = None
+):
+    """Takes the table's ingest lock for the transaction.
+
+    Uploads to the same table take turns, across sessions and processes. With a
+    ``heartbeat`` the lock is tried every LOCK_RETRY_SECONDS and the heartbeat
+    is sent in between, instead of blocking until the other ingest commits.
+    """
+    key = f"ingest:{table_name}"
+    if heartbeat is None:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (key,))
+        return
+
+    while True:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (key,))
+        if cursor.fetchone()[0]:
+            return
+        heartbeat()
+        time.sleep(LOCK_RETRY_SECONDS)
+
+
+def stream_ingest_data(
+    clean_chunks: Iterable[pd.DataFrame],
+    table_name: str,
+    progress_callback: Optional[Callable[[int], None]] = None,
+    file_hash: Optional[str] = None,
+    file_name: Optional[str] = None,
+    heartbeat: Optional[Callable[[], None]] = None,
+) -> tuple[str, str, UploadSummary]:
+    """Makes the table match the chunks on or after their minimum accounting_date.
+
+    Each chunk is COPYed into a temp staging table as soon as it arrives, so only
+    one chunk is held in memory. Once the minimum accounting_date is known only
+    the rows that differ by fingerprint are deleted and inserted, in the same
+    transaction, so a failure anywhere leaves the table untouched.
+
+    With a ``file_hash`` the upload is recorded in finance.ingest_file, and a
+    file that is still the last one applied is skipped without being read.
+
+    ``heartbeat`` is called while waiting for the table and between the steps
+    after the COPY, which send no progress.
+    """
+    summary = UploadSummary()
+    staging_table = None
+
+    with connection() as conn, conn.cursor() as cursor:
+        try:
+            lock_for_ingest(cursor, table_name, heartbeat)
+            if file_hash and is_current_upload(cursor, table_name, file_hash):
+                return (
+                    f"⏭️ This file is already ingested into {table_name} and nothing changed since, skipped.",
+                    f"📥 0 rows inserted into {table_name}",
+                    summary,
+                )
+
+            for chunk in clean_chunks:
+                with span("load", table_name=table_name, rows=len(chunk)):
+                    rows = to_database_frame(chunk)
+                    if staging_table is None:
+                        columns = rows.columns.to_list()
+                        staging_table = create_staging_table(
+                            cursor, table_name, columns + ["row_hash"]
+                        )
+                    copy_into_staging(
+                        cursor,
+                        staging_table,
+                        rows[columns].assign(row_hash=row_fingerprints(rows[columns])),
+                        progress_callback,
+                    )
+                    update_dimensions(cursor, rows)
+                summary.update(chunk)
+
+            if summary.rows == 0:
+                raise Exception("The uploaded file does not contain any rows.")
+
+            min_date = summary.min_accounting_date
+            create_partitions(
+                cursor, table_name, min_date, summary.max_accounting_date
+            )
+            if heartbeat:
+                heartbeat()
+            summary.delta = apply_staging_delta(
+                cursor, table_name, staging_table, columns, min_date
+            )
+            if not summary.delta.empty:
+                if heartbeat:
+                    heartbeat()
+                prune_dimensions(cursor)
+                if heartbeat:
+                    heartbeat()
+                refresh_period_balance(cursor, table_name, summary.delta["period"].min())
+                bump_data_version(cursor, LEDGER)
+            if file_hash:
+                record_ingest(cursor, table_name, file_hash, file_name, summary)
+            conn.commit()
+        except psycopg2.Error as e:
+            raise Exception(f"Error ingesting data into {table_name}: {e}")
+
+    rows_deleted = int(summary.delta["deleted"].sum())
+    rows_inserted = int(summary.delta["inserted"].sum())
+    drop_message = (
+        f"💧 {rows_deleted} rows deleted on or after {min_date}, "
+        f"{summary.rows - rows_inserted} uploaded rows were already there."
+    )
+    insert_message = f"📥 {rows_inserted} rows inserted into {table_name}"
+    return drop_message, insert_message, summary
+
+
+def ingest_data(
+    df: pd.DataFrame,
+    table_name: str,
+    progress_callback: Optional[Callable[[int], None]] = None,
+    file_hash: Optional[str] = None,
+    file_name: Optional[str] = None,
+) -> tuple[str, str]:
+    """Makes the table match ``df`` on or after its minimum accounting_date."""
+    drop_message, insert_message, _ = stream_ingest_data(
+        [df], table_name, progress_callback, file_hash, file_name
+    )
+    return drop_message, insert_message
 
 
 def drop_data_from_minimum_date_created(df: pd.DataFrame) -> str:
-    clean_data_copy = df.copy()
-    min_date = clean_data_copy["accounting_date"].min()
-    conn = get_connection()
-    cursor = conn.cursor()
+    min_date = df["accounting_date"].min().date()
 
-    try:
-        sql = f'delete from finance.{st.session_state["table_name"]} where accounting_date >= %s'
-        cursor.execute(sql, (min_date,))
-        rows_dropped = cursor.rowcount
-        conn.commit()
+    with connection() as conn, conn.cursor() as cursor:
+        try:
+            rows_dropped = delete_from_minimum_date(
+                cursor, st.session_state["table_name"], min_date
+            )
+            prune_dimensions(cursor)
+            refresh_period_balance(cursor, st.session_state["table_name"], min_date)
+            bump_data_version(cursor, LEDGER)
+            conn.commit()
+        except psycopg2.Error as e:
+            raise Exception(
+                f"While dropping data from minimum date an error occured: {e}"
+            )
+
+    return_message = f"💧 {rows_dropped} rows dropped from column accounting_date on or after {min_date}."
+    return return_message
 
-        return_message = f"💧 {rows_dropped} rows dropped from column accounting_date on or after {min_date}."
-        return return_message
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise Exception(f"While dropping data from minimum date an error occured: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+
+def to_records(df: pd.DataFrame) -> list[dict]:
+    """The rows of a cleaned frame as dicts of the table's values, None where missing."""
+    rows = to_database_frame(df).astype(object)
+    return rows.where(rows.notna(), None).to_dict(orient="records")
 
 
 def insert_data(data_to_insert: list[dict]) -> str:
-    """Inserts a single row of data into the SQLite table."""
+    """Inserts the rows one INSERT at a time.
+
+    Kept as the baseline for benchmarks/bench_ingest.py; the upload page goes
+    through ingest_data instead.
+    """
+    table_name = st.session_state["table_name"]
     rows_inserted = 0
     success_placeholder = st.empty()
 
-    try:
-        conn = get_connection()
+    with connection() as conn, conn.cursor() as cursor:
+        try:
+            accounting_dates = [row["accounting_date"] for row in data_to_insert]
+            min_date = min(filter(None, accounting_dates), default=None)
+            max_date = max(filter(None, accounting_dates), default=None)
+            create_partitions(cursor, table_name, min_date, max_date)
 
-        cursor = conn.cursor()
-        for row in data_to_insert:
-            columns = ", ".join([f'"{col}"' for col in row.keys()])
-            placeholders = ", ".join(["%s"] * len(row))
-            query = f'INSERT INTO FINANCE.{st.session_state["table_name"]} ({columns}) VALUES ({placeholders})'
-            values = tuple(row.values())
+            for row in data_to_insert:
+                columns = ", ".join([f'"{col}"' for col in row.keys()])
+                placeholders = ", ".join(["%s"] * len(row))
+                query = f"INSERT INTO FINANCE.{table_name} ({columns}) VALUES ({placeholders})"
+                values = tuple(row.values())
 
-            try:
                 cursor.execute(query, values)
-                success_placeholder.success(
-                    f"Successfully inserted row {rows_inserted}"
-                )
+                success_placeholder.success(f"Successfully inserted row {rows_inserted}")
                 rows_inserted += 1
-            except Exception as e:
-                raise e
 
-        success_placeholder.empty()
-        conn.commit()
+            update_dimensions(cursor, pd.DataFrame(data_to_insert))
+            if min_date is not None:
+                refresh_period_balance(cursor, table_name, min_date)
 
-        return_message = (
-            f"📥 {rows_inserted} rows/s inserted into {st.session_state["table_name"]}"
-        )
-        return return_message
+            success_placeholder.empty()
+            bump_data_version(cursor, LEDGER)
+            conn.commit()
+        except psycopg2.Error as e:
+            raise Exception(f"Error inserting data into {table_name}: {e}")
+        except Exception as e:
+            raise Exception(f"An unexpected error occurred: {e}")
 
-    except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
-        raise Exception(
-            f"Error inserting data into {st.session_state["table_name"]}: {e}"
-        )
-    except Exception as e:
-        raise Exception(f"An unexpected error occurred: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    return_message = f"📥 {rows_inserted} rows/s inserted into {table_name}"
+    return return_message
 
 
 def show_head_from_db():
+    table_name = st.session_state["table_name"]
+
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        query = f'select * from finance.{st.session_state["table_name"]} order by id limit 5;'
-        cursor.execute(query)
-
-        # cast the results into a dataframe
-        results = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(results, columns=column_names)
-        conn.commit()
-        return df
-    except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
-        raise Exception(
-            f"Error fetching top data from {st.session_state["table_name"]}: {e}"
-        )
+        return fetch_frame(f"select * from finance.{table_name} order by id limit 5")
     except Exception as e:
-        raise Exception(f"An unexpected error occurred: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        raise Exception(f"Error fetching top data from {table_name}: {e}")
@@ -0,0 +1,118 @@
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+DATE_FORMAT = "%m/%d/%Y"
+ERROR_COLUMNS = ["line", "column", "value", "error"]
+# rows of the error report shown in the exception message
+MESSAGE_ERRORS = 5
+
+
+@lru_cache(maxsize=None)
+def column_plan(model: type[BaseModel]) -> dict[str, type]:
+    """The python type every field of ``model`` is coerced to: date, float or str.
+
+    Dates are coerced to datetime64 and floats to float64, see COERCERS.
+    """
+    return {name: field.annotation for name, field in model.model_fields.items()}
+
+
+def coerce_date(values: pd.Series) -> tuple[pd.Series, pd.Series]:
+    # a ledger has few distinct dates, parse each once and expand by position
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(uniques, format=DATE_FORMAT, errors="coerce").to_numpy()
+    # missing values have code -1, which picks the NaT appended last
+    parsed = np.append(parsed, np.datetime64("NaT", "ns"))
+    dates = pd.Series(parsed[codes], index=values.index)
+    return dates, dates.isna()
+
+
+def coerce_float(values: pd.Series) -> tuple[pd.Series, pd.Series]:
+    parsed = pd.to_numeric(values, errors="coerce").astype(float)
+    # only values that failed are retried without thousands separators
+    failed = parsed.isna() & values.notna()
+    if failed.any():
+        parsed[failed] = pd.to_numeric(
+            values[failed].str.replace(",", "", regex=False), errors="coerce"
+        )
+    return parsed, parsed.isna()
+
+
+COERCERS = {
+    date: (coerce_date, f"not a {DATE_FORMAT} date"),
+    float: (coerce_float, "not a number"),
+}
+
+
+def coerce_columns(
+    df: pd.DataFrame, model: type[BaseModel]
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Coerces each column of ``df`` to its type in ``model`` a whole column at a time.
+
+    ``df`` holds the csv as strings with the index read_csv gave it. Returns the
+    coerced frame and one error row per value that couldn't be coerced, with
+    the line of the csv it came from. Empty values are left as missing.
+    """
+    df = df.copy()
+    errors = []
+
+    for col, data_type in column_plan(model).items():
+        if data_type not in COERCERS or col not in df.columns:
+            continue
+
+        coerce, message = COERCERS[data_type]
+        values = df[col]
+        df[col], failed = coerce(values)
+
+        bad = values[failed].dropna()
+        bad = bad[bad.str.strip() != ""]
+        if not bad.empty:
+            errors.append(
+                pd.DataFrame(
+                    {
+                        # line 1 is the header
+                        "line": bad.index.to_numpy() + 2,
+                        "column": col,
+                        "value": bad.to_numpy(),
+                        "error": message,
+                    }
+                )
+            )
+
+    if not errors:
+        return df, pd.DataFrame(columns=ERROR_COLUMNS)
+    return df, pd.concat(errors, ignore_index=True).sort_values(
+        ["line", "column"], ignore_index=True
+    )
+
+
+class DataValidationError(Exception):
+    """Raised with every value of an upload that doesn't fit its table's model."""
+
+    def __init__(self, errors: pd.DataFrame):
+        self.errors = errors
+        head = errors.head(MESSAGE_ERRORS)
+        where = "line " + head["line"].astype(str)
+        row_keys = ["line"]
+        # the errors of a batch of files say which file each line is in
+        if "file_name" in errors.columns:
+            where = head["file_name"] + " " + where
+            row_keys = ["file_name", "line"]
+        bad_rows = len(errors.drop_duplicates(subset=row_keys))
+        first = "\n".join(
+            f"{place}, {row.column}: {row.value!r} is {row.error}"
+            for place, row in zip(where, head.itertuples())
+        )
+        super().__init__(
+            f"{len(errors)} invalid values in {bad_rows} rows of the upload:\n{first}"
+        )
+
+
+def raise_for_errors(errors: list[pd.DataFrame]):
+    """Raises one DataValidationError for the error reports of every chunk, if any."""
+    errors = [chunk_errors for chunk_errors in errors if not chunk_errors.empty]
+    if errors:
+        raise DataValidationError(pd.concat(errors, ignore_index=True))
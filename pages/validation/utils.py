@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from datetime import date
+
+import pandas as pd
+
+from pages.upload.utils import CENTS, normalize_column_names, to_cents
+from pages.upload.validation import ERROR_COLUMNS, raise_for_errors
+from utils.arrow_fetch import CATEGORY, fetch_frame
+from utils.query_cache import LEDGER, cached_query
+
+REQUIRED_COLUMNS = ["account", "debit", "credit"]
+# upload headers accepted for the business unit, once normalized
+BUSINESS_UNIT_COLUMNS = ["business_unit_id", "business_unit", "bu"]
+BALANCE_COLUMNS = ["closing_balance", "activity_balance", "opening_balance"]
+# both sides are compared in whole cents, a difference of one cent is a break
+TOLERANCE = 0.005
+AMOUNT_ERROR = "not an amount"
+
+
+@dataclass
+class Reconciliation:
+    """An uploaded trial balance tied out against the ledger for one period."""
+
+    keys: list[str]
+    # one row per key with the uploaded and ledger balance, outer joined
+    balances: pd.DataFrame
+    debit_total: float
+    credit_total: float
+    ledger_total: float
+
+    @property
+    def uploaded_total(self) -> float:
+        return round(self.debit_total - self.credit_total, 2)
+
+    @property
+    def is_balanced(self) -> bool:
+        return abs(self.uploaded_total) < TOLERANCE
+
+    @property
+    def differences(self) -> pd.DataFrame:
+        return self.balances[self.balances["difference"].abs() >= TOLERANCE]
+
+    @property
+    def account_differences(self) -> pd.DataFrame:
+        by_account = (
+            self.balances.groupby("account_no", sort=True)[
+                ["uploaded", "ledger", "difference"]
+            ]
+            .sum()
+            .round(2)
+            .reset_index()
+        )
+        return by_account[by_account["difference"].abs() >= TOLERANCE]
+
+    def unmatched(self, side: str) -> pd.DataFrame:
+        """The keys only found in the upload (``left_only``) or the ledger (``right_only``)."""
+        return self.balances.loc[self.balances["found_in"] == side, self.keys]
+
+
+def coerce_amount(values: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Parses debit or credit cells into cents, and flags the ones that aren't amounts.
+
+    Thousands separators are dropped, accounting negatives like ``(1,234.50)``
+    become ``-1234.50`` and empty cells count as zero.
+    """
+    text = values.fillna("").str.strip().str.replace(",", "", regex=False)
+    text = text.str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+    parsed = pd.to_numeric(text.mask(text == "", "0"), errors="coerce").astype(float)
+    return to_cents(parsed), parsed.isna()
+
+
+def read_trial_balance(uploaded_file) -> pd.DataFrame:
+    """Reads an uploaded trial balance into account_no, business_unit_id, debit_cents, credit_cents.
+
+    The business unit column is optional, without it the upload is reconciled by
+    account only. Raises one DataValidationError with every debit or credit
+    cell that isn't an amount.
+    """
+    uploaded_file.seek(0)
+    df = pd.read_csv(uploaded_file, dtype=str)
+    df.columns = normalize_column_names(df.columns)
+
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise Exception(f"Missing trial balance columns: {', '.join(missing)}")
+
+    trial_balance = pd.DataFrame(
+        {"account_no": df["account"].str.strip().astype("category")}
+    )
+    business_unit = next((col for col in BUSINESS_UNIT_COLUMNS if col in df.columns), None)
+    if business_unit:
+        trial_balance["business_unit_id"] = df[business_unit].str.strip().astype("category")
+    errors = []
+    for col in ["debit", "credit"]:
+        trial_balance[f"{col}_cents"], failed = coerce_amount(df[col])
+        bad = df.loc[failed, col]
+        errors.append(
+            pd.DataFrame(
+                {
+                    # line 1 is the header
+                    "line": bad.index.to_numpy() + 2,
+                    "column": col,
+                    "value": bad.to_numpy(),
+                    "error": AMOUNT_ERROR,
+                },
+                columns=ERROR_COLUMNS,
+            )
+        )
+    raise_for_errors(
+        [pd.concat(errors, ignore_index=True).sort_values(["line", "column"], ignore_index=True)]
+    )
+
+    return trial_balance[trial_balance["account_no"].notna()]
+
+
+@cached_query(LEDGER)
+def fetch_ledger_balances(start_date: date, end_date: date) -> pd.DataFrame:
+    """The ledger trial balance by account and business unit, fetched in one query.
+
+    Balances come back as exact cents, in ``<balance>_cents`` columns.
+    """
+    balances = fetch_frame(
+        "SELECT * FROM finance.trial_balance_journal_entry(%s, %s)",
+        (start_date, end_date),
+        dtypes={"account_no": CATEGORY, "business_unit_id": CATEGORY},
+        cents=BALANCE_COLUMNS,
+    )
+    return balances.rename(columns={col: f"{col}_cents" for col in BALANCE_COLUMNS})
+
+
+def reconcile(
+    uploaded: pd.DataFrame, ledger: pd.DataFrame, value_column: str = "closing_balance"
+) -> Reconciliation:
+    """Outer joins both sides on their keys after summing each side per key.
+
+    The upload's balance is debit minus credit. ``ledger`` is fetch_ledger_balances'
+    frame, so both sides are summed and compared in exact cents. Keys missing on
+    one side count as zero on that side, so they show up both as differences
+    and as unmatched.
+    """
+    keys = [col for col in ["account_no", "business_unit_id"] if col in uploaded.columns]
+
+    uploaded_cents = (
+        uploaded.assign(uploaded=uploaded["debit_cents"] - uploaded["credit_cents"])
+        .groupby(keys, dropna=False, observed=True)["uploaded"]
+        .sum()
+    )
+    ledger_cents = (
+        ledger.rename(columns={f"{value_column}_cents": "ledger"})
+        .groupby(keys, dropna=False, observed=True)["ledger"]
+        .sum()
+    )
+
+    balances = pd.merge(
+        uploaded_cents,
+        ledger_cents,
+        how="outer",
+        left_index=True,
+        right_index=True,
+        indicator="found_in",
+    ).reset_index()
+    cents = balances[["uploaded", "ledger"]].fillna(0).astype("int64")
+    cents["difference"] = cents["uploaded"] - cents["ledger"]
+    balances[["uploaded", "ledger", "difference"]] = cents / CENTS
+    balances["found_in"] = balances["found_in"].astype(str)
+
+    return Reconciliation(
+        keys=keys,
+        balances=balances,
+        debit_total=int(uploaded["debit_cents"].sum()) / CENTS,
+        credit_total=int(uploaded["credit_cents"].sum()) / CENTS,
+        ledger_total=int(ledger[f"{value_column}_cents"].sum()) / CENTS,
+    )
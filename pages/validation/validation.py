@@ -1,6 +1,9 @@
 import streamlit as st
-import pandas as pd
+from datetime import date
 from app import logger
+from pages.upload.validation import DataValidationError
+from pages.validation.utils import *
+from utils.timing import span
 
 st.title("📥 Trial Balance Upload")
 
@@ -12,25 +15,74 @@ uploaded_file = st.file_uploader(
 if uploaded_file is not None:
     try:
         # Read the CSV file
-        df = pd.read_csv(uploaded_file)
+        df = read_trial_balance(uploaded_file)
         logger.info(f"Trial Balance file '{uploaded_file.name}' uploaded successfully.")
 
         # Basic preview
-        st.success("File uploaded successfully! Here's a preview:")
-        st.dataframe(df)
-
-        # Optional: validate expected columns
-        expected_columns = {"Account", "Description", "Debit", "Credit"}
-        if not expected_columns.issubset(df.columns):
-            st.warning(
-                f"Missing expected columns. Expected at least: {expected_columns}"
-            )
-            logger.warning(
-                f"Uploaded file is missing some expected columns: {df.columns.tolist()}"
+        st.success(f"File uploaded successfully! {len(df):,} lines, here's a preview:")
+        st.dataframe(df.head(100))
+
+        start, end, balance = st.columns(3)
+        start_date = start.date_input("Start date", value=date.today().replace(day=1))
+        end_date = end.date_input("End date", value=date.today())
+        value_column = balance.selectbox("Compare against", options=BALANCE_COLUMNS)
+
+        if st.button("Reconcile ⚖️"):
+            with span("reconcile", rows=len(df)):
+                reconciliation = reconcile(
+                    df, fetch_ledger_balances(start_date, end_date), value_column
+                )
+
+            debits, credits, net, ledger = st.columns(4)
+            debits.metric("Debits", f"{reconciliation.debit_total:,.2f}")
+            credits.metric("Credits", f"{reconciliation.credit_total:,.2f}")
+            net.metric("Debits - Credits", f"{reconciliation.uploaded_total:,.2f}")
+            ledger.metric("Ledger Net", f"{reconciliation.ledger_total:,.2f}")
+
+            if reconciliation.is_balanced:
+                st.success("Debits and credits net to zero.")
+            else:
+                st.warning("Debits and credits do not net to zero.")
+
+            differences = reconciliation.differences
+            if differences.empty:
+                st.success(f"The trial balance ties out to the ledger by {' and '.join(reconciliation.keys)}.")
+            else:
+                st.subheader("Account Differences")
+                st.dataframe(reconciliation.account_differences, hide_index=True)
+
+                if "business_unit_id" in reconciliation.keys:
+                    st.subheader("Account and Business Unit Differences")
+                    st.dataframe(differences, hide_index=True)
+
+                st.download_button(
+                    label="📥 Download the differences",
+                    data=differences.to_csv(index=False),
+                    file_name=f"tb_differences_{start_date}_{end_date}.csv",
+                    mime="text/csv",
+                )
+
+            only_uploaded, only_ledger = st.columns(2)
+            with only_uploaded:
+                st.subheader("Only in the Upload")
+                st.dataframe(reconciliation.unmatched("left_only"), hide_index=True)
+            with only_ledger:
+                st.subheader("Only in the Ledger")
+                st.dataframe(reconciliation.unmatched("right_only"), hide_index=True)
+
+            logger.info(
+                f"Reconciled '{uploaded_file.name}' for {start_date} to {end_date}: "
+                f"{len(differences)} differences"
             )
 
+    except DataValidationError as e:
+        st.subheader("Trial Balance Errors")
+        st.error(f"{len(e.errors)} debit or credit cells are not amounts, nothing was reconciled.")
+        st.dataframe(e.errors, hide_index=True)
+        logger.error(e)
+
     except Exception as e:
-        st.error(f"Error reading CSV file: {e}")
-        logger.error(f"Failed to read uploaded file: {e}")
+        st.error(f"Error reconciling the trial balance: {e}")
+        logger.error(f"Failed to reconcile uploaded file: {e}")
 else:
     st.info("Please upload a CSV file to proceed.")
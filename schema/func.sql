@@ -12,43 +12,207 @@ BEGIN
 
     RETURN fiscal_year;
 END;
+$$ LANGUAGE plpgsql
+-- so a call on a constant can be used as an index condition
+IMMUTABLE;
+
+
+CREATE OR REPLACE FUNCTION finance.create_fiscal_year_partitions(from_date DATE, to_date DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    partition_year INTEGER;
+    partition_name TEXT;
+    partitions_created INTEGER := 0;
+BEGIN
+    -- must run before rows of a new fiscal year are inserted, otherwise they land in the default
+    -- partition and the new partition can't be created over them
+    IF from_date IS NULL OR to_date IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    FOR partition_year IN finance.get_fiscal_year(from_date)..finance.get_fiscal_year(to_date) LOOP
+        partition_name := 'manual_journal_entry_transaction_fy' || partition_year;
+
+        IF to_regclass('finance.' || partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE finance.%I PARTITION OF finance.manual_journal_entry_transaction FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                make_date(partition_year - 1, 10, 1),
+                make_date(partition_year, 10, 1)
+            );
+            partitions_created := partitions_created + 1;
+        END IF;
+    END LOOP;
+
+    RETURN partitions_created;
+END;
 $$ LANGUAGE plpgsql;
 
 
-CREATE OR REPLACE FUNCTION finance.trial_balance_journal_entry(start_date DATE, end_date DATE)
+CREATE OR REPLACE FUNCTION finance.refresh_period_balance(from_date DATE)
+RETURNS BIGINT AS $$
+DECLARE
+    from_period DATE := DATE_TRUNC('month', from_date)::DATE;
+    rows_refreshed BIGINT;
+BEGIN
+    -- rebuild every month on or after from_date, ingest replaces everything from its minimum accounting_date onward
+    DELETE FROM finance.period_balance p WHERE p.period_start >= from_period;
+
+    INSERT INTO finance.period_balance (
+        period_start,
+        fiscal_year,
+        fiscal_period,
+        account_no,
+        business_unit_id,
+        rad_data,
+        activity_balance,
+        transaction_count
+    )
+    SELECT
+        DATE_TRUNC('month', j.accounting_date)::DATE AS period_start,
+        finance.get_fiscal_year(MIN(j.accounting_date)) AS fiscal_year,
+        -- October is period 1 of the fiscal year
+        (EXTRACT(MONTH FROM MIN(j.accounting_date))::INTEGER + 2) % 12 + 1 AS fiscal_period,
+        j.account_no,
+        j.business_unit_id,
+        j.rad_data,
+        SUM(j.amount)::DECIMAL(20, 2),
+        COUNT(*)
+    FROM finance.manual_journal_entry_transaction j
+    WHERE j.accounting_date >= from_period
+    GROUP BY DATE_TRUNC('month', j.accounting_date), j.account_no, j.business_unit_id, j.rad_data;
+
+    GET DIAGNOSTICS rows_refreshed = ROW_COUNT;
+    RETURN rows_refreshed;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION finance.trial_balance_by_rad_windows(time_periods TEXT[], start_dates DATE[], end_dates DATE[])
 RETURNS TABLE (
+    "time_period" TEXT,
     "account_no" TEXT,
     "business_unit_id" TEXT,
+    "rad_data" JSONB,
     "opening_balance" DECIMAL(20, 2),
     "activity_balance" DECIMAL(20, 2),
     "closing_balance" DECIMAL(20, 2),
     "transaction_count" BIGINT
-) 
+)
 AS $$
 BEGIN
     RETURN QUERY
-    WITH aggregated AS (
+    WITH windows AS MATERIALIZED (
+        SELECT
+            w.time_period,
+            w.start_date,
+            w.end_date,
+            DATE_TRUNC('month', w.start_date)::DATE AS start_period,
+            DATE_TRUNC('month', w.end_date)::DATE AS end_period
+        FROM UNNEST(time_periods, start_dates, end_dates) AS w(time_period, start_date, end_date)
+    ),
+    boundary_periods AS (
+        SELECT w.start_period AS period_start FROM windows w
+        UNION
+        SELECT w.end_period FROM windows w
+    ),
+    boundaries AS (
+        SELECT ARRAY(SELECT bp.period_start FROM boundary_periods bp ORDER BY bp.period_start) AS periods
+    ),
+    segments AS (
+        -- one pass over the snapshot: months are summed per stretch between consecutive window
+        -- boundaries, and every boundary month is kept as its own stretch
+        SELECT
+            p.account_no,
+            p.business_unit_id,
+            p.rad_data,
+            MIN(p.period_start) AS first_period,
+            MAX(p.period_start) AS last_period,
+            SUM(p.activity_balance) AS activity_balance,
+            SUM(p.transaction_count) AS transaction_count
+        FROM finance.period_balance p
+        CROSS JOIN boundaries b
+        WHERE p.period_start < (SELECT MAX(w.end_period) FROM windows w)
+        GROUP BY
+            p.account_no,
+            p.business_unit_id,
+            p.rad_data,
+            WIDTH_BUCKET(p.period_start, b.periods),
+            p.period_start = ANY(b.periods)
+    ),
+    boundary_rows AS MATERIALIZED (
+        -- each start/end month is read from the journal once, however many windows share it
         SELECT
             j.account_no,
             j.business_unit_id,
-            SUM(CASE WHEN j.accounting_date < start_date THEN j.amount ELSE 0 END)::DECIMAL(20,2) AS opening_balance,
-            SUM(CASE WHEN j.accounting_date BETWEEN start_date AND end_date THEN j.amount ELSE 0 END)::DECIMAL(20,2) AS activity_balance,
-            SUM(j.amount)::DECIMAL(20,2) AS closing_balance,
-            COUNT(*) FILTER (WHERE j.accounting_date BETWEEN start_date AND end_date) AS transaction_count
-        FROM finance.manual_journal_entry_transaction j
-        WHERE j.accounting_date <= end_date
-        GROUP BY j.account_no, j.business_unit_id
+            j.rad_data,
+            j.amount,
+            j.accounting_date,
+            bp.period_start
+        FROM boundary_periods bp
+        JOIN finance.manual_journal_entry_transaction j
+            ON j.accounting_date >= bp.period_start
+            AND j.accounting_date < (bp.period_start + INTERVAL '1 month')::DATE
+    ),
+    balances AS (
+        -- whole months from the snapshot, except each window's start and end months
+        SELECT
+            w.time_period,
+            s.account_no,
+            s.business_unit_id,
+            s.rad_data,
+            SUM(s.activity_balance) FILTER (WHERE s.last_period < w.start_period) AS opening_balance,
+            SUM(s.activity_balance) FILTER (WHERE s.first_period > w.start_period) AS activity_balance,
+            SUM(s.transaction_count) FILTER (WHERE s.first_period > w.start_period) AS transaction_count
+        FROM segments s
+        JOIN windows w
+            ON s.last_period < w.end_period
+            AND s.first_period <> w.start_period
+        GROUP BY w.time_period, s.account_no, s.business_unit_id, s.rad_data
+
+        UNION ALL
+
+        -- the start and end months, they can be partial
+        SELECT
+            w.time_period,
+            r.account_no,
+            r.business_unit_id,
+            r.rad_data,
+            SUM(r.amount) FILTER (WHERE r.accounting_date < w.start_date) AS opening_balance,
+            SUM(r.amount) FILTER (WHERE r.accounting_date >= w.start_date) AS activity_balance,
+            COUNT(*) FILTER (WHERE r.accounting_date >= w.start_date) AS transaction_count
+        FROM boundary_rows r
+        JOIN windows w
+            ON r.accounting_date <= w.end_date
+            AND r.period_start IN (w.start_period, w.end_period)
+        GROUP BY w.time_period, r.account_no, r.business_unit_id, r.rad_data
+    ),
+    aggregated_data AS (
+        SELECT
+            b.time_period,
+            b.account_no,
+            b.business_unit_id,
+            b.rad_data,
+            COALESCE(SUM(b.opening_balance), 0) AS opening_balance,
+            COALESCE(SUM(b.activity_balance), 0) AS activity_balance,
+            COALESCE(SUM(b.transaction_count), 0) AS transaction_count
+        FROM balances b
+        GROUP BY b.time_period, b.account_no, b.business_unit_id, b.rad_data
     )
     SELECT 
-        a.account_no,
-        a.business_unit_id,
-        a.opening_balance,
-        a.activity_balance,
-        a.closing_balance,
-        a.transaction_count
-    FROM aggregated a 
-    ORDER BY account_no, business_unit_id;
-END $$ LANGUAGE plpgsql;
+        ad.time_period,
+        ad.account_no,
+        ad.business_unit_id,
+        ad.rad_data,
+        ad.opening_balance::DECIMAL(20, 2),
+        ad.activity_balance::DECIMAL(20, 2),
+        (ad.opening_balance + ad.activity_balance)::DECIMAL(20, 2),
+        ad.transaction_count::BIGINT
+    FROM aggregated_data ad;
+END $$ LANGUAGE plpgsql
+-- the aggregates are bounded by the number of account/business unit/RAD keys, keep them in memory
+SET work_mem = '64MB';
+
 
 CREATE OR REPLACE FUNCTION finance.trial_balance_by_rad_journal_entry(start_date DATE, end_date DATE)
 RETURNS TABLE (
@@ -63,31 +227,147 @@ RETURNS TABLE (
 AS $$
 BEGIN
     RETURN QUERY
-    WITH aggregated_data AS (
-        SELECT
-            j.account_no,
-            j.business_unit_id,
-            j.rad_data,
-            SUM(CASE WHEN j.accounting_date < start_date THEN j.amount ELSE 0 END) AS opening_balance,
-            SUM(CASE WHEN j.accounting_date BETWEEN start_date AND end_date THEN j.amount ELSE 0 END) AS activity_balance,
-            SUM(CASE WHEN j.accounting_date <= end_date THEN j.amount ELSE 0 END) AS closing_balance,
-            COUNT(*) FILTER (WHERE j.accounting_date BETWEEN start_date AND end_date) AS transaction_count
-        FROM finance.manual_journal_entry_transaction j
-        WHERE j.accounting_date <= end_date
-        GROUP BY j.account_no, j.business_unit_id, j.rad_data
-    )
     SELECT 
-        ad.account_no,
-        ad.business_unit_id,
-        ad.rad_data,
-        COALESCE(ad.opening_balance, 0)::DECIMAL(20, 2),
-        COALESCE(ad.activity_balance, 0)::DECIMAL(20, 2),
-        COALESCE(ad.closing_balance, 0)::DECIMAL(20, 2),
-        COALESCE(ad.transaction_count, 0)::BIGINT
-    FROM aggregated_data ad
-    ORDER BY ad.account_no, ad.business_unit_id;
+        t.account_no,
+        t.business_unit_id,
+        t.rad_data,
+        t.opening_balance,
+        t.activity_balance,
+        t.closing_balance,
+        t.transaction_count
+    FROM finance.trial_balance_by_rad_windows(
+        ARRAY['Window'], ARRAY[start_date], ARRAY[end_date]
+    ) AS t
+    ORDER BY t.account_no, t.business_unit_id;
+END $$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION finance.trial_balance_journal_entry(start_date DATE, end_date DATE)
+RETURNS TABLE (
+    "account_no" TEXT,
+    "business_unit_id" TEXT,
+    "opening_balance" DECIMAL(20, 2),
+    "activity_balance" DECIMAL(20, 2),
+    "closing_balance" DECIMAL(20, 2),
+    "transaction_count" BIGINT
+) 
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT 
+        r.account_no,
+        r.business_unit_id,
+        SUM(r.opening_balance)::DECIMAL(20, 2),
+        SUM(r.activity_balance)::DECIMAL(20, 2),
+        SUM(r.closing_balance)::DECIMAL(20, 2),
+        SUM(r.transaction_count)::BIGINT
+    FROM finance.trial_balance_by_rad_journal_entry(start_date, end_date) r
+    GROUP BY r.account_no, r.business_unit_id
+    ORDER BY r.account_no, r.business_unit_id;
 END $$ LANGUAGE plpgsql;
 
+CREATE OR REPLACE FUNCTION finance.balance_series(
+    start_date DATE,
+    end_date DATE,
+    account_nos TEXT[] DEFAULT NULL,
+    business_unit_ids TEXT[] DEFAULT NULL
+)
+RETURNS TABLE (
+    "period_start" DATE,
+    "fiscal_year" INTEGER,
+    "fiscal_period" INTEGER,
+    "account_no" TEXT,
+    "business_unit_id" TEXT,
+    "opening_balance" DECIMAL(20, 2),
+    "activity_balance" DECIMAL(20, 2),
+    "closing_balance" DECIMAL(20, 2),
+    "transaction_count" BIGINT
+)
+AS $$
+DECLARE
+    -- whole months only, the series is read from the monthly snapshot
+    start_period DATE := DATE_TRUNC('month', start_date)::DATE;
+    end_period DATE := DATE_TRUNC('month', end_date)::DATE;
+BEGIN
+    RETURN QUERY
+    WITH buckets AS MATERIALIZED (
+        -- one pass over the snapshot: every month before the range folds into a NULL bucket
+        -- that opens the series, the months in range keep their own bucket
+        SELECT
+            p.account_no,
+            p.business_unit_id,
+            NULLIF(GREATEST(p.period_start, start_period - 1), start_period - 1) AS period_start,
+            SUM(p.activity_balance) AS activity_balance,
+            SUM(p.transaction_count) AS transaction_count
+        FROM finance.period_balance p
+        WHERE p.period_start <= end_period
+            AND (account_nos IS NULL OR p.account_no = ANY(account_nos))
+            AND (business_unit_ids IS NULL OR p.business_unit_id = ANY(business_unit_ids))
+        GROUP BY 1, 2, 3
+    ),
+    months AS (
+        SELECT
+            m::DATE AS period_start,
+            finance.get_fiscal_year(m::DATE) AS fiscal_year,
+            -- October is period 1 of the fiscal year
+            (EXTRACT(MONTH FROM m)::INTEGER + 2) % 12 + 1 AS fiscal_period
+        FROM GENERATE_SERIES(start_period, end_period, INTERVAL '1 month') AS m
+    ),
+    grid AS (
+        -- every key gets a zero row for every month, so a month without activity still carries its balance
+        SELECT k.account_no, k.business_unit_id, m.period_start, 0 AS opening_balance, 0 AS activity_balance, 0 AS transaction_count
+        FROM (SELECT DISTINCT b.account_no, b.business_unit_id FROM buckets b) k
+        CROSS JOIN months m
+
+        UNION ALL
+
+        SELECT
+            b.account_no,
+            b.business_unit_id,
+            COALESCE(b.period_start, start_period),
+            CASE WHEN b.period_start IS NULL THEN b.activity_balance ELSE 0 END,
+            CASE WHEN b.period_start IS NULL THEN 0 ELSE b.activity_balance END,
+            CASE WHEN b.period_start IS NULL THEN 0 ELSE b.transaction_count END
+        FROM buckets b
+    ),
+    activity AS (
+        SELECT
+            g.account_no,
+            g.business_unit_id,
+            g.period_start,
+            SUM(g.opening_balance) AS opening_balance,
+            SUM(g.activity_balance) AS activity_balance,
+            SUM(g.transaction_count) AS transaction_count
+        FROM grid g
+        GROUP BY g.account_no, g.business_unit_id, g.period_start
+    ),
+    running AS (
+        SELECT
+            a.*,
+            SUM(a.opening_balance + a.activity_balance) OVER (
+                PARTITION BY a.account_no, a.business_unit_id
+                ORDER BY a.period_start
+                ROWS UNBOUNDED PRECEDING
+            ) AS closing_balance
+        FROM activity a
+    )
+    SELECT
+        r.period_start,
+        m.fiscal_year,
+        m.fiscal_period,
+        r.account_no,
+        r.business_unit_id,
+        (r.closing_balance - r.activity_balance)::DECIMAL(20, 2),
+        r.activity_balance::DECIMAL(20, 2),
+        r.closing_balance::DECIMAL(20, 2),
+        r.transaction_count::BIGINT
+    FROM running r
+    JOIN months m ON m.period_start = r.period_start
+    ORDER BY r.account_no, r.business_unit_id, r.period_start;
+END $$ LANGUAGE plpgsql
+SET work_mem = '64MB';
+
+
 CREATE OR REPLACE FUNCTION finance.trial_balance_summary(anchor_date DATE)
 RETURNS TABLE (
     account_no TEXT,
@@ -121,38 +401,28 @@ BEGIN
         master.time_period::TEXT,
         ''::TEXT AS consumption
     FROM (
-        -- Current Month
+        -- Current Month, Current YTD and Prior YTD in one pass
         SELECT 
             je.account_no::TEXT, 
             je.business_unit_id::TEXT,
             je.rad_data::JSONB,
-            je.rad_data::TEXT as rad_data_str, 
             je.opening_balance::NUMERIC, 
             je.activity_balance::NUMERIC, 
             je.closing_balance::NUMERIC, 
             je.transaction_count::BIGINT, 
-            'CurrentMonth' AS time_period
-        FROM finance.trial_balance_by_rad_journal_entry(
-            start_date := DATE_TRUNC('month', anchor_date)::DATE,
-            end_date := anchor_date
-        ) AS je
-
-        UNION ALL
-
-        -- Current YTD
-        SELECT 
-            je.account_no::TEXT, 
-            je.business_unit_id::TEXT,
-            je.rad_data::JSONB,
-            je.rad_data::TEXT as rad_data_str, 
-            je.opening_balance::NUMERIC, 
-            je.activity_balance::NUMERIC, 
-            je.closing_balance::NUMERIC, 
-            je.transaction_count::BIGINT, 
-            'CurrentYTD' AS time_period
-        FROM finance.trial_balance_by_rad_journal_entry(
-            start_date := (((finance.get_fiscal_year(anchor_date) - 1)::TEXT || '-10-01')::DATE)::DATE,
-            end_date := anchor_date
+            je.time_period::TEXT
+        FROM finance.trial_balance_by_rad_windows(
+            time_periods := ARRAY['CurrentMonth', 'CurrentYTD', 'PriorYTD'],
+            start_dates := ARRAY[
+                DATE_TRUNC('month', anchor_date)::DATE,
+                ((finance.get_fiscal_year(anchor_date) - 1)::TEXT || '-10-01')::DATE,
+                (((finance.get_fiscal_year(anchor_date) - 1)::TEXT || '-10-01')::DATE - INTERVAL '1 year')::DATE
+            ],
+            end_dates := ARRAY[
+                anchor_date,
+                anchor_date,
+                (anchor_date - INTERVAL '1 year')::DATE
+            ]
         ) AS je
 
         UNION ALL
@@ -162,7 +432,6 @@ BEGIN
             bgt.account_no::TEXT, 
             bgt.business_unit_id::TEXT,
             bgt.rad_data::JSONB,
-            bgt.rad_data::TEXT as rad_data_str, 
             0::NUMERIC as opening_balance, -- there are no balances for budget data
             sum(amount)::NUMERIC as activity_balance, 
             0::NUMERIC as closing_balance,  -- there are no balances for budget data
@@ -176,26 +445,162 @@ BEGIN
             bgt.business_unit_id::TEXT,
             bgt.rad_data::JSONB
 
+    ) AS master
+    JOIN finance.account a ON master.account_no = a.account_no
+    JOIN finance.business_unit b ON master.business_unit_id = b.business_unit_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION finance.grouping_children(node_content JSON, node_path INTEGER[], node_depth INTEGER, node_ancestors TEXT[])
+RETURNS TABLE (
+    "path" INTEGER[],
+    "label" TEXT,
+    "content" JSON,
+    "depth" INTEGER,
+    "kind" TEXT,
+    "ancestors" TEXT[]
+)
+AS $$
+    -- every key of an object is a group
+    SELECT node_path || o.position::INTEGER, o.key, o.value, node_depth, 'group', node_ancestors
+    FROM json_each(CASE WHEN json_typeof(node_content) = 'object' THEN node_content ELSE '{}' END)
+        WITH ORDINALITY AS o(key, value, position)
+
+    UNION ALL
+
+    -- arrays only hold their items, they are not a level of the hierarchy
+    SELECT node_path || a.position::INTEGER, NULL, a.value, node_depth, 'list', node_ancestors
+    FROM json_array_elements(CASE WHEN json_typeof(node_content) = 'array' THEN node_content ELSE '[]' END)
+        WITH ORDINALITY AS a(value, position)
+
+    UNION ALL
+
+    -- anything else is a leaf
+    SELECT node_path || 1, node_content #>> '{}', NULL, node_depth, 'leaf', node_ancestors
+    WHERE json_typeof(node_content) NOT IN ('object', 'array', 'null')
+$$ LANGUAGE sql IMMUTABLE;
+
+
+CREATE OR REPLACE FUNCTION finance.compile_grouping(target_grouping_id INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    leaves_compiled INTEGER;
+BEGIN
+    DELETE FROM finance.grouping_closure c WHERE c.grouping_id = target_grouping_id;
+
+    INSERT INTO finance.grouping_closure (
+        grouping_id,
+        leaf,
+        leaf_node_id,
+        node_id,
+        parent_node_id,
+        node,
+        depth,
+        is_leaf
+    )
+    WITH RECURSIVE nodes AS (
+        SELECT ch.*
+        FROM finance.grouping g
+        CROSS JOIN LATERAL finance.grouping_children(g.grouping, '{}', 0, '{}') ch
+        WHERE g.id = target_grouping_id
+
         UNION ALL
 
-        -- Prior YTD
-        SELECT 
-            je.account_no::TEXT, 
-            je.business_unit_id::TEXT,
-            je.rad_data::JSONB, 
-            je.rad_data::TEXT as rad_data_str, 
-            je.opening_balance::NUMERIC, 
-            je.activity_balance::NUMERIC, 
-            je.closing_balance::NUMERIC, 
-            je.transaction_count::BIGINT, 
-            'PriorYTD' AS time_period
-        FROM finance.trial_balance_by_rad_journal_entry(
-            start_date := (((finance.get_fiscal_year(anchor_date) - 1)::TEXT || '-10-01')::DATE - INTERVAL '1 year')::DATE,
-            end_date := (anchor_date - INTERVAL '1 year')::DATE
-        ) AS je
+        -- a group's children sit one level below it, a list's items on its own level
+        SELECT ch.*
+        FROM nodes n
+        CROSS JOIN LATERAL finance.grouping_children(
+            n.content,
+            n.path,
+            n.depth + CASE WHEN n.kind = 'group' THEN 1 ELSE 0 END,
+            CASE WHEN n.kind = 'group' THEN n.ancestors || n.path::TEXT ELSE n.ancestors END
+        ) ch
+        WHERE n.kind <> 'leaf'
+    ),
+    numbered AS MATERIALIZED (
+        SELECT
+            n.path::TEXT AS path_key,
+            n.label,
+            n.depth,
+            n.kind,
+            n.ancestors,
+            ROW_NUMBER() OVER (ORDER BY n.path)::INTEGER AS node_id
+        FROM nodes n
+        WHERE n.kind <> 'list'
+    ),
+    hierarchy AS (
+        SELECT
+            n.*,
+            p.node_id AS parent_node_id
+        FROM numbered n
+        LEFT JOIN numbered p ON p.path_key = n.ancestors[CARDINALITY(n.ancestors)]
+    )
+    SELECT
+        target_grouping_id,
+        l.label,
+        l.node_id,
+        h.node_id,
+        h.parent_node_id,
+        h.label,
+        h.depth,
+        h.kind = 'leaf'
+    FROM hierarchy l
+    CROSS JOIN LATERAL UNNEST(l.ancestors || l.path_key) AS a(path_key)
+    JOIN hierarchy h ON h.path_key = a.path_key
+    WHERE l.kind = 'leaf';
 
-    ) AS master
-    JOIN finance.vw_account a ON master.account_no = a.account_no
-    JOIN finance.vw_business_unit b ON master.business_unit_id = b.business_unit_id;
+    SELECT COUNT(DISTINCT c.leaf_node_id) INTO leaves_compiled
+    FROM finance.grouping_closure c
+    WHERE c.grouping_id = target_grouping_id;
+
+    UPDATE finance.grouping g SET leaf_count = leaves_compiled WHERE g.id = target_grouping_id;
+
+    RETURN leaves_compiled;
 END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION finance.grouping_rollup(target_grouping_id INTEGER, start_date DATE, end_date DATE)
+RETURNS TABLE (
+    "node_id" INTEGER,
+    "parent_node_id" INTEGER,
+    "node" TEXT,
+    "depth" INTEGER,
+    "is_leaf" BOOLEAN,
+    "opening_balance" DECIMAL(20, 2),
+    "activity_balance" DECIMAL(20, 2),
+    "closing_balance" DECIMAL(20, 2),
+    "transaction_count" BIGINT
+)
+AS $$
+BEGIN
+    -- every node of the grouping in document order, including the ones without any balance
+    RETURN QUERY
+    WITH leaf_balances AS MATERIALIZED (
+        SELECT
+            CASE WHEN g.dimension = 'business_unit' THEN t.business_unit_id ELSE t.account_no END AS leaf,
+            SUM(t.opening_balance) AS opening_balance,
+            SUM(t.activity_balance) AS activity_balance,
+            SUM(t.closing_balance) AS closing_balance,
+            SUM(t.transaction_count) AS transaction_count
+        FROM finance.grouping g
+        CROSS JOIN finance.trial_balance_journal_entry(start_date, end_date) t
+        WHERE g.id = target_grouping_id
+        GROUP BY 1
+    )
+    SELECT
+        c.node_id,
+        c.parent_node_id,
+        c.node,
+        c.depth,
+        c.is_leaf,
+        COALESCE(SUM(b.opening_balance), 0)::DECIMAL(20, 2),
+        COALESCE(SUM(b.activity_balance), 0)::DECIMAL(20, 2),
+        COALESCE(SUM(b.closing_balance), 0)::DECIMAL(20, 2),
+        COALESCE(SUM(b.transaction_count), 0)::BIGINT
+    FROM finance.grouping_closure c
+    LEFT JOIN leaf_balances b ON b.leaf = c.leaf
+    WHERE c.grouping_id = target_grouping_id
+    GROUP BY c.node_id, c.parent_node_id, c.node, c.depth, c.is_leaf
+    ORDER BY c.node_id;
+END $$ LANGUAGE plpgsql;
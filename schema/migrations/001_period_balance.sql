@@ -0,0 +1,20 @@
+-- Adds the monthly balance snapshot to an existing database.
+-- Run func.sql first so finance.refresh_period_balance exists.
+
+CREATE TABLE IF NOT EXISTS FINANCE.PERIOD_BALANCE (
+    PERIOD_START DATE NOT NULL,
+    FISCAL_YEAR INTEGER NOT NULL,
+    FISCAL_PERIOD INTEGER NOT NULL,
+    ACCOUNT_NO TEXT,
+    BUSINESS_UNIT_ID TEXT,
+    RAD_DATA JSONB,
+    ACTIVITY_BALANCE NUMERIC(20, 2) NOT NULL,
+    TRANSACTION_COUNT BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS PERIOD_BALANCE_PERIOD_START_IDX ON FINANCE.PERIOD_BALANCE (PERIOD_START);
+
+CREATE INDEX IF NOT EXISTS MANUAL_JOURNAL_ENTRY_TRANSACTION_ACCOUNTING_DATE_IDX ON FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (ACCOUNTING_DATE);
+
+-- backfill every month of history
+SELECT FINANCE.REFRESH_PERIOD_BALANCE('0001-01-01');
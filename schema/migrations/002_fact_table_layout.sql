@@ -0,0 +1,124 @@
+-- Partitions the journal by fiscal year and adds the fact table indexes on an existing database.
+-- Run func.sql first so finance.create_fiscal_year_partitions exists, then
+-- psql -v ON_ERROR_STOP=1 -f schema/migrations/002_fact_table_layout.sql
+-- The journal is copied into the new layout inside one transaction, so it is locked for the
+-- duration and needs about its own size in free disk space.
+
+BEGIN;
+
+SET LOCAL search_path TO finance, public;
+
+-- the views are bound to the old table, recreated as they were below
+DROP VIEW IF EXISTS FINANCE.VW_ACCOUNT;
+DROP VIEW IF EXISTS FINANCE.VW_BUSINESS_UNIT;
+
+ALTER TABLE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION RENAME TO MANUAL_JOURNAL_ENTRY_TRANSACTION_UNPARTITIONED;
+DROP INDEX IF EXISTS FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION_ACCOUNTING_DATE_IDX;
+
+CREATE TABLE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (
+    -- keeps the existing sequence so ids carry on where they were
+    ID INTEGER NOT NULL DEFAULT NEXTVAL('FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION_ID_SEQ'),
+    --TRANSACTION
+    COMPANY_ID TEXT,
+    ENTRY_ID TEXT,
+    BUSINESS_UNIT_ID TEXT,
+    ACCOUNT_NO TEXT,
+    AMOUNT NUMERIC(20, 2),
+    ACCOUNTING_DATE DATE,
+    DATA_TYPE TEXT,
+    --COMMENTS
+    REMARKS TEXT,
+    COMMENTS TEXT,
+    FOLLOW_UP_STATUS TEXT,
+    --TYPE
+    ENTRY_TYPE TEXT,
+    ENTRY_STATUS TEXT,
+    SOURCE_SYSTEM TEXT,
+    REVERSED TEXT,
+    APPROVAL TEXT,
+    REVERSING_DATE DATE,
+    --AUDIT
+    DATE_CREATED DATE,
+    USER_CREATED TEXT,
+    DATE_CLOSED DATE,
+    USER_CLOSED TEXT,
+    DATE_POSTED DATE,
+    USER_POSTED TEXT,
+    --TRANSACTION
+    COMPANY TEXT,
+    BUSINESS_UNIT TEXT,
+    ACCOUNT TEXT,
+    ACCOUNT_TYPE TEXT,
+    RAD_DATA JSONB,
+    PERIOD_ID TEXT,
+    --COMPUTED
+    CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FISCAL_YEAR INTEGER GENERATED ALWAYS AS (
+        CASE
+            WHEN EXTRACT(MONTH FROM ACCOUNTING_DATE) >= 10 THEN EXTRACT(YEAR FROM ACCOUNTING_DATE) + 1
+            ELSE EXTRACT(YEAR FROM ACCOUNTING_DATE)
+        END
+    ) STORED
+) PARTITION BY RANGE (ACCOUNTING_DATE);
+
+CREATE TABLE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION_DEFAULT PARTITION OF FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION DEFAULT;
+
+ALTER SEQUENCE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION_ID_SEQ OWNED BY FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION.ID;
+
+SELECT FINANCE.CREATE_FISCAL_YEAR_PARTITIONS(MIN(ACCOUNTING_DATE), MAX(ACCOUNTING_DATE))
+FROM FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION_UNPARTITIONED;
+
+-- in date order, so every partition is laid out the way the trial balance reads it
+INSERT INTO FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (
+    ID, COMPANY_ID, ENTRY_ID, BUSINESS_UNIT_ID, ACCOUNT_NO, AMOUNT, ACCOUNTING_DATE, DATA_TYPE,
+    REMARKS, COMMENTS, FOLLOW_UP_STATUS, ENTRY_TYPE, ENTRY_STATUS, SOURCE_SYSTEM, REVERSED, APPROVAL,
+    REVERSING_DATE, DATE_CREATED, USER_CREATED, DATE_CLOSED, USER_CLOSED, DATE_POSTED, USER_POSTED,
+    COMPANY, BUSINESS_UNIT, ACCOUNT, ACCOUNT_TYPE, RAD_DATA, PERIOD_ID, CREATED_AT
+)
+SELECT
+    ID, COMPANY_ID, ENTRY_ID, BUSINESS_UNIT_ID, ACCOUNT_NO, AMOUNT, ACCOUNTING_DATE, DATA_TYPE,
+    REMARKS, COMMENTS, FOLLOW_UP_STATUS, ENTRY_TYPE, ENTRY_STATUS, SOURCE_SYSTEM, REVERSED, APPROVAL,
+    REVERSING_DATE, DATE_CREATED, USER_CREATED, DATE_CLOSED, USER_CLOSED, DATE_POSTED, USER_POSTED,
+    COMPANY, BUSINESS_UNIT, ACCOUNT, ACCOUNT_TYPE, RAD_DATA, PERIOD_ID, CREATED_AT
+FROM FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION_UNPARTITIONED
+ORDER BY ACCOUNTING_DATE, ID;
+
+DROP TABLE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION_UNPARTITIONED;
+
+CREATE INDEX MANUAL_JOURNAL_ENTRY_TRANSACTION_ACCOUNTING_DATE_IDX ON FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (ACCOUNTING_DATE);
+CREATE INDEX MANUAL_JOURNAL_ENTRY_TRANSACTION_ID_IDX ON FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (ID);
+CREATE INDEX MANUAL_JOURNAL_ENTRY_TRANSACTION_ACCOUNT_NO_IDX ON FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (ACCOUNT_NO, ACCOUNTING_DATE);
+
+CREATE INDEX IF NOT EXISTS MANUAL_BUDGET_ACCOUNTING_DATE_IDX ON FINANCE.MANUAL_BUDGET (ACCOUNTING_DATE);
+CREATE INDEX IF NOT EXISTS MANUAL_BUDGET_FISCAL_YEAR_IDX ON FINANCE.MANUAL_BUDGET (FISCAL_YEAR);
+
+CREATE VIEW FINANCE.VW_ACCOUNT AS
+SELECT 
+    account_no, 
+    account, 
+    MAX(account_type) AS account_type
+FROM (
+    SELECT DISTINCT account_no, account, '' AS account_type 
+    FROM manual_budget
+
+    UNION ALL
+
+    SELECT DISTINCT account_no, account, account_type 
+    FROM manual_journal_entry_transaction
+) temp
+GROUP BY account_no, account
+ORDER BY account_no, account;
+
+CREATE VIEW FINANCE.VW_BUSINESS_UNIT AS
+SELECT DISTINCT business_unit_id, business_unit
+FROM (
+    SELECT DISTINCT business_unit_id, business_unit FROM manual_budget
+    UNION ALL
+    SELECT DISTINCT business_unit_id, business_unit FROM manual_journal_entry_transaction
+) temp
+ORDER BY business_unit_id, business_unit;
+
+COMMIT;
+
+ANALYZE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION;
+ANALYZE FINANCE.MANUAL_BUDGET;
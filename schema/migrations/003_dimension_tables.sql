@@ -0,0 +1,58 @@
+-- Replaces the DISTINCT views over the fact tables with the account and business unit dimension
+-- tables, backfilled once from the existing rows. Run after 002_fact_table_layout.sql, then func.sql.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS FINANCE.ACCOUNT (
+    ACCOUNT_NO TEXT NOT NULL,
+    PRIMARY KEY (ACCOUNT_NO),
+    ACCOUNT TEXT,
+    ACCOUNT_TYPE TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS FINANCE.BUSINESS_UNIT (
+    BUSINESS_UNIT_ID TEXT NOT NULL,
+    PRIMARY KEY (BUSINESS_UNIT_ID),
+    BUSINESS_UNIT TEXT
+);
+
+-- one label per key, the views returned a row per distinct label
+INSERT INTO FINANCE.ACCOUNT (ACCOUNT_NO, ACCOUNT, ACCOUNT_TYPE)
+SELECT ACCOUNT_NO, MAX(ACCOUNT), COALESCE(MAX(ACCOUNT_TYPE), '')
+FROM (
+    SELECT ACCOUNT_NO, ACCOUNT, NULL AS ACCOUNT_TYPE FROM FINANCE.MANUAL_BUDGET
+    UNION ALL
+    SELECT ACCOUNT_NO, ACCOUNT, ACCOUNT_TYPE FROM FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION
+) FACTS
+WHERE ACCOUNT_NO IS NOT NULL
+GROUP BY ACCOUNT_NO
+ON CONFLICT (ACCOUNT_NO) DO NOTHING;
+
+INSERT INTO FINANCE.BUSINESS_UNIT (BUSINESS_UNIT_ID, BUSINESS_UNIT)
+SELECT BUSINESS_UNIT_ID, MAX(BUSINESS_UNIT)
+FROM (
+    SELECT BUSINESS_UNIT_ID, BUSINESS_UNIT FROM FINANCE.MANUAL_BUDGET
+    UNION ALL
+    SELECT BUSINESS_UNIT_ID, BUSINESS_UNIT FROM FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION
+) FACTS
+WHERE BUSINESS_UNIT_ID IS NOT NULL
+GROUP BY BUSINESS_UNIT_ID
+ON CONFLICT (BUSINESS_UNIT_ID) DO NOTHING;
+
+DROP VIEW IF EXISTS FINANCE.VW_ACCOUNT;
+DROP VIEW IF EXISTS FINANCE.VW_BUSINESS_UNIT;
+
+CREATE VIEW FINANCE.VW_ACCOUNT AS
+SELECT 
+    account_no, 
+    account, 
+    account_type
+FROM finance.account
+ORDER BY account_no, account;
+
+CREATE VIEW FINANCE.VW_BUSINESS_UNIT AS
+SELECT business_unit_id, business_unit
+FROM finance.business_unit
+ORDER BY business_unit_id, business_unit;
+
+COMMIT;
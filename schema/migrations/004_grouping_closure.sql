@@ -0,0 +1,32 @@
+-- Adds the compiled grouping hierarchy and compiles every existing grouping.
+-- Run func.sql first so finance.compile_grouping exists.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS FINANCE.GROUPING (
+    ID SERIAL NOT NULL,
+    PRIMARY KEY (ID),
+    NAME TEXT NOT NULL,
+    DIMENSION TEXT NOT NULL,
+    GROUPING JSON NOT NULL,
+    CREATED_BY TEXT,
+    IS_ACTIVE BOOLEAN NOT NULL DEFAULT TRUE,
+    CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS FINANCE.GROUPING_CLOSURE (
+    GROUPING_ID INTEGER NOT NULL REFERENCES FINANCE.GROUPING (ID) ON DELETE CASCADE,
+    LEAF TEXT NOT NULL,
+    LEAF_NODE_ID INTEGER NOT NULL,
+    NODE_ID INTEGER NOT NULL,
+    PARENT_NODE_ID INTEGER,
+    NODE TEXT NOT NULL,
+    DEPTH INTEGER NOT NULL,
+    IS_LEAF BOOLEAN NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS GROUPING_CLOSURE_GROUPING_ID_LEAF_IDX ON FINANCE.GROUPING_CLOSURE (GROUPING_ID, LEAF);
+
+SELECT FINANCE.COMPILE_GROUPING(ID) FROM FINANCE.GROUPING;
+
+COMMIT;
@@ -0,0 +1,11 @@
+-- Adds the data version watermarks of the query cache.
+
+CREATE TABLE IF NOT EXISTS FINANCE.DATA_VERSION (
+    SCOPE TEXT NOT NULL,
+    PRIMARY KEY (SCOPE),
+    VERSION BIGINT NOT NULL DEFAULT 0,
+    UPDATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO FINANCE.DATA_VERSION (SCOPE) VALUES ('ledger'), ('grouping')
+ON CONFLICT (SCOPE) DO NOTHING;
@@ -0,0 +1,10 @@
+-- Stores the leaf count of each grouping for the console grid.
+-- Run func.sql first so finance.compile_grouping sets it.
+
+BEGIN;
+
+ALTER TABLE FINANCE.GROUPING ADD COLUMN IF NOT EXISTS LEAF_COUNT INTEGER;
+
+SELECT FINANCE.COMPILE_GROUPING(ID) FROM FINANCE.GROUPING WHERE LEAF_COUNT IS NULL;
+
+COMMIT;
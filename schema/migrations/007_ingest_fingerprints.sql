@@ -0,0 +1,26 @@
+-- Adds the row fingerprints and the file ledger of idempotent ingest.
+-- Existing rows keep a NULL fingerprint, the first upload covering them
+-- replaces them once and later uploads only apply their delta.
+
+BEGIN;
+
+ALTER TABLE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION ADD COLUMN IF NOT EXISTS ROW_HASH TEXT;
+ALTER TABLE FINANCE.MANUAL_BUDGET ADD COLUMN IF NOT EXISTS ROW_HASH TEXT;
+
+CREATE TABLE IF NOT EXISTS FINANCE.INGEST_FILE (
+    ID SERIAL NOT NULL,
+    PRIMARY KEY (ID),
+    TABLE_NAME TEXT NOT NULL,
+    FILE_HASH TEXT NOT NULL,
+    FILE_NAME TEXT,
+    ROW_COUNT BIGINT NOT NULL,
+    ROWS_INSERTED BIGINT NOT NULL,
+    ROWS_DELETED BIGINT NOT NULL,
+    MIN_ACCOUNTING_DATE DATE,
+    DATA_VERSION BIGINT NOT NULL,
+    INGESTED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS INGEST_FILE_TABLE_NAME_IDX ON FINANCE.INGEST_FILE (TABLE_NAME, ID);
+
+COMMIT;
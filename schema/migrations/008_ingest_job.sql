@@ -0,0 +1,17 @@
+-- Adds the state of the background ingestion jobs.
+
+CREATE TABLE IF NOT EXISTS FINANCE.INGEST_JOB (
+    ID SERIAL NOT NULL,
+    PRIMARY KEY (ID),
+    TABLE_NAME TEXT NOT NULL,
+    FILE_NAME TEXT,
+    STATUS TEXT NOT NULL,
+    ROWS_TOTAL BIGINT,
+    ROWS_LOADED BIGINT NOT NULL DEFAULT 0,
+    CANCEL_REQUESTED BOOLEAN NOT NULL DEFAULT FALSE,
+    MESSAGE TEXT,
+    CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    STARTED_AT TIMESTAMP,
+    FINISHED_AT TIMESTAMP,
+    UPDATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,14 @@
+-- Indexes the fact table keys prune_dimensions probes after an ingest deletes rows,
+-- and leaves the account type of accounts only seen in the budget NULL rather than ''.
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS MANUAL_JOURNAL_ENTRY_TRANSACTION_BUSINESS_UNIT_ID_IDX ON FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (BUSINESS_UNIT_ID);
+CREATE INDEX IF NOT EXISTS MANUAL_BUDGET_ACCOUNT_NO_IDX ON FINANCE.MANUAL_BUDGET (ACCOUNT_NO);
+CREATE INDEX IF NOT EXISTS MANUAL_BUDGET_BUSINESS_UNIT_ID_IDX ON FINANCE.MANUAL_BUDGET (BUSINESS_UNIT_ID);
+
+ALTER TABLE FINANCE.ACCOUNT ALTER COLUMN ACCOUNT_TYPE DROP NOT NULL;
+ALTER TABLE FINANCE.ACCOUNT ALTER COLUMN ACCOUNT_TYPE DROP DEFAULT;
+UPDATE FINANCE.ACCOUNT SET ACCOUNT_TYPE = NULL WHERE ACCOUNT_TYPE = '';
+
+COMMIT;
@@ -4,9 +4,11 @@ CREATE SCHEMA FINANCE;
 
 DROP TABLE IF EXISTS FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION;
 
+-- range partitioned by fiscal year (October 1st to October 1st) on ACCOUNTING_DATE, a generated
+-- column can't be a partition key. finance.create_fiscal_year_partitions adds the partitions as
+-- uploads reach new years. A primary key would have to include ACCOUNTING_DATE, so ID is only indexed.
 CREATE TABLE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (
     ID SERIAL NOT NULL,
-    PRIMARY KEY (ID),
     --TRANSACTION
     COMPANY_ID TEXT,
     ENTRY_ID TEXT,
@@ -42,13 +44,18 @@ CREATE TABLE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (
     PERIOD_ID TEXT,
     --COMPUTED
     CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- fingerprint of the uploaded row, see apply_staging_delta
+    ROW_HASH TEXT,
     FISCAL_YEAR INTEGER GENERATED ALWAYS AS (
         CASE
             WHEN EXTRACT(MONTH FROM ACCOUNTING_DATE) >= 10 THEN EXTRACT(YEAR FROM ACCOUNTING_DATE) + 1
             ELSE EXTRACT(YEAR FROM ACCOUNTING_DATE)
         END
     ) STORED
-);
+) PARTITION BY RANGE (ACCOUNTING_DATE);
+
+-- rows without an accounting date
+CREATE TABLE FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION_DEFAULT PARTITION OF FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION DEFAULT;
 
 DROP TABLE IF EXISTS FINANCE.MANUAL_BUDGET;
 
@@ -58,18 +65,158 @@ CREATE TABLE FINANCE.MANUAL_BUDGET (
     --TRANSACTION
     BUDGET_ID TEXT,
     CHART_ID TEXT,
+    CHART TEXT,
     BUSINESS_UNIT_ID TEXT,
+    BUSINESS_UNIT TEXT,
     ACCOUNT_NO TEXT,
+    ACCOUNT TEXT,
     RAD_DATA JSONB,
     AMOUNT NUMERIC(20, 2),
     ACCOUNTING_DATE DATE,
     DATA_TYPE TEXT,
     --COMPUTED
     CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- fingerprint of the uploaded row, see apply_staging_delta
+    ROW_HASH TEXT,
     FISCAL_YEAR INTEGER GENERATED ALWAYS AS (
         CASE
             WHEN EXTRACT(MONTH FROM ACCOUNTING_DATE) >= 10 THEN EXTRACT(YEAR FROM ACCOUNTING_DATE) + 1
             ELSE EXTRACT(YEAR FROM ACCOUNTING_DATE)
         END
     ) STORED
-);
\ No newline at end of file
+);
+
+DROP TABLE IF EXISTS FINANCE.PERIOD_BALANCE;
+
+-- monthly activity per account/business unit/RAD, maintained by finance.refresh_period_balance
+CREATE TABLE FINANCE.PERIOD_BALANCE (
+    PERIOD_START DATE NOT NULL,
+    FISCAL_YEAR INTEGER NOT NULL,
+    FISCAL_PERIOD INTEGER NOT NULL,
+    ACCOUNT_NO TEXT,
+    BUSINESS_UNIT_ID TEXT,
+    RAD_DATA JSONB,
+    ACTIVITY_BALANCE NUMERIC(20, 2) NOT NULL,
+    TRANSACTION_COUNT BIGINT NOT NULL
+);
+
+CREATE INDEX PERIOD_BALANCE_PERIOD_START_IDX ON FINANCE.PERIOD_BALANCE (PERIOD_START);
+
+-- the trial balance functions read the months around their start and end dates from the journal,
+-- and ingest deletes everything from the upload's first accounting date onward
+CREATE INDEX MANUAL_JOURNAL_ENTRY_TRANSACTION_ACCOUNTING_DATE_IDX ON FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (ACCOUNTING_DATE);
+CREATE INDEX MANUAL_JOURNAL_ENTRY_TRANSACTION_ID_IDX ON FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (ID);
+-- account drill downs
+CREATE INDEX MANUAL_JOURNAL_ENTRY_TRANSACTION_ACCOUNT_NO_IDX ON FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (ACCOUNT_NO, ACCOUNTING_DATE);
+-- with the account index above, the keys prune_dimensions probes after an ingest deletes rows
+CREATE INDEX MANUAL_JOURNAL_ENTRY_TRANSACTION_BUSINESS_UNIT_ID_IDX ON FINANCE.MANUAL_JOURNAL_ENTRY_TRANSACTION (BUSINESS_UNIT_ID);
+
+CREATE INDEX MANUAL_BUDGET_ACCOUNTING_DATE_IDX ON FINANCE.MANUAL_BUDGET (ACCOUNTING_DATE);
+-- the summary reads the budget from the current fiscal year onward
+CREATE INDEX MANUAL_BUDGET_FISCAL_YEAR_IDX ON FINANCE.MANUAL_BUDGET (FISCAL_YEAR);
+CREATE INDEX MANUAL_BUDGET_ACCOUNT_NO_IDX ON FINANCE.MANUAL_BUDGET (ACCOUNT_NO);
+CREATE INDEX MANUAL_BUDGET_BUSINESS_UNIT_ID_IDX ON FINANCE.MANUAL_BUDGET (BUSINESS_UNIT_ID);
+
+DROP TABLE IF EXISTS FINANCE.ACCOUNT;
+
+-- account labels, upserted by the upload from the distinct accounts of every batch
+CREATE TABLE FINANCE.ACCOUNT (
+    ACCOUNT_NO TEXT NOT NULL,
+    PRIMARY KEY (ACCOUNT_NO),
+    ACCOUNT TEXT,
+    -- budget uploads don't carry an account type, NULL until a journal upload does
+    ACCOUNT_TYPE TEXT
+);
+
+DROP TABLE IF EXISTS FINANCE.BUSINESS_UNIT;
+
+CREATE TABLE FINANCE.BUSINESS_UNIT (
+    BUSINESS_UNIT_ID TEXT NOT NULL,
+    PRIMARY KEY (BUSINESS_UNIT_ID),
+    BUSINESS_UNIT TEXT
+);
+
+DROP TABLE IF EXISTS FINANCE.GROUPING;
+
+-- JSON rather than JSONB keeps the keys in the order they were written
+CREATE TABLE FINANCE.GROUPING (
+    ID SERIAL NOT NULL,
+    PRIMARY KEY (ID),
+    NAME TEXT NOT NULL,
+    DIMENSION TEXT NOT NULL,
+    GROUPING JSON NOT NULL,
+    CREATED_BY TEXT,
+    IS_ACTIVE BOOLEAN NOT NULL DEFAULT TRUE,
+    CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- set by finance.compile_grouping
+    LEAF_COUNT INTEGER
+);
+
+DROP TABLE IF EXISTS FINANCE.GROUPING_CLOSURE;
+
+-- every leaf of a grouping paired with itself and each of its ancestors, compiled by
+-- finance.compile_grouping whenever the console saves a grouping. NODE_ID numbers the nodes
+-- of the hierarchy in document order.
+CREATE TABLE FINANCE.GROUPING_CLOSURE (
+    GROUPING_ID INTEGER NOT NULL REFERENCES FINANCE.GROUPING (ID) ON DELETE CASCADE,
+    LEAF TEXT NOT NULL,
+    LEAF_NODE_ID INTEGER NOT NULL,
+    NODE_ID INTEGER NOT NULL,
+    PARENT_NODE_ID INTEGER,
+    NODE TEXT NOT NULL,
+    DEPTH INTEGER NOT NULL,
+    IS_LEAF BOOLEAN NOT NULL
+);
+
+CREATE INDEX GROUPING_CLOSURE_GROUPING_ID_LEAF_IDX ON FINANCE.GROUPING_CLOSURE (GROUPING_ID, LEAF);
+
+DROP TABLE IF EXISTS FINANCE.DATA_VERSION;
+
+-- watermarks of the cached reads, bumped by every write to the data they cover
+CREATE TABLE FINANCE.DATA_VERSION (
+    SCOPE TEXT NOT NULL,
+    PRIMARY KEY (SCOPE),
+    VERSION BIGINT NOT NULL DEFAULT 0,
+    UPDATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO FINANCE.DATA_VERSION (SCOPE) VALUES ('ledger'), ('grouping');
+
+DROP TABLE IF EXISTS FINANCE.INGEST_FILE;
+
+-- every upload applied to a fact table, to recognize a file that was already ingested
+CREATE TABLE FINANCE.INGEST_FILE (
+    ID SERIAL NOT NULL,
+    PRIMARY KEY (ID),
+    TABLE_NAME TEXT NOT NULL,
+    FILE_HASH TEXT NOT NULL,
+    FILE_NAME TEXT,
+    ROW_COUNT BIGINT NOT NULL,
+    ROWS_INSERTED BIGINT NOT NULL,
+    ROWS_DELETED BIGINT NOT NULL,
+    MIN_ACCOUNTING_DATE DATE,
+    -- the ledger data version the ingest committed
+    DATA_VERSION BIGINT NOT NULL,
+    INGESTED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX INGEST_FILE_TABLE_NAME_IDX ON FINANCE.INGEST_FILE (TABLE_NAME, ID);
+
+DROP TABLE IF EXISTS FINANCE.INGEST_JOB;
+
+-- uploads handed to the background workers, polled by the upload page
+CREATE TABLE FINANCE.INGEST_JOB (
+    ID SERIAL NOT NULL,
+    PRIMARY KEY (ID),
+    TABLE_NAME TEXT NOT NULL,
+    FILE_NAME TEXT,
+    STATUS TEXT NOT NULL,
+    ROWS_TOTAL BIGINT,
+    ROWS_LOADED BIGINT NOT NULL DEFAULT 0,
+    CANCEL_REQUESTED BOOLEAN NOT NULL DEFAULT FALSE,
+    MESSAGE TEXT,
+    CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    STARTED_AT TIMESTAMP,
+    FINISHED_AT TIMESTAMP,
+    UPDATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
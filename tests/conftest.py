@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+from utils.db_manager import configure_pool
+
+# a database with the finance schema, tests that need one are skipped without it
+TEST_DATABASE_DSN = os.environ.get("TEST_DATABASE_DSN")
+
+
+@pytest.fixture(scope="session")
+def database():
+    if not TEST_DATABASE_DSN:
+        pytest.skip("TEST_DATABASE_DSN is not set")
+    configure_pool(dsn=TEST_DATABASE_DSN)
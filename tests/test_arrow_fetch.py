@@ -0,0 +1,125 @@
+import time
+from contextlib import closing
+
+import pyarrow as pa
+import pytest
+
+from utils.arrow_fetch import (
+    UNDECLARED_NUMERIC,
+    describe_query,
+    fetch_frame,
+    iter_batches,
+    numeric_type,
+)
+from utils.db_manager import connection
+
+
+@pytest.mark.parametrize(
+    "precision, scale, expected",
+    [
+        (20, 2, pa.decimal128(20, 2)),
+        (5, 0, pa.decimal128(5, 0)),
+        (60, 4, pa.decimal128(38, 4)),
+        (0xFFFF, 0xFFFF, UNDECLARED_NUMERIC),
+        (None, None, UNDECLARED_NUMERIC),
+    ],
+)
+def test_numeric_is_read_as_an_exact_decimal(precision, scale, expected):
+    assert numeric_type(precision, scale) == expected
+
+
+def test_numeric_values_come_back_exact(database):
+    frame = fetch_frame(
+        "SELECT (0.1 + 0.2)::NUMERIC(10, 2) AS declared, 1::NUMERIC / 3 AS undeclared"
+    )
+
+    assert str(frame.at[0, "declared"]) == "0.30"
+    assert str(frame.at[0, "undeclared"]) == "0.33333333333333333333"
+
+
+def test_cents_columns_are_exact_int64(database):
+    frame = fetch_frame(
+        """
+            SELECT 90071992547409.93::NUMERIC AS large, NULL::NUMERIC AS missing,
+                SUM(0.01 * g) AS summed
+            FROM generate_series(1, 1000) g
+        """,
+        cents=["large", "missing", "summed"],
+    )
+
+    assert frame.dtypes.to_list() == ["Int64"] * 3
+    # a float64 holds 9007199254740992 or 9007199254740994, not this
+    assert frame.at[0, "large"] == 9_007_199_254_740_993
+    assert frame["missing"].isna().all()
+    assert frame.at[0, "summed"] == 500_500
+
+
+def test_cents_columns_refuse_fractions_of_a_cent(database):
+    with pytest.raises(pa.ArrowInvalid):
+        fetch_frame("SELECT 0.005::NUMERIC AS amount", cents=["amount"])
+
+
+def test_describe_query_maps_postgres_types(database):
+    with connection() as conn, conn.cursor() as cursor:
+        types = describe_query(
+            cursor,
+            """
+                SELECT 1::SMALLINT AS small, 1::BIGINT AS big, TRUE AS flag,
+                    1.5::REAL AS single, 1.5::DOUBLE PRECISION AS double,
+                    1.25::NUMERIC(12, 2) AS amount, SUM(1.25) AS total,
+                    CURRENT_DATE AS day, LOCALTIMESTAMP AS local_time, NOW() AS utc_time,
+                    'x'::TEXT AS label, GEN_RANDOM_UUID() AS id
+            """,
+        )
+
+    assert types == {
+        "small": pa.int64(),
+        "big": pa.int64(),
+        "flag": pa.bool_(),
+        "single": pa.float64(),
+        "double": pa.float64(),
+        "amount": pa.decimal128(12, 2),
+        "total": UNDECLARED_NUMERIC,
+        "day": pa.date32(),
+        "local_time": pa.timestamp("us"),
+        "utc_time": pa.timestamp("us", tz="UTC"),
+        "label": pa.string(),
+        "id": pa.string(),
+    }
+
+
+def test_iter_batches_reads_every_row_a_chunk_at_a_time(database):
+    query = "SELECT g AS n, g % 2 = 0 AS even FROM generate_series(1, 100000) g"
+    batches = list(iter_batches(query, chunk_bytes=64 * 1024))
+
+    assert len(batches) > 1
+    table = pa.Table.from_batches(batches)
+    assert table.schema.types == [pa.int64(), pa.bool_()]
+    assert table["n"].to_pylist() == list(range(1, 100_001))
+
+
+def test_iter_batches_cancels_the_copy_when_stopped_early(database):
+    # a set returning function is materialized before its first row, a join of two streams
+    query = """
+        SELECT a * 10000 + b AS n, MD5(b::TEXT) AS digest
+        FROM generate_series(1, 10000) a, generate_series(1, 10000) b
+    """
+    started = time.monotonic()
+    with closing(iter_batches(query, chunk_bytes=64 * 1024)) as batches:
+        first = next(batches)
+
+    assert first.num_rows > 0
+    # reading all of it takes minutes
+    assert time.monotonic() - started < 10
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM pg_stat_activity WHERE query LIKE '%MD5(b::TEXT)%'"
+            " AND state = 'active' AND pid <> PG_BACKEND_PID()"
+        )
+        assert cursor.fetchone()[0] == 0
+    assert fetch_frame("SELECT 1 AS one").at[0, "one"] == 1
+
+
+def test_iter_batches_reports_a_failed_copy(database):
+    with pytest.raises(Exception, match="division by zero"):
+        list(iter_batches("SELECT 1 / (g - 3) AS n FROM generate_series(1, 5) g"))
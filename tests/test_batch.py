@@ -0,0 +1,128 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from pages.upload import batch
+from pages.upload.validation import ERROR_COLUMNS, DataValidationError
+
+FILES = [(f"file_{n}.csv", str(n).encode()) for n in range(5)]
+
+
+class LazyFuture:
+    """Runs its call when the result is taken, so the test sees what is still pending."""
+
+    def __init__(self, fn, args):
+        self.fn, self.args = fn, args
+        self.cancelled = False
+
+    def result(self):
+        return self.fn(*self.args)
+
+    def cancel(self):
+        self.cancelled = True
+        return True
+
+
+class LazyPool:
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        self.futures.append(LazyFuture(fn, args))
+        return self.futures[-1]
+
+
+def fake_clean_file(file_name, file_bytes, table_name, summarize=False, errors=()):
+    found = pd.DataFrame(
+        [[1, "amount", "twelve", "not a number"]] if file_name in errors else [],
+        columns=ERROR_COLUMNS,
+    )
+    found.insert(0, "file_name", file_name)
+    return deque([pd.DataFrame({"file": [file_name]})]), found, []
+
+
+@pytest.fixture
+def lazy_pool(monkeypatch):
+    pool = LazyPool()
+    monkeypatch.setattr(batch, "BATCH_WORKERS", 2)
+    monkeypatch.setattr(batch, "get_process_pool", lambda: pool)
+    monkeypatch.setattr(batch, "clean_file", fake_clean_file)
+    return pool
+
+
+def test_iter_results_keeps_at_most_batch_workers_files_in_flight(lazy_pool):
+    results = batch.iter_results(FILES, "MANUAL_JOURNAL_ENTRY_TRANSACTION", summarize=False)
+
+    in_flight = []
+    for taken, _ in enumerate(results, start=1):
+        in_flight.append(len(lazy_pool.futures) - taken)
+
+    assert in_flight == [2, 2, 2, 1, 0]
+    assert [future.args[0] for future in lazy_pool.futures] == [name for name, _ in FILES]
+
+
+def test_iter_results_cancels_what_is_left_when_closed(lazy_pool):
+    results = batch.iter_results(FILES, "MANUAL_JOURNAL_ENTRY_TRANSACTION", summarize=False)
+    next(results)
+    results.close()
+
+    assert [future.cancelled for future in lazy_pool.futures] == [False, True, True]
+
+
+def test_iter_results_yields_in_file_order_whatever_finishes_first(monkeypatch):
+    def slow_first(file_name, file_bytes, table_name, summarize):
+        # the earlier the file, the longer it takes
+        time.sleep(0.02 * (len(FILES) - int(file_bytes)))
+        return file_name
+
+    monkeypatch.setattr(batch, "BATCH_WORKERS", 3)
+    monkeypatch.setattr(batch, "clean_file", slow_first)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        monkeypatch.setattr(batch, "get_process_pool", lambda: pool)
+        results = list(batch.iter_results(FILES, "MANUAL_BUDGET", summarize=True))
+
+    assert results == [name for name, _ in FILES]
+
+
+def test_iter_clean_files_stops_at_bad_values_and_reports_every_file(lazy_pool, monkeypatch):
+    bad = {"file_1.csv", "file_3.csv"}
+    monkeypatch.setattr(
+        batch, "clean_file", lambda *args: fake_clean_file(*args, errors=bad)
+    )
+
+    loaded = []
+    with pytest.raises(DataValidationError) as raised:
+        for chunk in batch.iter_clean_files(FILES, "MANUAL_JOURNAL_ENTRY_TRANSACTION"):
+            loaded.extend(chunk["file"])
+
+    assert loaded == ["file_0.csv"]
+    assert raised.value.errors["file_name"].tolist() == ["file_1.csv", "file_3.csv"]
+
+
+BUDGET_HEADER = (
+    "Budget ID,Chart ID,Chart,Account No,Account,Business Unit ID,Business Unit,"
+    "Amount,Accounting Date,Data Type,Region_RAD\n"
+)
+
+
+def budget_csv(months: range) -> tuple[str, bytes]:
+    rows = "".join(
+        f"B1,C1,Main,1000,Cash,10,Head Office,12.50,{month:02d}/01/2201,BUDGET,EAST\n"
+        for month in months
+    )
+    return f"budget_{months.start}.csv", (BUDGET_HEADER + rows).encode()
+
+
+def test_summarize_files_cleans_in_worker_processes():
+    files = [budget_csv(range(1, 4)), budget_csv(range(4, 13))]
+
+    summary = batch.summarize_files(files, "MANUAL_BUDGET")
+
+    assert summary["file_name"].tolist() == ["budget_1.csv", "budget_4.csv"]
+    assert summary["rows"].tolist() == [3, 9]
+    assert summary["total_amount"].tolist() == [37.5, 112.5]
+    assert pd.Timestamp(summary.at[1, "min_accounting_date"]) == pd.Timestamp(2201, 4, 1)
+    assert pd.Timestamp(summary.at[1, "max_accounting_date"]) == pd.Timestamp(2201, 12, 1)
@@ -0,0 +1,163 @@
+import os
+import zipfile
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from xml.etree import ElementTree
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from pyarrow import csv
+
+from utils import export
+from utils.export import (
+    EXCEL_DATE_STYLE,
+    EXCEL_DATETIME_STYLE,
+    CsvExport,
+    ExcelExport,
+    ParquetExport,
+    export_query,
+)
+
+MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def read_cells(path, sheet=1):
+    """The (style, value) of every cell of a sheet, row by row."""
+    with zipfile.ZipFile(path) as xlsx:
+        root = ElementTree.fromstring(xlsx.read(f"xl/worksheets/sheet{sheet}.xml"))
+    # numbers and dates are in <v>, inline strings in <is><t>
+    return [
+        [
+            (cell.get("s"), cell.findtext(f"{MAIN}v") or cell.findtext(f"{MAIN}is/{MAIN}t"))
+            for cell in row
+        ]
+        for row in root.iter(f"{MAIN}row")
+    ]
+
+
+def test_excel_writes_dates_as_styled_serials(tmp_path):
+    batch = pa.record_batch(
+        {
+            "accounting_date": [date(2024, 1, 31), date(1900, 3, 1), date(1899, 12, 31)],
+            "created_at": [
+                datetime(2024, 1, 31, 18),
+                datetime(2024, 1, 31, 6, tzinfo=timezone.utc),
+                None,
+            ],
+        }
+    )
+    path = tmp_path / "dates.xlsx"
+    writer = ExcelExport(path, batch.schema)
+    writer.write_batch(batch)
+    writer.close()
+
+    date_style, datetime_style = str(EXCEL_DATE_STYLE), str(EXCEL_DATETIME_STYLE)
+    assert read_cells(path)[1:] == [
+        [(date_style, "45322"), (datetime_style, "45322.75")],
+        [(date_style, "61"), (datetime_style, "45322.25")],
+        # before excel's serials are right
+        [(None, "1899-12-31"), (None, None)],
+    ]
+
+    with zipfile.ZipFile(path) as xlsx:
+        styles = ElementTree.fromstring(xlsx.read("xl/styles.xml"))
+        content_types = xlsx.read("[Content_Types].xml").decode()
+        rels = xlsx.read("xl/_rels/workbook.xml.rels").decode()
+    formats = [xf.get("numFmtId") for xf in styles.find(f"{MAIN}cellXfs")]
+    assert formats[EXCEL_DATE_STYLE] == "14"
+    assert formats[EXCEL_DATETIME_STYLE] == "164"
+    assert "/xl/styles.xml" in content_types
+    assert 'Target="styles.xml"' in rels
+
+
+BATCHES = [
+    pa.record_batch(
+        {
+            "id": pa.array([2 * n + 1, 2 * n + 2], pa.int64()),
+            "amount": pa.array([Decimal("1.10"), Decimal("-0.05")], pa.decimal128(12, 2)),
+            "remarks": [f"line {n}", None],
+        }
+    )
+    for n in range(3)
+]
+
+
+def read_csv(path):
+    # the amounts as written, rather than inferred as floats
+    return csv.read_csv(
+        path,
+        convert_options=csv.ConvertOptions(
+            column_types={"amount": pa.string()},
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+
+
+def write(writer_class, path, batches=BATCHES):
+    writer = writer_class(path, batches[0].schema)
+    for batch in batches:
+        writer.write_batch(batch)
+    writer.close()
+
+
+@pytest.mark.parametrize(
+    "writer_class, read",
+    [(ParquetExport, pq.read_table), (CsvExport, read_csv)],
+)
+def test_writers_keep_every_row_in_order(tmp_path, writer_class, read):
+    path = str(tmp_path / "export")
+    write(writer_class, path)
+
+    table = read(path)
+    assert table["id"].to_pylist() == [1, 2, 3, 4, 5, 6]
+    assert [str(amount) for amount in table["amount"].to_pylist()] == ["1.10", "-0.05"] * 3
+    assert table["remarks"].to_pylist() == ["line 0", None, "line 1", None, "line 2", None]
+
+
+def test_excel_goes_on_in_a_new_sheet_past_the_row_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXCEL_MAX_ROWS", 4)
+    path = tmp_path / "split.xlsx"
+    write(ExcelExport, path)
+
+    header = [(None, "id"), (None, "amount"), (None, "remarks")]
+    first, second = read_cells(path, 1), read_cells(path, 2)
+    assert first[0] == second[0] == header
+    assert [row[0][1] for row in first[1:] + second[1:]] == ["1", "2", "3", "4", "5", "6"]
+    assert first[1] == [(None, "1"), (None, "1.10"), (None, "line 0")]
+    assert len(first) == 4
+
+    with zipfile.ZipFile(path) as xlsx:
+        workbook = xlsx.read("xl/workbook.xml").decode()
+        content_types = xlsx.read("[Content_Types].xml").decode()
+    assert 'name="Sheet2"' in workbook and 'name="Sheet3"' not in workbook
+    assert "/xl/worksheets/sheet2.xml" in content_types
+
+
+def test_excel_cleans_text_it_cannot_hold(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXCEL_MAX_CELL_CHARS", 5)
+    batch = pa.record_batch({"text": ["a\x00b<&>", "abcdefgh"], "ok": [True, False]})
+    path = tmp_path / "text.xlsx"
+    write(ExcelExport, path, [batch])
+
+    assert read_cells(path)[1:] == [
+        [(None, "ab<&>"), (None, "1")],
+        [(None, "abcde"), (None, "0")],
+    ]
+
+
+def test_export_query_reuses_the_file_until_the_ledger_changes(
+    database, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path))
+    query = "SELECT g AS n, g * 0.5 AS half FROM generate_series(1, %s) g"
+
+    path = export_query(query, (1000,), fmt="CSV")
+    assert csv.read_csv(path)["n"].to_pylist() == list(range(1, 1001))
+    assert export_query(query, (1000,), fmt="CSV") == path
+
+    monkeypatch.setattr(export, "get_data_version", lambda scope: "moved on")
+    assert export_query(query, (1000,), fmt="CSV") != path
+    # only finished files are left behind
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".")]
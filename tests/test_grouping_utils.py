@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from pages.grouping import utils
+from pages.grouping.utils import find_leaf_nodes, validate_grouping
+
+GROUPING = {
+    "REVENUE": {"SALES": ["4000", "4100"], "OTHER": [4200]},
+    "EXPENSES": ["5000", "4100", None],
+}
+
+
+@pytest.fixture
+def members(monkeypatch):
+    known = frozenset({"4000", "4100", "4200", "6000"})
+    monkeypatch.setattr(utils, "fetch_dimension_members", lambda dimension: known)
+
+
+def test_find_leaf_nodes_keeps_document_order_as_text():
+    assert find_leaf_nodes(GROUPING) == ["4000", "4100", "4200", "5000", "4100"]
+
+
+@pytest.mark.parametrize(
+    "leaf, text", [(4200, "4200"), (1.5, "1.5"), (1e20, "1e+20"), (True, "true"), (False, "false")]
+)
+def test_find_leaf_nodes_reads_scalars_as_json_text(leaf, text):
+    assert find_leaf_nodes({"GROUP": [leaf]}) == [text]
+
+
+def test_find_leaf_nodes_matches_compile_grouping(database):
+    from utils.db_manager import connection
+
+    grouping = {"A": ["4000", 4200, 1.5, True], "B": {"C": False, "D": [None, 1e20]}}
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH RECURSIVE nodes AS (
+                SELECT c.*
+                FROM finance.grouping_children(%s::JSON, ARRAY[]::INTEGER[], 0, ARRAY[]::TEXT[]) c
+                UNION ALL
+                SELECT c.*
+                FROM nodes n, finance.grouping_children(n.content, n.path, n.depth + 1, n.ancestors) c
+                WHERE n.kind <> 'leaf'
+            )
+            SELECT label FROM nodes WHERE kind = 'leaf' ORDER BY path
+            """,
+            (json.dumps(grouping),),
+        )
+        compiled = [row[0] for row in cursor.fetchall()]
+
+    assert find_leaf_nodes(grouping) == compiled
+
+
+def test_validate_grouping_reports_each_set_difference(members):
+    validation = validate_grouping(GROUPING, "account")
+
+    assert validation.leaf_count == 5
+    assert validation.missing == ["6000"]
+    assert validation.duplicates == ["4100"]
+    assert validation.unknown == ["5000"]
+    assert not validation.is_complete
+
+
+def test_validate_grouping_complete(members):
+    validation = validate_grouping({"ALL": ["4000", "4100", "4200", "6000"]}, "business_unit")
+
+    assert validation.is_complete
+    assert validation.leaf_count == 4
+
+
+def test_report_groupings_are_not_checked(members):
+    assert validate_grouping(GROUPING, "report") is None
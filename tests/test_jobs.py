@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+
+from pages.upload import jobs, utils
+from utils.db_manager import connection
+
+
+@pytest.fixture
+def new_job(database):
+    job_ids = []
+
+    def create(rows_total: int = 10) -> int:
+        job_id = jobs._create_job("MANUAL_BUDGET", "test.csv", rows_total)
+        job_ids.append(job_id)
+        return job_id
+
+    yield create
+    jobs._execute("DELETE FROM finance.ingest_job WHERE id = ANY(%s)", (job_ids,))
+
+
+def age_job(job_id: int, seconds: int = jobs.STALE_JOB_SECONDS + 60):
+    jobs._execute(
+        """
+            UPDATE finance.ingest_job
+            SET updated_at = CURRENT_TIMESTAMP - make_interval(secs => %s)
+            WHERE id = %s
+        """,
+        (seconds, job_id),
+    )
+
+
+def fake_ingest(monkeypatch, steps):
+    """Replaces the ingest by one that loads nothing and runs ``steps`` with its callbacks."""
+
+    def stream_ingest_data(clean_chunks, table_name, progress_callback, heartbeat, **kwargs):
+        for step in steps:
+            step(progress_callback, heartbeat)
+        return "deleted", "inserted", utils.UploadSummary()
+
+    monkeypatch.setattr(jobs, "stream_ingest_data", stream_ingest_data)
+
+
+def run(job_id: int):
+    jobs.run_job(job_id, "MANUAL_BUDGET", "test.csv", [], "hash")
+    return jobs.get_ingest_job(job_id)
+
+
+def test_job_records_progress_and_success(new_job, monkeypatch):
+    job_id = new_job()
+    fake_ingest(monkeypatch, [lambda progress, heartbeat: progress(4), lambda p, h: p(6)])
+
+    job = run(job_id)
+
+    assert job["status"] == jobs.SUCCEEDED
+    assert job["rows_loaded"] == 10
+    assert job["message"] == "deleted\ninserted"
+    assert job["started_at"] is not None and job["finished_at"] is not None
+
+
+def test_cancel_stops_the_job_at_its_next_heartbeat(new_job, monkeypatch):
+    job_id = new_job()
+    steps = [lambda p, h: p(4), lambda p, h: jobs.cancel_ingest_job(job_id), lambda p, h: h()]
+    fake_ingest(monkeypatch, steps)
+
+    job = run(job_id)
+
+    assert job["status"] == jobs.CANCELLED
+    assert job["rows_loaded"] == 4
+
+
+def test_job_cancelled_while_queued_never_runs(new_job, monkeypatch):
+    job_id = new_job()
+    jobs.cancel_ingest_job(job_id)
+    fake_ingest(monkeypatch, [lambda p, h: pytest.fail("the ingest ran")])
+
+    assert run(job_id)["status"] == jobs.CANCELLED
+
+
+def test_job_failed_as_lost_stops_and_keeps_its_status(new_job, monkeypatch):
+    job_id = new_job()
+
+    def lose_job(progress, heartbeat):
+        age_job(job_id)
+        jobs.get_ingest_job(job_id)
+
+    still_running = lambda p, h: pytest.fail("the ingest went on")
+    fake_ingest(monkeypatch, [lose_job, lambda p, h: h(), still_running])
+
+    job = run(job_id)
+
+    assert job["status"] == jobs.FAILED
+    assert job["message"].startswith("Lost")
+
+
+def test_final_update_leaves_a_lost_job_alone(new_job, monkeypatch, caplog):
+    job_id = new_job()
+
+    def lose_job(progress, heartbeat):
+        age_job(job_id)
+        jobs.get_ingest_job(job_id)
+
+    fake_ingest(monkeypatch, [lose_job])
+
+    job = run(job_id)
+
+    assert job["status"] == jobs.FAILED
+    assert job["message"].startswith("Lost")
+    assert f"Ingest job {job_id} succeeded after it was failed as lost" in caplog.text
+
+
+def test_polling_only_fails_the_stale_jobs_it_reads(new_job):
+    stale_id, fresh_id = new_job(), new_job()
+    age_job(stale_id)
+
+    assert jobs.get_ingest_job(fresh_id)["status"] == jobs.QUEUED
+    age_job(stale_id, 0)
+    assert jobs.get_ingest_job(stale_id)["status"] == jobs.QUEUED
+
+    age_job(stale_id)
+    assert jobs.get_ingest_job(stale_id)["status"] == jobs.FAILED
+    recent = jobs.get_recent_ingest_jobs().set_index("id")
+    assert recent.loc[fresh_id, "status"] == jobs.QUEUED
+    assert "stale" not in recent.columns
+
+
+def test_waiting_for_the_table_sends_heartbeats(database, monkeypatch):
+    monkeypatch.setattr(utils, "LOCK_RETRY_SECONDS", 0.01)
+    heartbeats = threading.Semaphore(0)
+    acquired = threading.Event()
+
+    def wait_for_lock():
+        with connection() as conn, conn.cursor() as cursor:
+            utils.lock_for_ingest(cursor, "MANUAL_BUDGET", heartbeats.release)
+            acquired.set()
+
+    with connection() as conn, conn.cursor() as cursor:
+        utils.lock_for_ingest(cursor, "MANUAL_BUDGET")
+        waiter = threading.Thread(target=wait_for_lock)
+        waiter.start()
+        for _ in range(3):
+            assert heartbeats.acquire(timeout=5)
+        assert not acquired.is_set()
+        conn.rollback()
+
+    waiter.join(timeout=5)
+    assert acquired.is_set()
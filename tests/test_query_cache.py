@@ -0,0 +1,58 @@
+import pytest
+
+from utils import query_cache
+from utils.query_cache import QueryCache, cached_query
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (True, 1)
+
+    cache.put("c", 3)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = QueryCache(ttl=60)
+    cache.put("a", 1)
+
+    clock[0] += 60
+    assert cache.get("a") == (True, 1)
+    clock[0] += 1
+    assert cache.get("a") == (False, None)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (1, 1, 1, 0)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_cached_query_is_keyed_by_arguments_and_data_version(monkeypatch):
+    version = [1]
+    monkeypatch.setattr(query_cache, "get_data_version", lambda scope: version[0])
+    calls = []
+
+    @cached_query("ledger", cache=QueryCache())
+    def fetch(account_no, period="month"):
+        calls.append((account_no, period))
+        return len(calls)
+
+    assert fetch("1000") == fetch("1000") == 1
+    assert fetch("1000", period="year") == 2
+    assert fetch("2000") == 3
+
+    version[0] += 1
+    assert fetch("1000") == 4
+    assert len(calls) == 4
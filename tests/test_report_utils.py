@@ -0,0 +1,152 @@
+import pandas as pd
+import pytest
+
+from pages.report import utils
+from pages.report.report.base import ReportBase
+from pages.report.report.profit_loss import ProfitLoss
+
+# Assets > OTHER > 1000 and Liabilities > OTHER > 2000, two nodes labelled OTHER
+CLOSURE = pd.DataFrame(
+    [
+        ("1000", 1, None, "Assets", 0, False),
+        ("1000", 2, 1, "OTHER", 1, False),
+        ("1000", 3, 2, "1000", 2, True),
+        ("2000", 4, None, "Liabilities", 0, False),
+        ("2000", 5, 4, "OTHER", 1, False),
+        ("2000", 6, 5, "2000", 2, True),
+    ],
+    columns=["leaf", "node_id", "parent_node_id", "node", "depth", "is_leaf"],
+).astype({"parent_node_id": "Int64"})
+
+
+@pytest.fixture
+def grouping(monkeypatch):
+    fetch_grouping = staticmethod(lambda _: ("account", CLOSURE))
+    monkeypatch.setattr(ReportBase, "fetch_grouping", fetch_grouping)
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    calls = []
+    months = pd.to_datetime(["2024-09-01", "2024-10-01"])
+    rows = [
+        (account_no, business_unit_id, month, 2024 + (month.month >= 10), activity)
+        for account_no, activity in [("1000", 10.0), ("2000", -4.0), ("3000", 1.0)]
+        for business_unit_id in ["10", "20"]
+        for month in months
+    ]
+    frame = pd.DataFrame(
+        rows,
+        columns=[
+            "account_no", "business_unit_id", "period_start", "fiscal_year", "activity_balance"
+        ],
+    ).assign(
+        fiscal_period=lambda df: (df["period_start"].dt.month + 2) % 12 + 1,
+        activity_balance_cents=lambda df: (df.pop("activity_balance") * 100).astype("Int64"),
+        opening_balance_cents=pd.array([0] * len(rows), dtype="Int64"),
+        closing_balance_cents=lambda df: df["activity_balance_cents"],
+        transaction_count=1,
+    )
+
+    def fetch_balance_series(start_date, end_date, account_nos, business_unit_ids):
+        calls.append((account_nos, business_unit_ids))
+        selected = frame["account_no"].isin(account_nos) if account_nos else True
+        return frame[selected].reset_index(drop=True)
+
+    monkeypatch.setattr(utils, "fetch_balance_series", fetch_balance_series)
+    return calls
+
+
+def test_balance_series_fetches_only_the_grouping_leaves(grouping, fetched):
+    series = utils.balance_series("2024-09-01", "2024-10-31", grouping_id=1)
+
+    assert fetched == [(("1000", "2000"), ())]
+    october = series[series["period_start"] == "2024-10-01"].set_index("node_id")
+    # both business units of a leaf, summed once into every ancestor
+    assert october["activity_balance"].to_list() == [20.0, 20.0, 20.0, -8.0, -8.0, -8.0]
+
+
+def test_balance_series_keeps_only_the_filtered_leaves(grouping, fetched):
+    series = utils.balance_series(
+        "2024-09-01", "2024-10-31", account_nos=["2000", "9999"], grouping_id=1
+    )
+
+    assert fetched == [(("2000",), ())]
+    assert set(series["node_id"]) == {4, 5, 6}
+
+    # nothing of the grouping is left, nothing is fetched
+    assert utils.balance_series(
+        "2024-09-01", "2024-10-31", account_nos=["9999"], grouping_id=1
+    ).empty
+    assert len(fetched) == 1
+
+
+def test_balance_series_by_fiscal_year(grouping, fetched):
+    series = utils.balance_series(
+        "2024-09-01", "2024-10-31", grouping_id=1, period="fiscal_year"
+    )
+
+    assets = series[series["node_id"] == 1].set_index("fiscal_year")
+    assert assets["activity_balance"].to_dict() == {2024: 20.0, 2025: 20.0}
+
+
+def test_trend_lines_keep_nodes_with_the_same_label_apart(grouping, fetched):
+    series = utils.balance_series("2024-09-01", "2024-10-31", grouping_id=1)
+    charted = series[series["node_id"].isin([2, 5])]
+
+    lines = utils.trend_lines(charted, CLOSURE, "period_start", "activity_balance")
+
+    assert lines.columns.to_list() == ["OTHER (Assets)", "OTHER (Liabilities)"]
+    assert lines.iloc[-1].to_list() == [20.0, -8.0]
+
+
+def test_trend_lines_number_nodes_whose_parents_share_a_label_too():
+    nodes = pd.DataFrame(
+        {"node_id": [1, 2, 3], "parent_node_id": [None, 1, 1], "node": ["Top", "A", "A"]}
+    ).astype({"parent_node_id": "Int64"})
+    series = pd.DataFrame({"node_id": [1, 2, 3], "period_start": 1, "closing_balance": 1.0})
+
+    lines = utils.trend_lines(series, nodes, "period_start", "closing_balance")
+
+    assert lines.columns.to_list() == ["Top", "A (Top) #2", "A (Top) #3"]
+
+
+def test_build_rolls_the_trial_balance_up_the_grouping(grouping, monkeypatch):
+    trial_balance = pd.DataFrame(
+        {
+            "account_no": ["1000", "1000", "2000", "3000"],
+            "time_period": ["CurrentMonth", "CurrentYTD", "CurrentMonth", "CurrentMonth"],
+            "activity_balance_cents": pd.array([500, 1200, -300, 700], dtype="Int64"),
+        }
+    ).astype({"account_no": "category"})
+    fetch_trial_balance = staticmethod(lambda _: trial_balance)
+    monkeypatch.setattr(ReportBase, "fetch_trial_balance", fetch_trial_balance)
+
+    report = ProfitLoss("2024-10-31")
+    frame = report.build(1).set_index("node_id")
+
+    assert frame.index.to_list() == [1, 2, 3, 4, 5, 6]
+    assert frame["CurrentMonth"].to_list() == [5.0, 5.0, 5.0, -3.0, -3.0, -3.0]
+    assert frame["CurrentYTD"].to_list() == [12.0, 12.0, 12.0, 0.0, 0.0, 0.0]
+    assert frame.loc[[2, 5], "node"].to_list() == ["OTHER", "OTHER"]
+    assert report.unmapped.index.to_list() == ["3000"]
+    assert report.unmapped.at["3000", "CurrentMonth"] == 7.0
+    indented = report.indent(report.build(1), padding="-")
+    assert indented.to_list()[:3] == ["Assets", "-OTHER", "--1000"]
+
+
+def test_build_sums_in_exact_cents(grouping, monkeypatch):
+    trial_balance = pd.DataFrame(
+        {
+            "account_no": ["1000"] * 3,
+            "time_period": ["CurrentMonth"] * 3,
+            "activity_balance_cents": pd.array([10, 10, 10], dtype="Int64"),
+        }
+    ).astype({"account_no": "category"})
+    fetch_trial_balance = staticmethod(lambda _: trial_balance)
+    monkeypatch.setattr(ReportBase, "fetch_trial_balance", fetch_trial_balance)
+
+    frame = ProfitLoss("2024-10-31").build(1).set_index("node_id")
+
+    # 0.1 + 0.1 + 0.1 in floats is 0.30000000000000004
+    assert frame.at[1, "CurrentMonth"] == 0.3
@@ -0,0 +1,154 @@
+import io
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pages.upload.utils import (
+    apply_staging_delta,
+    clean_data,
+    copy_into_staging,
+    create_staging_table,
+    delete_from_minimum_date,
+    iter_clean_chunks,
+    prune_dimensions,
+    round_to_cents,
+    row_fingerprints,
+    to_cents,
+    to_database_frame,
+    update_dimensions,
+)
+from utils.db_manager import connection
+
+
+def format_cents(values) -> list[float]:
+    return [float(f"{value:.2f}") for value in values]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [(2.675, 2.67), (1.005, 1.0), (0.125, 0.12), (0.375, 0.38), (-2.675, -2.67), (-0.125, -0.12)],
+)
+def test_round_to_cents_ties_round_like_format(value, expected):
+    assert round_to_cents(pd.Series([value])).tolist() == [expected]
+
+
+def test_round_to_cents_matches_format_on_every_half_cent():
+    values = np.arange(-200_000, 200_000) / 1000 + 0.0005
+    values = np.concatenate([values, np.arange(-100_000, 100_000, 5) / 1000])
+
+    rounded = round_to_cents(pd.Series(values))
+
+    assert rounded.tolist() == format_cents(values)
+
+
+def test_round_to_cents_keeps_the_index():
+    values = pd.Series([1.115, 2.0], index=[10, 20])
+    assert round_to_cents(values).index.tolist() == [10, 20]
+
+
+def test_to_cents_is_exact_and_keeps_missing_amounts():
+    amounts = pd.Series(
+        [0.1, 2.675, -1234.5, np.nan, 0.29, 1e10 + 0.01], index=[5, 6, 7, 8, 9, 10]
+    )
+
+    cents = to_cents(amounts)
+
+    assert cents.dtype == "Int64"
+    assert cents.index.tolist() == [5, 6, 7, 8, 9, 10]
+    assert cents.isna().tolist() == [False, False, False, True, False, False]
+    assert cents.dropna().tolist() == [10, 267, -123450, 29, 1_000_000_000_001]
+
+
+BUDGET_CSV = (
+    "Budget ID,Chart ID,Chart,Account No,Account,Business Unit ID,Business Unit,"
+    "Amount,Accounting Date,Data Type,Region_RAD\n"
+    + "".join(
+        f"B1,C1,Main,{1000 + row % 3},Account {row % 3},{10 + row % 2},Unit {row % 2},"
+        f'"{row * 1.5:,.2f}",{1 + row % 12:02d}/01/2201,BUDGET,{"" if row % 4 else "EAST"}\n'
+        for row in range(40)
+    )
+)
+
+
+def budget_file(text: str = BUDGET_CSV) -> io.BytesIO:
+    return io.BytesIO(text.encode())
+
+
+def budget_fingerprints(chunk_size: int) -> list[str]:
+    chunks = iter_clean_chunks(budget_file(), "MANUAL_BUDGET", chunk_size=chunk_size)
+    return [
+        fingerprint
+        for chunk in chunks
+        for fingerprint in row_fingerprints(to_database_frame(chunk)).tolist()
+    ]
+
+
+def test_row_fingerprints_do_not_depend_on_the_chunk_size():
+    fingerprints = budget_fingerprints(chunk_size=40)
+
+    assert len(set(fingerprints)) == 40
+    assert all(len(fingerprint) == 32 for fingerprint in fingerprints)
+    for chunk_size in [1, 3, 7, 16]:
+        assert budget_fingerprints(chunk_size) == fingerprints
+
+
+def stage_budget(cursor, text: str) -> tuple[str, list[str]]:
+    raw = pd.read_csv(budget_file(text), dtype=str)
+    rows = to_database_frame(clean_data(raw, "MANUAL_BUDGET"))
+    columns = rows.columns.to_list()
+    staging_table = create_staging_table(cursor, "MANUAL_BUDGET", columns + ["row_hash"])
+    copy_into_staging(cursor, staging_table, rows.assign(row_hash=row_fingerprints(rows)))
+    return staging_table, columns
+
+
+def apply_budget(cursor, text: str) -> tuple[int, int]:
+    staging_table, columns = stage_budget(cursor, text)
+    delta = apply_staging_delta(cursor, "MANUAL_BUDGET", staging_table, columns, date(2201, 1, 1))
+    return int(delta["inserted"].sum()), int(delta["deleted"].sum())
+
+
+def test_apply_staging_delta_keeps_identical_rows_apart(database):
+    header = BUDGET_CSV.splitlines(keepends=True)[0]
+    line = "B1,C1,Main,1000,Cash,10,Unit,12.50,01/01/2201,BUDGET,\n"
+    other = "B1,C1,Main,2000,Sales,10,Unit,-3.00,02/01/2201,BUDGET,EAST\n"
+
+    # the rollback on returning the connection leaves the table as it was
+    with connection() as conn, conn.cursor() as cursor:
+        assert apply_budget(cursor, header + line * 2 + other) == (3, 0)
+        cursor.execute(
+            "SELECT row_hash FROM finance.manual_budget WHERE accounting_date >= '2201-01-01'"
+        )
+        occurrences = sorted(row_hash.rsplit(":", 1)[1] for (row_hash,) in cursor.fetchall())
+        assert occurrences == ["1", "1", "2"]
+
+        # the same upload again changes nothing
+        assert apply_budget(cursor, header + line * 2 + other) == (0, 0)
+        # one of the identical lines goes, the other stays
+        assert apply_budget(cursor, header + line + other) == (0, 1)
+        # and comes back as a second occurrence
+        assert apply_budget(cursor, header + line * 2 + other) == (1, 0)
+
+
+def test_deleting_from_a_date_prunes_members_left_without_rows(database):
+    header = BUDGET_CSV.splitlines(keepends=True)[0]
+    text = header + "B1,C1,Main,ZZ-TEST,Test,ZZ-BU,Test Unit,1.00,01/01/2201,BUDGET,\n"
+
+    with connection() as conn, conn.cursor() as cursor:
+        assert apply_budget(cursor, text) == (1, 0)
+        raw = pd.read_csv(budget_file(text), dtype=str)
+        update_dimensions(cursor, to_database_frame(clean_data(raw, "MANUAL_BUDGET")))
+        cursor.execute("SELECT account_type FROM finance.account WHERE account_no = 'ZZ-TEST'")
+        # budget rows carry no account type
+        assert cursor.fetchall() == [(None,)]
+
+        assert delete_from_minimum_date(cursor, "MANUAL_BUDGET", date(2201, 1, 1)) == 1
+        assert prune_dimensions(cursor) == (1, 1)
+        cursor.execute(
+            """
+                SELECT (SELECT COUNT(*) FROM finance.account WHERE account_no = 'ZZ-TEST'),
+                    (SELECT COUNT(*) FROM finance.business_unit WHERE business_unit_id = 'ZZ-BU')
+            """
+        )
+        assert cursor.fetchone() == (0, 0)
@@ -0,0 +1,116 @@
+import io
+
+import pandas as pd
+import pytest
+
+from pages.upload.validation import DataValidationError
+from pages.validation.utils import read_trial_balance, reconcile
+
+
+def csv_file(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode())
+
+
+def test_read_trial_balance_parses_separators_and_parentheses():
+    trial_balance = read_trial_balance(
+        csv_file(
+            "Account,BU,Debit,Credit\n"
+            '1000,10,"1,234.50",\n'
+            "2000,10,,(25.10)\n"
+            "3000, 20 ,0.1,0.2\n"
+        )
+    )
+
+    assert trial_balance["account_no"].tolist() == ["1000", "2000", "3000"]
+    assert trial_balance["business_unit_id"].tolist() == ["10", "10", "20"]
+    assert trial_balance["debit_cents"].tolist() == [123450, 0, 10]
+    assert trial_balance["credit_cents"].tolist() == [0, -2510, 20]
+
+
+def test_read_trial_balance_reports_every_bad_cell_by_line():
+    with pytest.raises(DataValidationError) as raised:
+        read_trial_balance(
+            csv_file("Account,Debit,Credit\n1000,12.00,abc\n2000,1.00,\n3000,twelve,(x)\n")
+        )
+
+    errors = raised.value.errors
+    assert errors[["line", "column", "value"]].values.tolist() == [
+        [2, "credit", "abc"],
+        [4, "credit", "(x)"],
+        [4, "debit", "twelve"],
+    ]
+
+
+def test_reconcile_reports_unmatched_keys_and_differences():
+    uploaded = pd.DataFrame(
+        {
+            "account_no": ["1000", "1000", "2000", "4000"],
+            "business_unit_id": ["10", "10", "10", "10"],
+            "debit_cents": pd.array([10000, 5000, 0, 700], dtype="Int64"),
+            "credit_cents": pd.array([0, 0, 2500, 0], dtype="Int64"),
+        }
+    )
+    ledger = pd.DataFrame(
+        {
+            "account_no": ["1000", "2000", "3000"],
+            "business_unit_id": ["10", "10", "10"],
+            "closing_balance_cents": pd.array([15000, -2000, 500], dtype="Int64"),
+        }
+    )
+
+    result = reconcile(uploaded, ledger)
+
+    assert result.keys == ["account_no", "business_unit_id"]
+    assert result.unmatched("left_only").values.tolist() == [["4000", "10"]]
+    assert result.unmatched("right_only").values.tolist() == [["3000", "10"]]
+    differences = result.differences.set_index("account_no")["difference"].to_dict()
+    assert differences == {"2000": -5.0, "3000": -5.0, "4000": 7.0}
+    assert (result.debit_total, result.credit_total, result.uploaded_total) == (157.0, 25.0, 132.0)
+    assert result.ledger_total == 135.0
+    assert not result.is_balanced
+
+
+def test_reconcile_by_account_only_sums_the_ledger_business_units():
+    uploaded = pd.DataFrame(
+        {
+            "account_no": ["1000", "2000"],
+            "debit_cents": pd.array([1000, 0], dtype="Int64"),
+            "credit_cents": pd.array([0, 1000], dtype="Int64"),
+        }
+    )
+    ledger = pd.DataFrame(
+        {
+            "account_no": ["1000", "1000", "2000"],
+            "business_unit_id": ["10", "20", "10"],
+            "closing_balance_cents": pd.array([400, 600, -1000], dtype="Int64"),
+        }
+    )
+
+    result = reconcile(uploaded, ledger)
+
+    assert result.keys == ["account_no"]
+    assert result.differences.empty
+    assert result.unmatched("left_only").empty and result.unmatched("right_only").empty
+    assert result.is_balanced
+
+
+def test_reconcile_compares_in_exact_cents():
+    # ten cents a line, and a balance past the integers a float holds exactly
+    uploaded = pd.DataFrame(
+        {
+            "account_no": ["1000"] * 3 + ["2000"],
+            "debit_cents": pd.array([10, 10, 10, 9_007_199_254_740_993], dtype="Int64"),
+            "credit_cents": pd.array([0, 0, 0, 0], dtype="Int64"),
+        }
+    )
+    ledger = pd.DataFrame(
+        {
+            "account_no": ["1000", "2000", "2000"],
+            "closing_balance_cents": pd.array([30, 9_007_199_254_740_992, 1], dtype="Int64"),
+        }
+    )
+
+    result = reconcile(uploaded, ledger)
+
+    assert result.differences.empty
+    assert result.balances.set_index("account_no").at["1000", "uploaded"] == 0.3
@@ -1,5 +1,6 @@
 import pandas as pd
 from st_aggrid import AgGrid, GridOptionsBuilder
+from utils.timing import span
 
 CSS = {
     ".ag-root": {"background-color": "#262C28", "color": "#FDFDFC"},
@@ -10,22 +11,25 @@ CSS = {
 }
 
 
-def get_ag_grid_instance(raw_data: pd.DataFrame) -> AgGrid:
+def get_ag_grid_instance(raw_data: pd.DataFrame, paginate: bool = True) -> AgGrid:
     # Build grid options
     gb = GridOptionsBuilder.from_dataframe(raw_data)
     gb.configure_selection(selection_mode="single", use_checkbox=True)
-    gb.configure_pagination(enabled=True, paginationAutoPageSize=10)
+    # callers that page on the server hand over a single page
+    if paginate:
+        gb.configure_pagination(enabled=True, paginationAutoPageSize=10)
     gb.configure_default_column(filter=True)
     grid_options = gb.build()
 
     # Display interactive grid
-    grid_response = AgGrid(
-        data=raw_data,
-        gridOptions=grid_options,
-        height=400,
-        fit_columns_on_grid_load=True,
-        allow_unsafe_jscode=True,
-        custom_css=CSS,
-    )
+    with span("render", rows=len(raw_data), widget="ag_grid"):
+        grid_response = AgGrid(
+            data=raw_data,
+            gridOptions=grid_options,
+            height=400,
+            fit_columns_on_grid_load=True,
+            allow_unsafe_jscode=True,
+            custom_css=CSS,
+        )
 
     return grid_response
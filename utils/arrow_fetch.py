@@ -0,0 +1,209 @@
+import os
+import threading
+from contextlib import closing
+from decimal import Decimal
+from typing import Iterable, Iterator, Optional
+
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv
+
+from utils.db_manager import connection
+
+# arrow type of each postgres type oid, numeric is read as a decimal, see numeric_type,
+# and anything else as text
+PG_ARROW_TYPES = {
+    16: pa.bool_(),  # bool
+    20: pa.int64(),  # int8
+    21: pa.int64(),  # int2
+    23: pa.int64(),  # int4
+    700: pa.float64(),  # float4
+    701: pa.float64(),  # float8
+    1082: pa.date32(),  # date
+    1114: pa.timestamp("us"),  # timestamp
+    1184: pa.timestamp("us", tz="UTC"),  # timestamptz
+}
+
+NUMERIC = 1700
+# arrow's csv reader parses decimals of up to 38 digits; a numeric that declares no
+# precision and scale, like a function's result, gets 20 decimals, the scale postgres
+# gives a division. A value that doesn't fit fails the read rather than being rounded
+UNDECLARED_NUMERIC = pa.decimal128(38, 20)
+# amounts of a numeric result that declares no scale, exact to the cent
+AMOUNT = pa.decimal128(38, 2)
+# an amount whose unscaled value, the number of cents, fits in an int64, see fetch_frame
+CENTS_DECIMAL = pa.decimal128(18, 2)
+
+# text read as a dictionary comes out of to_pandas as a category, for repeated keys
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+# bytes of csv parsed per chunk by iter_frames
+DEFAULT_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def numeric_type(precision: Optional[int], scale: Optional[int]) -> pa.DataType:
+    """An exact decimal for a numeric column, with its declared precision and scale if any."""
+    # psycopg2 reports an undeclared precision and scale as 65535
+    if scale is None or precision == 0xFFFF:
+        return UNDECLARED_NUMERIC
+    return pa.decimal128(min(precision, 38), min(scale, 38))
+
+
+def describe_query(cursor, query: str, params=None) -> dict[str, pa.DataType]:
+    """The arrow type of every result column, from a LIMIT 0 run of the query."""
+    cursor.execute(f"SELECT * FROM ({query}) AS described LIMIT 0", params)
+    return {
+        column.name: (
+            numeric_type(column.precision, column.scale)
+            if column.type_code == NUMERIC
+            else PG_ARROW_TYPES.get(column.type_code, pa.string())
+        )
+        for column in cursor.description
+    }
+
+
+def _copy_sql(cursor, query: str, params=None) -> str:
+    rendered = cursor.mogrify(query, params).decode()
+    return f"COPY ({rendered}) TO STDOUT WITH (FORMAT csv, HEADER)"
+
+
+def _csv_options(
+    schema: dict[str, pa.DataType], block_size: Optional[int] = None
+) -> dict:
+    read_options = csv.ReadOptions(use_threads=True)
+    if block_size:
+        read_options.block_size = block_size
+    return {
+        "read_options": read_options,
+        "convert_options": csv.ConvertOptions(
+            column_types=schema,
+            # COPY writes NULL unquoted and empty strings as ""
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            true_values=["t"],
+            false_values=["f"],
+        ),
+    }
+
+
+def _clean_query(query: str) -> str:
+    return query.strip().rstrip(";")
+
+
+def fetch_arrow(
+    query: str, params=None, dtypes: Optional[dict[str, pa.DataType]] = None
+) -> pa.Table:
+    """Runs ``query`` through COPY TO STDOUT and parses the result straight into arrow.
+
+    Column types come from the postgres types of the result, ``dtypes`` overrides
+    them per column.
+    """
+    query = _clean_query(query)
+    buffer = pa.BufferOutputStream()
+
+    with connection() as conn, conn.cursor() as cursor:
+        try:
+            schema = {**describe_query(cursor, query, params), **(dtypes or {})}
+            cursor.copy_expert(_copy_sql(cursor, query, params), buffer)
+        except psycopg2.Error as e:
+            raise Exception(f"Error fetching query results: {e}")
+
+    return csv.read_csv(pa.BufferReader(buffer.getvalue()), **_csv_options(schema))
+
+
+def decimal_cents(amounts: pa.ChunkedArray) -> pa.ChunkedArray:
+    """CENTS_DECIMAL amounts as int64 cents."""
+    return pc.multiply(amounts, pa.scalar(Decimal(100), pa.decimal128(3, 0))).cast(pa.int64())
+
+
+def fetch_frame(
+    query: str,
+    params=None,
+    dtypes: Optional[dict[str, pa.DataType]] = None,
+    cents: Iterable[str] = (),
+) -> pd.DataFrame:
+    """fetch_arrow as a DataFrame.
+
+    The numeric ``cents`` columns come back as exact Int64 cents, to be summed
+    and compared without float rounding; fractions of a cent fail the read.
+    """
+    cents = list(cents)
+    table = fetch_arrow(query, params, {**(dtypes or {}), **dict.fromkeys(cents, CENTS_DECIMAL)})
+    for name in cents:
+        table = table.set_column(
+            table.schema.get_field_index(name), name, decimal_cents(table[name])
+        )
+
+    frame = table.to_pandas()
+    if cents:
+        frame[cents] = frame[cents].astype("Int64")
+    return frame
+
+
+def iter_frames(
+    query: str,
+    params=None,
+    dtypes: Optional[dict[str, pa.DataType]] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> Iterator[pd.DataFrame]:
+    """Yields the result ``chunk_bytes`` of csv at a time, for results too big to hold."""
+    with closing(iter_batches(query, params, dtypes, chunk_bytes)) as batches:
+        for batch in batches:
+            yield batch.to_pandas()
+
+
+def iter_batches(
+    query: str,
+    params=None,
+    dtypes: Optional[dict[str, pa.DataType]] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> Iterator[pa.RecordBatch]:
+    """Yields the result as arrow record batches of ``chunk_bytes`` of csv each.
+
+    COPY writes into a pipe from a background thread while the chunks are parsed
+    here, so memory holds one chunk whatever the size of the result.
+    """
+    query = _clean_query(query)
+    read_fd, write_fd = os.pipe()
+    copy_errors = []
+
+    with connection() as conn, conn.cursor() as cursor:
+        try:
+            schema = {**describe_query(cursor, query, params), **(dtypes or {})}
+            copy_sql = _copy_sql(cursor, query, params)
+        except psycopg2.Error as e:
+            os.close(read_fd)
+            os.close(write_fd)
+            raise Exception(f"Error fetching query results: {e}")
+
+        def copy_out():
+            try:
+                with open(write_fd, "wb") as pipe:
+                    cursor.copy_expert(copy_sql, pipe)
+            except (psycopg2.Error, OSError) as e:
+                copy_errors.append(e)
+
+        writer = threading.Thread(target=copy_out, daemon=True)
+        writer.start()
+
+        finished = False
+        try:
+            with open(read_fd, "rb") as pipe:
+                try:
+                    reader = csv.open_csv(pipe, **_csv_options(schema, chunk_bytes))
+                    yield from reader
+                except pa.ArrowInvalid:
+                    # a failed COPY leaves the pipe empty, report its error instead
+                    writer.join()
+                    if not copy_errors:
+                        raise
+                finished = True
+        finally:
+            if not finished:
+                # stopped early, cancel the COPY rather than leave it half read
+                conn.cancel()
+            writer.join()
+            if finished and copy_errors:
+                raise Exception(f"Error fetching query results: {copy_errors[0]}")
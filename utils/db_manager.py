@@ -1,5 +1,29 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
 import toml
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+from utils.timing import TimedCursor
+
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+# pool sizing, overridable from a [postgres_pool] section in the secrets file
+DEFAULT_MIN_SIZE = 1
+DEFAULT_MAX_SIZE = 10
+# seconds to wait for a free connection before giving up
+DEFAULT_CHECKOUT_TIMEOUT = 30
+# connections idle longer than this are pinged before being handed out
+HEALTH_CHECK_INTERVAL = 30
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.RLock()
+_last_used = {}
 
 
 def get_database_credentials(toml_file_path):
@@ -14,9 +38,123 @@ def get_database_credentials(toml_file_path):
     except FileNotFoundError:
         raise Exception(f"Error: File not found at {toml_file_path}")
     except toml.TomlDecodeError as e:
-        raise Exception("Error decoding TOML file: {e}")
+        raise Exception(f"Error decoding TOML file: {e}")
+
+
+@lru_cache(maxsize=None)
+def get_pool_settings(toml_file_path: str = SECRETS_PATH) -> tuple[dict, dict]:
+    """Parses the secrets file once per process.
+
+    Returns the psycopg2 connection keywords and the pool sizing options.
+    """
+    credentials = get_database_credentials(toml_file_path)
+    if credentials is None:
+        raise Exception(f"Error: no [postgres] section in {toml_file_path}")
+
+    with open(toml_file_path, "r") as f:
+        pool_options = toml.load(f).get("postgres_pool", {})
+
+    return dict(credentials), dict(pool_options)
+
+
+def configure_pool(
+    min_size: int = DEFAULT_MIN_SIZE,
+    max_size: int = DEFAULT_MAX_SIZE,
+    **connect_kwargs,
+) -> ThreadedConnectionPool:
+    """(Re)creates the process-wide pool, e.g. ``configure_pool(dsn="postgresql://...")``.
+
+    Without connection keywords the credentials come from the secrets file.
+    """
+    global _pool, _pool_slots
+
+    if not connect_kwargs:
+        connect_kwargs, _ = get_pool_settings()
+    # every query run through the pool is timed, see utils.timing
+    connect_kwargs = {"cursor_factory": TimedCursor, **connect_kwargs}
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _last_used.clear()
+        _pool = ThreadedConnectionPool(min_size, max_size, **connect_kwargs)
+        _pool_slots = threading.BoundedSemaphore(max_size)
+
+    return _pool
 
 
-def get_connection():
-    credentials = get_database_credentials(".streamlit\secrets.toml")
-    return psycopg2.connect(**credentials)
+def get_pool() -> ThreadedConnectionPool:
+    with _pool_lock:
+        if _pool is None:
+            _, pool_options = get_pool_settings()
+            configure_pool(
+                min_size=int(pool_options.get("min_size", DEFAULT_MIN_SIZE)),
+                max_size=int(pool_options.get("max_size", DEFAULT_MAX_SIZE)),
+            )
+        return _pool
+
+
+def close_pool():
+    global _pool, _pool_slots
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
+        _pool_slots = None
+        _last_used.clear()
+
+
+def is_healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout(connection_pool: ThreadedConnectionPool):
+    conn = connection_pool.getconn()
+    idle_for = time.monotonic() - _last_used.get(id(conn), time.monotonic())
+
+    if conn.closed or (idle_for > HEALTH_CHECK_INTERVAL and not is_healthy(conn)):
+        connection_pool.putconn(conn, close=True)
+        conn = connection_pool.getconn()
+
+    return conn
+
+
+@contextmanager
+def connection(timeout: float = DEFAULT_CHECKOUT_TIMEOUT):
+    """Checks a connection out of the pool and returns it on exit.
+
+    Anything not committed inside the block is rolled back before the
+    connection goes back to the pool, and broken connections are discarded.
+    """
+    with _pool_lock:
+        connection_pool = get_pool()
+        slots = _pool_slots
+
+    if not slots.acquire(timeout=timeout):
+        raise Exception(
+            f"Error: no database connection became free within {timeout} seconds"
+        )
+
+    try:
+        conn = _checkout(connection_pool)
+        try:
+            yield conn
+        finally:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    conn.close()
+            _last_used[id(conn)] = time.monotonic()
+            connection_pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        slots.release()
@@ -0,0 +1,290 @@
+import hashlib
+import math
+import os
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+from xml.sax.saxutils import escape
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv
+
+from utils.arrow_fetch import fetch_arrow, iter_batches
+from utils.query_cache import LEDGER, get_data_version
+from utils.timing import span
+
+# file extension and mime type of every export format
+EXPORT_FORMATS = {
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "CSV": ("csv", "text/csv"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+# exports are kept on disk per query and data version, the least recently used go first
+EXPORT_DIR = os.environ.get(
+    "EXPORT_DIR", os.path.join(tempfile.gettempdir(), "journal_entry_exports")
+)
+EXPORT_CACHE_FILES = int(os.environ.get("EXPORT_CACHE_FILES", 16))
+# st.download_button holds the whole file in memory, larger exports are left on the server
+EXPORT_DOWNLOAD_BYTES = int(os.environ.get("EXPORT_DOWNLOAD_BYTES", 200 * 1024 * 1024))
+
+# bumped when the writers change what they put in a file, so older cached exports are rewritten
+EXPORT_FILE_VERSION = 2
+
+# rows of a worksheet including its header, past that the export goes on in a new sheet
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_MAX_CELL_CHARS = 32_767
+# control characters xml 1.0 can't hold
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+# excel counts days from 1899-12-30 and believes 1900 was a leap year, so its serials are only
+# right from March 1900, earlier dates are written as ISO text
+EXCEL_EPOCH = datetime(1899, 12, 30)
+EXCEL_FIRST_DATE = date(1900, 3, 1)
+# the cellXfs of xl/styles.xml that dates and timestamps are shown with
+EXCEL_DATE_STYLE = 1
+EXCEL_DATETIME_STYLE = 2
+
+
+class ParquetExport:
+    def __init__(self, path: str, schema: pa.Schema):
+        self._writer = pq.ParquetWriter(path, schema, compression="zstd")
+
+    def write_batch(self, batch: pa.RecordBatch):
+        self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+
+
+class CsvExport:
+    def __init__(self, path: str, schema: pa.Schema):
+        self._writer = csv.CSVWriter(path, schema)
+
+    def write_batch(self, batch: pa.RecordBatch):
+        self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+
+
+def _excel_cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return f"<c><v>{value!r}</v></c>"
+    if isinstance(value, Decimal) and value.is_finite():
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, datetime) and value.date() >= EXCEL_FIRST_DATE:
+        # the sheet has no time zone, timestamps keep the wall clock they came with
+        serial = (value.replace(tzinfo=None) - EXCEL_EPOCH) / timedelta(days=1)
+        return f'<c s="{EXCEL_DATETIME_STYLE}"><v>{serial!r}</v></c>'
+    if isinstance(value, date) and not isinstance(value, datetime) and value >= EXCEL_FIRST_DATE:
+        serial = (value - EXCEL_EPOCH.date()).days
+        return f'<c s="{EXCEL_DATE_STYLE}"><v>{serial}</v></c>'
+    if isinstance(value, date):
+        value = value.isoformat()
+    text = _XML_ILLEGAL.sub("", str(value))[:EXCEL_MAX_CELL_CHARS]
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _excel_row(values) -> bytes:
+    return ("<row>" + "".join(map(_excel_cell, values)) + "</row>").encode()
+
+
+class ExcelExport:
+    """Writes an xlsx one row at a time, straight into the zip.
+
+    Strings are written inline rather than to a shared string table, which
+    would have to be held until the end. Dates are day serials shown with a
+    date format, so they sort and filter as dates.
+    """
+
+    def __init__(self, path: str, schema: pa.Schema):
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._header = _excel_row(schema.names)
+        self._sheets = 0
+        self._sheet = None
+        self._sheet_rows = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._end_sheet()
+        self._sheets += 1
+        self._sheet = self._zip.open(
+            f"xl/worksheets/sheet{self._sheets}.xml", "w", force_zip64=True
+        )
+        self._sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            b"<sheetData>" + self._header
+        )
+        self._sheet_rows = 1
+
+    def _end_sheet(self):
+        if self._sheet is not None:
+            self._sheet.write(b"</sheetData></worksheet>")
+            self._sheet.close()
+            self._sheet = None
+
+    def write_batch(self, batch: pa.RecordBatch):
+        columns = [column.to_pylist() for column in batch.columns]
+        for values in zip(*columns):
+            if self._sheet_rows == EXCEL_MAX_ROWS:
+                self._new_sheet()
+            self._sheet.write(_excel_row(values))
+            self._sheet_rows += 1
+
+    def close(self):
+        self._end_sheet()
+        sheets = range(1, self._sheets + 1)
+        self._zip.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + "".join(
+                f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for n in sheets
+            )
+            + "</Types>",
+        )
+        self._zip.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>",
+        )
+        self._zip.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + "".join(f'<sheet name="Sheet{n}" sheetId="{n}" r:id="rId{n}"/>' for n in sheets)
+            + "</sheets></workbook>",
+        )
+        self._zip.writestr(
+            "xl/_rels/workbook.xml.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(
+                f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                for n in sheets
+            )
+            + f'<Relationship Id="rId{self._sheets + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+            "</Relationships>",
+        )
+        # the default style, then dates (built in format 14) and timestamps
+        self._zip.writestr(
+            "xl/styles.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+            '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+            '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+            '<fill><patternFill patternType="gray125"/></fill></fills>'
+            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            '<cellXfs count="3">'
+            '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+            '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+            '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+            "</cellXfs>"
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+            "</styleSheet>",
+        )
+        self._zip.close()
+
+
+EXPORT_WRITERS = {"Parquet": ParquetExport, "CSV": CsvExport, "Excel": ExcelExport}
+
+
+def export_path(
+    query: str, params, fmt: str, dtypes: Optional[dict[str, pa.DataType]] = None
+) -> str:
+    """Where the export of ``query`` as ``fmt`` at the current ledger version is kept."""
+    version = get_data_version(LEDGER)
+    key = repr((query, params, fmt, dtypes, version, EXPORT_FILE_VERSION))
+    key = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(EXPORT_DIR, f"{key}.{EXPORT_FORMATS[fmt][0]}")
+
+
+def _evict_exports(keep: int = EXPORT_CACHE_FILES):
+    exports = []
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.name.startswith("."):
+            continue
+        try:
+            exports.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            # evicted by another session meanwhile
+            pass
+
+    exports.sort(reverse=True)
+    for _, path in exports[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def export_query(
+    query: str,
+    params=None,
+    fmt: str = "Parquet",
+    dtypes: Optional[dict[str, pa.DataType]] = None,
+    table_name: Optional[str] = None,
+) -> str:
+    """Streams the result of ``query`` into a file of format ``fmt`` and returns its path.
+
+    The result is written a record batch at a time, so memory holds one batch
+    whatever the size of the export. The file is reused until the ledger's
+    data version moves on.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = export_path(query, params, fmt, dtypes)
+
+    with span("export", table_name=table_name, format=fmt) as record:
+        try:
+            # touched so the eviction keeps it as recently used
+            os.utime(path)
+            record["cached"] = True
+            return path
+        except FileNotFoundError:
+            # never written, or evicted by another session, write it again
+            pass
+
+        record["rows"] = 0
+        fd, partial = tempfile.mkstemp(dir=EXPORT_DIR, prefix=".", suffix=".partial")
+        os.close(fd)
+        writer = None
+        try:
+            for batch in iter_batches(query, params, dtypes):
+                if writer is None:
+                    writer = EXPORT_WRITERS[fmt](partial, batch.schema)
+                writer.write_batch(batch)
+                record["rows"] += batch.num_rows
+
+            if writer is None:
+                # nothing came back, the file still gets the result's columns
+                writer = EXPORT_WRITERS[fmt](partial, fetch_arrow(query, params, dtypes).schema)
+            writer.close()
+            writer = None
+            os.replace(partial, path)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    _evict_exports()
+    return path
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import psycopg2
+
+from utils.db_manager import connection
+
+# data version scopes, bumped in the same transaction as the writes they cover
+LEDGER = "ledger"  # journal, budget, the snapshot and the dimension tables
+GROUPING = "grouping"
+
+DEFAULT_MAX_ENTRIES = 64
+# seconds an entry is kept, versions already keep entries fresh, this only frees memory
+DEFAULT_TTL = 15 * 60
+
+
+class QueryCache:
+    """A thread safe LRU of query results with a time to live and hit/miss counters."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> tuple[bool, object]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+query_cache = QueryCache()
+
+
+def get_data_version(scope: str) -> int:
+    with connection() as conn, conn.cursor() as cursor:
+        try:
+            cursor.execute(
+                "SELECT version FROM finance.data_version WHERE scope = %s", (scope,)
+            )
+            row = cursor.fetchone()
+        except psycopg2.Error as e:
+            raise Exception(f"Error reading the {scope} data version: {e}")
+
+    return row[0] if row else 0
+
+
+def bump_data_version(cursor, scope: str):
+    """Invalidates the cached reads of ``scope`` once the caller's transaction commits."""
+    cursor.execute(
+        """
+            UPDATE finance.data_version
+            SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE scope = %s
+        """,
+        (scope,),
+    )
+
+
+def cached_query(scope: str, cache: QueryCache = query_cache):
+    """Caches a read function per arguments and current data version of ``scope``.
+
+    The version is read before the query runs, so a write committing in between
+    is cached under the old version and refetched on the next call; a cached
+    result is never older than the version it is stored under. Results are
+    shared between callers and must not be modified.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (
+                func.__module__,
+                func.__qualname__,
+                get_data_version(scope),
+                args,
+                tuple(sorted(kwargs.items())),
+            )
+            hit, value = cache.get(key)
+            if not hit:
+                value = func(*args, **kwargs)
+                cache.put(key, value)
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,173 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+import pandas as pd
+from psycopg2.extensions import cursor as _cursor
+
+from config.logger import get_logger
+
+# spans kept in memory for the performance page, per server process
+SPAN_HISTORY = 5_000
+# queries faster than this are only kept in memory, not written to the log
+SLOW_QUERY_SECONDS = 0.25
+QUERY_LABEL_LENGTH = 120
+PERCENTILES = [0.5, 0.9, 0.99]
+
+logger = get_logger()
+
+_spans = deque(maxlen=SPAN_HISTORY)
+_spans_lock = threading.Lock()
+
+
+def record_span(record: dict, min_log_seconds: float = 0.0):
+    with _spans_lock:
+        _spans.append(record)
+
+    level = logging.INFO if record["seconds"] >= min_log_seconds else logging.DEBUG
+    logger.log(
+        level, f"{record['stage']} took {record['seconds']:.3f}s", extra={"span": record}
+    )
+
+
+@contextmanager
+def span(
+    stage: str,
+    table_name: Optional[str] = None,
+    rows: Optional[int] = None,
+    min_log_seconds: float = 0.0,
+    **tags,
+):
+    """Times the block as one ``stage`` and records it with its table and row count.
+
+    The yielded dict is the record, so a row count only known at the end of the
+    block can still be set with ``record["rows"] = ...``.
+    """
+    record = {"stage": stage, "table_name": table_name, "rows": rows, **tags}
+    record["started_at"] = datetime.now()
+    record["status"] = "ok"
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record["status"] = "error"
+        raise
+    finally:
+        record["seconds"] = time.perf_counter() - started
+        record_span(record, min_log_seconds)
+
+
+def timed_chunks(
+    chunks: Iterable[pd.DataFrame], stage: str, table_name: Optional[str] = None
+) -> Iterator[pd.DataFrame]:
+    """Yields the chunks, recording the time taken to produce each one as a span."""
+    chunks = iter(chunks)
+    while True:
+        started_at, started = datetime.now(), time.perf_counter()
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+
+        record_span(
+            {
+                "stage": stage,
+                "table_name": table_name,
+                "rows": len(chunk),
+                "started_at": started_at,
+                "status": "ok",
+                "seconds": time.perf_counter() - started,
+            }
+        )
+        yield chunk
+
+
+def query_label(query) -> str:
+    """The start of a statement on one line, with its inlined values taken out.
+
+    Literals become ``?`` and execute_values batches are cut at VALUES, so runs
+    of the same statement share a label.
+    """
+    if isinstance(query, bytes):
+        query = query[: QUERY_LABEL_LENGTH * 4].decode(errors="replace")
+    query = " ".join(str(query)[: QUERY_LABEL_LENGTH * 4].split())
+    query = re.split(r"\sVALUES\s*\(", query, maxsplit=1, flags=re.IGNORECASE)[0]
+    query = re.sub(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b", "?", query)
+    return query[:QUERY_LABEL_LENGTH]
+
+
+class TimedCursor(_cursor):
+    """A cursor that records every execute and COPY as a ``sql`` span."""
+
+    def execute(self, query, vars=None):
+        with span("sql", min_log_seconds=SLOW_QUERY_SECONDS, query=query_label(query)) as record:
+            result = super().execute(query, vars)
+            record["rows"] = self.rowcount if self.rowcount >= 0 else None
+        return result
+
+    def copy_expert(self, sql, file, size=8192):
+        with span("sql", min_log_seconds=SLOW_QUERY_SECONDS, query=query_label(sql)) as record:
+            result = super().copy_expert(sql, file, size)
+            record["rows"] = self.rowcount if self.rowcount >= 0 else None
+        return result
+
+
+def recent_spans(limit: Optional[int] = None) -> pd.DataFrame:
+    """The recorded spans, newest first."""
+    with _spans_lock:
+        spans = list(_spans)
+
+    frame = pd.DataFrame(
+        reversed(spans[-limit:] if limit else spans),
+        columns=["started_at", "stage", "table_name", "rows", "seconds", "status", "query"],
+    )
+    frame["rows"] = frame["rows"].astype("Int64")
+    return frame
+
+
+def span_percentiles(spans: pd.DataFrame, by: str = "stage") -> pd.DataFrame:
+    """Count, latency percentiles and throughput of the spans per ``by``."""
+    grouped = spans.groupby(by)
+    seconds = grouped["seconds"].quantile(PERCENTILES).unstack()
+    seconds.columns = [f"p{round(q * 100)}_seconds" for q in PERCENTILES]
+
+    summary = pd.concat(
+        [
+            grouped.size().rename("count"),
+            seconds,
+            grouped["seconds"].max().rename("max_seconds"),
+            grouped["seconds"].sum().rename("total_seconds"),
+            grouped["rows"].sum().rename("rows"),
+        ],
+        axis=1,
+    )
+    summary["rows_per_sec"] = (summary["rows"] / summary["total_seconds"]).where(
+        summary["rows"] > 0
+    )
+    return summary.sort_values("total_seconds", ascending=False).reset_index()
+
+
+def clear_spans():
+    with _spans_lock:
+        _spans.clear()
+
+
+def take_spans() -> list[dict]:
+    """Removes and returns the recorded spans, oldest first.
+
+    A worker process hands its spans back to the server this way, see keep_spans.
+    """
+    with _spans_lock:
+        spans = list(_spans)
+        _spans.clear()
+    return spans
+
+
+def keep_spans(records: Iterable[dict]):
+    """Keeps spans timed in another process, which already logged them."""
+    with _spans_lock:
+        _spans.extend(records)